@@ -3,9 +3,12 @@ import streamlit as st
 import pandas as pd
 import base64
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hashlib
 import os
+from data_io import read_dataset
+from user_store import open_user_store
 
 # ---------------------------
 # PAGE CONFIG
@@ -13,187 +16,129 @@ import os
 st.set_page_config(page_title="Agri-Tech ML Hub", page_icon="🌾", layout="wide")
 
 # ---------------------------
-# BACKGROUND IMAGE
+# BACKGROUND IMAGE + STYLESHEET
 # ---------------------------
+# Served by Streamlit's static file server (.streamlit/config.toml), so the
+# browser downloads it once and every rerun only ships the URL
+STATIC_BACKGROUND = "static/img2.jpg"
+STATIC_BACKGROUND_URL = "app/static/img2.jpg"
+# Fallbacks when static serving is not available; these are inlined once per process
 BG_CANDIDATES = [
     "/mnt/data/A_high-resolution_digital_photograph_captures_a_ru.png",
     "/mnt/data/img2.jpg",
-    "img2.jpg"
 ]
 
-def get_base64(path):
-    try:
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-    except:
-        return None
-
-def set_background():
-    # Set the main app background
-    main_bg_b64 = None
-    for p in BG_CANDIDATES:
-        b = get_base64(p)
-        if b:
-            main_bg_b64 = b
-            break
-    
-    css = ""
-    if main_bg_b64:
-        css += f"""
-        <style>
-        .stApp {{
-            background-image: url("data:image/png;base64,{main_bg_b64}");
-            background-size: cover;
-            background-position: center;
-            background-attachment: fixed;
-            /* Changed to BLACK for maximum readability */
-            color: #000000; 
-        }}
-        </style>
-        """
-
-    css += """
-    <style>
-    /* Login/Dashboard Card */
-    .card {
-        background: rgba(255,255,255,0.92);
-        border-radius: 12px;
-        padding: 18px;
-        box-shadow: 0 8px 24px rgba(0,0,0,0.20);
-        height: 100%;
-    }
-    /* Secondary Card */
-    .semi-card {
-        background: rgba(255,255,255,0.90);
-        border-radius: 10px;
-        padding: 14px;
-    }
-    
-    /* BUTTON STYLING: Smaller, mobile-friendly, animated buttons */
-    .stButton > button {
-        /* Increased radius for rounded corners/pill shape */
-        border-radius: 15px; 
-        border: 1px solid #2E8B57; /* Sea Green border */
-        color: #2E8B57; /* Sea Green text */
-        background-color: #F0FFF0; /* Lightest green background */
-        font-weight: 600;
-        /* Further reduced vertical padding and font size for smallest size */
-        padding: 0.15rem 0.5rem; 
-        font-size: 0.8rem; /* Smaller font size */
-        transition: all 0.2s ease-in-out;
-        white-space: nowrap; /* Prevents text wrapping on very small screens */
-    }
-    .stButton > button:hover {
-        background-color: #2E8B57; /* Darker green on hover */
-        color: white;
-        /* Subtle animation */
-        transform: scale(1.05); 
-    }
-    
-    /* CSS for making Recommended Crop and Metric output BOLDER and BIGGER */
-    /* Targeting Streamlit metric value text for larger display (N, P, K values) */
-    div[data-testid="stMetricValue"] {
-        font-size: 2.0rem !important; /* Increase NPK metric value size */
-        font-weight: 900 !important;
-        color: #2E8B57 !important; /* Ensure metric value is also a dark color */
-    }
-    
-    /* Targeting the final recommended crop text */
-    .recommended-crop-output {
-        font-size: 1.8em;
-        font-weight: 900;
-        color: #1E8449; /* Darker green for contrast */
-    }
-    
-    /* Ensure input labels and placeholders are black on the card */
-    .stTextInput label, .stSelectbox label, .stNumberInput label {
-        color: #000000 !important;
-    }
-
-    </style>
-    """
-    st.markdown(css, unsafe_allow_html=True)
-            
-set_background()
-# Make results appear in white for visibility
-st.markdown("""
-<style>
-/* NPK Metric values */
-div[data-testid="stMetricValue"] {
-    color: #FFFFFF !important;  /* White */
+APP_CSS = """
+/* Login/Dashboard Card */
+.card {
+    background: rgba(255,255,255,0.92);
+    border-radius: 12px;
+    padding: 18px;
+    box-shadow: 0 8px 24px rgba(0,0,0,0.20);
+    height: 100%;
 }
-
-/* Recommended Crop output */
-.recommended-crop-output {
-    color: #FFFFFF !important;  /* White */
+/* Secondary Card */
+.semi-card {
+    background: rgba(255,255,255,0.90);
+    border-radius: 10px;
+    padding: 14px;
 }
-
-/* General text inside semi-card for better contrast if needed */
+/* General text inside the cards */
 .semi-card, .card {
     color: #FFFFFF !important;
 }
-</style>
-""", unsafe_allow_html=True)
 
-# Make Recommended Crop and NPK metrics white and larger
-st.markdown("""
-<style>
-/* NPK Metric values */
-div[data-testid="stMetricValue"] {
-    font-size: 2.2rem !important;  /* Larger font size */
-    font-weight: 900 !important;   /* Bold */
-    color: #FFFFFF !important;     /* White */
-}
-
-/* Recommended Crop output label */
-.recommended-crop-output {
-    font-size: 2.0rem !important;  /* Larger font size */
-    font-weight: 900 !important;   /* Bold */
-    color: #FFFFFF !important;     /* White */
+/* BUTTON STYLING: Smaller, mobile-friendly, animated buttons */
+.stButton > button {
+    border-radius: 15px;
+    border: 1px solid #2E8B57; /* Sea Green border */
+    color: #2E8B57; /* Sea Green text */
+    background-color: #F0FFF0; /* Lightest green background */
+    font-weight: 600;
+    padding: 0.15rem 0.5rem;
+    font-size: 0.8rem;
+    transition: all 0.2s ease-in-out;
+    white-space: nowrap; /* Prevents text wrapping on very small screens */
 }
-
-/* Label "Recommended Crop Grown:" preceding the crop name */
-div span[style*="font-weight:700"] {
-    color: #FFFFFF !important;     /* White */
-    font-size: 1.6rem !important;  /* Slightly larger */
+.stButton > button:hover {
+    background-color: #2E8B57; /* Darker green on hover */
+    color: white;
+    transform: scale(1.05);
 }
-</style>
-""", unsafe_allow_html=True)
 
-# ---------------------------
-# CUSTOM STYLING FOR MESSAGES AND METRICS
-# ---------------------------
-st.markdown("""
-<style>
 /* Login/Signup/Reset success or error messages */
 .stAlert {
-    color: #FFFFFF !important;      /* White text for alerts */
-    font-weight: 700 !important;    /* Bold */
-    font-size: 1.2rem !important;   /* Slightly larger */
+    color: #FFFFFF !important;
+    font-weight: 700 !important;
+    font-size: 1.2rem !important;
 }
 
-/* NPK Metric values on Fertilizer page */
+/* NPK Metric values */
 div[data-testid="stMetricValue"] {
-    font-size: 2.4rem !important;   /* Larger font size */
-    font-weight: 900 !important;    /* Bold */
-    color: #FFFFFF !important;      /* White */
+    font-size: 2.4rem !important;
+    font-weight: 900 !important;
+    color: #FFFFFF !important;
 }
 
-/* Recommended Crop output label */
+/* Recommended Crop output */
 .recommended-crop-output {
-    font-size: 2.2rem !important;   /* Larger font size */
-    font-weight: 900 !important;    /* Bold */
-    color: #FFFFFF !important;      /* White */
+    font-size: 2.2rem !important;
+    font-weight: 900 !important;
+    color: #FFFFFF !important;
 }
 
 /* Label "Recommended Crop Grown:" preceding the crop name */
 div span[style*="font-weight:700"] {
-    color: #FFFFFF !important;      /* White */
-    font-size: 1.8rem !important;   /* Slightly larger */
-    font-weight: 900 !important;    /* Bold */
+    color: #FFFFFF !important;
+    font-size: 1.8rem !important;
+    font-weight: 900 !important;
 }
-</style>
-""", unsafe_allow_html=True)
+
+/* Ensure input labels and placeholders are black on the card */
+.stTextInput label, .stSelectbox label, .stNumberInput label {
+    color: #000000 !important;
+}
+"""
+
+BACKGROUND_CSS = """
+.stApp {
+    background-image: url("%s");
+    background-size: cover;
+    background-position: center;
+    background-attachment: fixed;
+    /* Changed to BLACK for maximum readability */
+    color: #000000;
+}
+"""
+
+def get_base64(path):
+    try:
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode()
+    except:
+        return None
+
+def background_url():
+    """URL of the app background, or None when no image is available."""
+    if os.path.exists(STATIC_BACKGROUND):
+        return STATIC_BACKGROUND_URL
+    for p in BG_CANDIDATES:
+        b = get_base64(p)
+        if b:
+            return f"data:image/png;base64,{b}"
+    return None
+
+@st.cache_resource
+def get_stylesheet():
+    """Build the one <style> block injected on every rerun (once per process)."""
+    url = background_url()
+    css = (BACKGROUND_CSS % url if url else "") + APP_CSS
+    return f"<style>{css}</style>"
+
+def set_background():
+    st.markdown(get_stylesheet(), unsafe_allow_html=True)
+
+set_background()
 
 # ---------------------------
 # TRANSLATIONS (offline)
@@ -218,7 +163,8 @@ TRANSLATIONS = {
         "N":"N","P":"P","K":"K",
         "Enter Nitrogen":"Enter Nitrogen","Enter Phosphorus":"Enter Phosphorus","Enter Potassium":"Enter Potassium",
         "Enter Temperature":"Enter Temperature","Enter Humidity":"Enter Humidity","Enter pH":"Enter pH","Enter Rainfall":"Enter Rainfall",
-        "Welcome to Agri Tech ML Hub":"🌾Welcome to Agri Tech ML Hub"
+        "Welcome to Agri Tech ML Hub":"🌾Welcome to Agri Tech ML Hub",
+        "Fertilizer dose (kg/ha)":"Fertilizer dose (kg/ha)"
     },
     "hi": {
         "Login":"लॉगिन","Username":"उपयोगकर्ता नाम","Password":"पासवर्ड","Enter username":"उपयोगकर्ता नाम दर्ज करें",
@@ -237,7 +183,8 @@ TRANSLATIONS = {
         "N":"एन","P":"पी","K":"के",
         "Enter Nitrogen":"नाइट्रोजन दर्ज करें","Enter Phosphorus":"फॉस्फोरस दर्ज करें","Enter Potassium":"पोटाशियम दर्ज करें",
         "Enter Temperature":"तापमान दर्ज करें","Enter Humidity":"आर्द्रता दर्ज करें","Enter pH":"पीएच दर्ज करें","Enter Rainfall":"वर्षा दर्ज करें",
-        "Welcome to Agri Tech ML Hub":"🌾 एग्री टेक एमएल हब में आपका स्वागत है"
+        "Welcome to Agri Tech ML Hub":"🌾 एग्री टेक एमएल हब में आपका स्वागत है",
+        "Fertilizer dose (kg/ha)":"उर्वरक मात्रा (कि.ग्रा./हेक्टेयर)"
     },
     "kn": {
         "Login":"ಲಾಗಿನ್","Username":"ಬಳಕೆದಾರ ಹೆಸರು","Password":"ಪಾಸ್ವರ್ಡ್","Enter username":"ಬಳಕೆದಾರರ ಹೆಸರನ್ನು ನಮೂದಿಸಿ",
@@ -256,7 +203,8 @@ TRANSLATIONS = {
         "N":"ಎನ್","P":"ಪಿ","K":"ಕೆ",
         "Enter Nitrogen":"ನೈಟ್ರೋಜನ್ ನಮೂದಿಸಿ","Enter Phosphorus":"ಫಾಸ್ಫರಸ್ ನಮೂದಿಸಿ","Enter Potassium":"ಪೊಟ್ಯಾಸಿಯಮ್ ನಮೂದಿಸಿ",
         "Enter Temperature":"ತಾಪಮಾನ ನಮೂದಿಸಿ","Enter Humidity":"ಆರ್ಡ್ರತೆ ನಮೂದಿಸಿ","Enter pH":"ಪಿಎಚ್ ನಮೂದಿಸಿ","Enter Rainfall":"ವರ್ಷಾಪಾತ ನಮೂದಿಸಿ",
-        "Welcome to Agri Tech ML Hub":"🌾 ಅಗ್ರಿ ಟೆಕ್ ಎಂಎಲ್ ಹಬ್‌ಗೆ ಸ್ವಾಗತ"
+        "Welcome to Agri Tech ML Hub":"🌾 ಅಗ್ರಿ ಟೆಕ್ ಎಂಎಲ್ ಹಬ್‌ಗೆ ಸ್ವಾಗತ",
+        "Fertilizer dose (kg/ha)":"ರಸಗೊಬ್ಬರ ಪ್ರಮಾಣ (ಕೆಜಿ/ಹೆಕ್ಟೇರ್)"
     }
 }
 
@@ -333,17 +281,13 @@ st.session_state["lang"] = st.sidebar.selectbox("Choose language", ["en","hi","k
 # USER SYSTEM
 # ---------------------------
 USER_FILE = "users.json"
+# sqlite:<path> (default) or json:<path>; see user_store.py
+USER_STORE_URL = os.environ.get("AGRI_USER_STORE", "sqlite:users.db")
 
-def load_users():
-    if not os.path.exists(USER_FILE):
-        return {"users": {}}
-    try:
-        return json.load(open(USER_FILE, "r"))
-    except:
-        return {"users": {}}
-
-def save_users(data):
-    json.dump(data, open(USER_FILE, "w"), indent=4)
+@st.cache_resource
+def get_user_store():
+    # One store per process; a SQLite store imports users.json the first time
+    return open_user_store(USER_STORE_URL, legacy_json=USER_FILE)
 
 def hash_password(p):
     return hashlib.sha256(p.encode()).hexdigest()
@@ -351,9 +295,18 @@ def hash_password(p):
 # ---------------------------
 # API endpoints
 # ---------------------------
-BASE_API = "http://127.0.0.1:5000"
-CROP_PREDICT_URL = f"{BASE_API}/predict"
-FERT_PREDICT_URL = f"{BASE_API}/fertilizer_recommendation"
+BASE_API = os.environ.get("AGRI_API_URL", "http://127.0.0.1:5000")
+FERT_PREDICT_PATH = "/fertilizer_recommendation"
+# Crop + fertilizer plan in one round trip
+RECOMMEND_PATH = "/recommend"
+
+# "inprocess" loads flask_backend into this process and calls it directly,
+# for deployments where the UI and the model run on the same machine
+API_MODE = os.environ.get("AGRI_API_MODE", "http")
+
+# Fail fast when the backend is down; predictions themselves take milliseconds
+CONNECT_TIMEOUT = 2
+READ_TIMEOUT = 10
 
 # ---------------------------
 # Load dataset
@@ -363,7 +316,8 @@ DATASET_PATH = "Crop_recommendation_with_soil.csv"
 def load_data():
     if os.path.exists(DATASET_PATH):
         try:
-            df = pd.read_csv(DATASET_PATH)
+            # Columnar cache when fresh; float32 numerics and categorical soil/label either way
+            df = read_dataset(DATASET_PATH)
         except:
             # Fallback to empty DataFrame if file read fails
             df = pd.DataFrame(columns=["N","P","K","temperature","humidity","ph","rainfall","soil_type","label"])
@@ -380,25 +334,65 @@ def load_data():
 # ---------------------------
 # API CALLERS
 # ---------------------------
-def get_crop_recommendation(payload):
+@st.cache_resource
+def get_http_session():
+    """One keep-alive session shared by every Streamlit session and rerun."""
+    retry = Retry(
+        total=3, connect=3, read=1, backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        # Every backend call is a side-effect-free lookup, so POSTs are safe to retry
+        allowed_methods=frozenset({"GET", "POST"}),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_backend_app():
+    """flask_backend loaded once into this process (AGRI_API_MODE=inprocess)."""
+    import flask_backend
+    return flask_backend.app
+
+def api_post(path, payload):
+    """POST to the backend. Returns (json, error); json is None on failure."""
     try:
-        r = requests.post(CROP_PREDICT_URL, json=payload, timeout=12)
+        if API_MODE == "inprocess":
+            # Same routes and validation, but no socket or HTTP parsing
+            r = get_backend_app().test_client().post(path, json=payload)
+            js = r.get_json(silent=True)
+            if r.status_code < 400 and js is not None:
+                return js, None
+            return None, (js or {}).get("error") or r.get_data(as_text=True)
+
+        r = get_http_session().post(BASE_API + path, json=payload,
+                                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
         if r.ok:
-            js = r.json()
-            return js.get("recommended_crop"), js.get("error")
+            return r.json(), None
         else:
             return None, r.text
     except Exception as e:
         return None, str(e)
 
+def get_recommendation(payload):
+    """Recommended crop and its fertilizer plan from a single /recommend call."""
+    js, err = api_post(RECOMMEND_PATH, payload)
+    if js is None:
+        return None, None, err
+    return js.get("recommended_crop"), js.get("fertilizer"), js.get("error")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_fertilizer_ratio(crop_name):
+    # Raising keeps failures out of the cache; only real answers are memoized
+    js, err = api_post(FERT_PREDICT_PATH, {"crop": crop_name})
+    if js is None or not js.get("recommended_ratio"):
+        raise RuntimeError(err or (js or {}).get("error") or "No fertilizer data")
+    return js["recommended_ratio"]
+
 def get_fertilizer_recommendation(crop_name):
     try:
-        r = requests.post(FERT_PREDICT_URL, json={"crop": crop_name}, timeout=12)
-        if r.ok:
-            js = r.json()
-            return js.get("recommended_ratio"), js.get("error")
-        else:
-            return None, r.text
+        return fetch_fertilizer_ratio(crop_name), None
     except Exception as e:
         return None, str(e)
 
@@ -435,8 +429,7 @@ def page_login():
         c1, c2 = st.columns([1,1])
         with c1:
             if st.button(t("Login"), use_container_width=True):
-                users = load_users()
-                if uname in users.get("users", {}) and users["users"][uname]==hash_password(pwd):
+                if get_user_store().verify(uname, hash_password(pwd)):
                     st.session_state["logged_in"] = True
                     st.session_state["user"] = uname
                     st.success(t("Login successful"))
@@ -468,14 +461,11 @@ def page_signup():
         p = st.text_input(t("Choose Password"), type="password")
         c = st.text_input(t("Confirm Password"), type="password")
         if st.button(t("Sign Up")):
-            users = load_users()
-            if u in users.get("users", {}):
-                st.error("Username already exists")
-            elif p != c:
+            if p != c:
                 st.error("Passwords do not match")
+            elif not get_user_store().create(u, hash_password(p)):
+                st.error("Username already exists")
             else:
-                users.setdefault("users", {})[u]=hash_password(p)
-                save_users(users)
                 st.success("Account created. Please login.")
                 st.session_state["page"]="Login"
         if st.button(t("Cancel")):
@@ -490,16 +480,16 @@ def page_reset():
         npw = st.text_input(t("New Password"), type="password")
         cpw = st.text_input(t("Confirm Password"), type="password")
         if st.button(t("Reset Password")):
-            users = load_users()
-            if u not in users.get("users", {}):
+            store = get_user_store()
+            if not store.exists(u):
                 st.error(t("User does not exist"))
             elif npw != cpw:
                 st.error("Passwords do not match")
-            else:
-                users["users"][u]=hash_password(npw)
-                save_users(users)
+            elif store.set_hash(u, hash_password(npw)):
                 st.success(t("Password reset successful"))
                 st.session_state["page"]="Login"
+            else:
+                st.error(t("User does not exist"))
         if st.button(t("Cancel")):
             st.session_state["page"]="Login"
     centered_card(content, width=400)
@@ -507,6 +497,22 @@ def page_reset():
 # ---------------------------
 # CROP / FERTILIZER PAGES
 # ---------------------------
+def show_fertilizer(plan):
+    """N, P, K target metrics, plus product doses when the plan has them."""
+    ratio = plan.get("recommended_ratio", plan)
+    c1, c2, c3 = st.columns(3)
+    c1.metric(label=f"{t('N')}", value=f"{ratio.get('N')}", delta=None)
+    c2.metric(label=f"{t('P')}", value=f"{ratio.get('P')}", delta=None)
+    c3.metric(label=f"{t('K')}", value=f"{ratio.get('K')}", delta=None)
+
+    dose = plan.get("dose_kg")
+    if dose:
+        st.markdown(f"**{t('Fertilizer dose (kg/ha)')}**")
+        d1, d2, d3 = st.columns(3)
+        d1.metric(label="Urea", value=f"{dose.get('urea')}", delta=None)
+        d2.metric(label="DAP", value=f"{dose.get('DAP')}", delta=None)
+        d3.metric(label="MOP", value=f"{dose.get('MOP')}", delta=None)
+
 def page_crop(soils):
     st.markdown("<div class='semi-card'>", unsafe_allow_html=True)
     st.header(t("Crop Recommendation"))
@@ -530,11 +536,15 @@ def page_crop(soils):
 
     if submitted:
         payload = {"N": n, "P": p, "K": k, "temperature": temp, "humidity": hum, "ph": ph_val, "rainfall": rain, "soil_type": soil}
-        crop, err = get_crop_recommendation(payload)
+        # One request returns the crop and its fertilizer plan for these soil values
+        crop, plan, err = get_recommendation(payload)
         if crop:
             st.session_state["last_crop"] = str(crop)
+            st.session_state["last_fertilizer"] = plan
             translated_crop_name = t_crop(str(crop))
             st.success(f"**{t('Recommended Crop Grown')}: {translated_crop_name.upper()}**")
+            if plan:
+                show_fertilizer(plan)
             st.session_state["page"] = "Fertilizer Recommendation"
         else:
             st.error(err or "Prediction error")
@@ -545,17 +555,20 @@ def page_fertilizer(crops):
     st.markdown("<div class='semi-card'>", unsafe_allow_html=True)
     st.header(t("Fertilizer Recommendation"))
 
-    # Use format_func to display translated crop name
-    crop = st.selectbox(t("Select Crop"), crops, format_func=t_crop)
+    # Use format_func to display translated crop name; start on the last recommended crop
+    last_crop = st.session_state.get("last_crop")
+    index = crops.index(last_crop) if last_crop in crops else 0
+    crop = st.selectbox(t("Select Crop"), crops, index=index, format_func=t_crop)
 
-    if st.button(t("Get Fertilizer Recommendation")):
+    # The plan for the recommended crop came back with the crop itself; no request needed
+    plan = st.session_state.get("last_fertilizer")
+    if plan and crop == last_crop:
+        show_fertilizer(plan)
+    elif st.button(t("Get Fertilizer Recommendation")):
         ratio, err = get_fertilizer_recommendation(crop)
         if ratio:
             # Display N,P,K metrics bigger and white
-            c1, c2, c3 = st.columns(3)
-            c1.metric(label=f"{t('N')}", value=f"{ratio.get('N')}", delta=None)
-            c2.metric(label=f"{t('P')}", value=f"{ratio.get('P')}", delta=None)
-            c3.metric(label=f"{t('K')}", value=f"{ratio.get('K')}", delta=None)
+            show_fertilizer(ratio)
         else:
             st.error(err or "No fertilizer data")
 
@@ -0,0 +1,283 @@
+# batch_score.py
+"""Score whole soil-survey files offline, without going through the HTTP API.
+
+    python batch_score.py score survey.csv scored.csv --top-k 3
+    python batch_score.py score survey.parquet scored.parquet --workers 8 --chunksize 200000
+    python batch_score.py bench --synthetic-rows 10000000 --workers 1 2 4 8
+
+The models are the bundle ``flask_backend.load_models()`` serves (same
+artifacts, same smoke check, same feature encoder and prediction helpers),
+unpickled by default; ``--model-format flat`` scores with the mapped bundle,
+so a file scored here gets exactly the answers ``/predict/batch`` would
+give.  The process pool is forked after loading, so workers share the
+model copy-on-write instead of each unpickling their own copy.
+
+The parent streams the input one chunk at a time and writes results in
+input order; at most two chunks per worker are in flight, so memory stays
+bounded whatever the file size.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import flask_backend
+from fertilizer_engine import NUTRIENTS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet input/output is optional; CSV always works
+    pa = None
+    pq = None
+
+DEFAULT_CHUNKSIZE = 100_000
+# Large chunks are scored about 3x faster by sklearn's compiled trees than
+# by the flat engine, which only wins on small requests
+DEFAULT_MODEL_FORMAT = "pickle"
+
+
+# ---------------------------------------------------
+# READING / WRITING
+# ---------------------------------------------------
+def is_parquet(path):
+    return path.endswith((".parquet", ".pq"))
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield DataFrame chunks of at most ``chunksize`` rows from a CSV or Parquet file."""
+    if is_parquet(path):
+        if pq is None:
+            raise RuntimeError("pyarrow is required for Parquet files (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file, written under a temporary name."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.rows = 0
+        self._parquet = None
+        if is_parquet(path) and pq is None:
+            raise RuntimeError("pyarrow is required for Parquet files (pip install pyarrow)")
+
+    def write(self, frame):
+        if is_parquet(self.path):
+            # Text columns are typed as strings even in a chunk where every value is None
+            text = [c for c in frame.columns if frame[c].dtype == object]
+            table = pa.Table.from_pandas(frame.astype({c: "string" for c in text}), preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.tmp_path, table.schema, compression="zstd")
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            frame.to_csv(self.tmp_path, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(frame)
+
+    def _close_file(self):
+        if self._parquet is not None:
+            parquet, self._parquet = self._parquet, None
+            parquet.close()
+
+    def close(self):
+        """Finish the file and move it to its final name."""
+        self._close_file()
+        if os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Delete the partial file; an existing file at ``path`` is left as it was."""
+        try:
+            self._close_file()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+
+# ---------------------------------------------------
+# SCORING
+# ---------------------------------------------------
+def use_model_format(model_format):
+    """Serve ``model_format`` (auto, flat or pickle) from flask_backend, reloading if it changes."""
+    if flask_backend.MODEL_FORMAT != model_format or flask_backend.MODELS is None:
+        flask_backend.MODEL_FORMAT = model_format
+        flask_backend.load_models()
+
+
+def score_chunk(task):
+    """Encode, predict and look up fertilizer ratios for one chunk.
+
+    ``task`` is (first row number, frame, top_k, keep_input).  Invalid rows
+    keep their place in the output with an ``error`` and empty predictions.
+    """
+    first_row, frame, top_k, keep_input = task
+    models = flask_backend.MODELS
+    n_rows = len(frame)
+    frame = frame.reset_index(drop=True)
+    features, valid_rows, errors = models.feature_encoder.transform(frame)
+
+    out = pd.DataFrame({"row": np.arange(first_row, first_row + n_rows)})
+    crops = np.full(n_rows, None, dtype=object)
+    top_columns = {}
+    if len(valid_rows) and top_k:
+        proba = flask_backend.model_predict_proba(models, features)
+        best, labels, scores = flask_backend.rank_crops(models, proba, top_k)
+        for j in range(top_k):
+            top_columns[f"crop_{j + 1}"] = np.full(n_rows, None, dtype=object)
+            top_columns[f"crop_{j + 1}"][valid_rows] = labels[:, j]
+            top_columns[f"probability_{j + 1}"] = np.full(n_rows, np.nan)
+            top_columns[f"probability_{j + 1}"][valid_rows] = scores[:, j]
+        crops[valid_rows] = best
+    elif len(valid_rows):
+        crops[valid_rows] = flask_backend.decode_labels(
+            models, flask_backend.model_predict(models, features))
+    out["recommended_crop"] = crops
+    for name, values in top_columns.items():
+        out[name] = values
+
+    # Target N, P, K of the recommended crop, as /fertilizer_recommendation returns them
+    table = models.fertilizer_table
+    targets = np.full((n_rows, len(NUTRIENTS)), np.nan)
+    if len(valid_rows):
+        ids = table.crop_ids(crops[valid_rows].astype(str))
+        known = ids >= 0
+        targets[valid_rows[known]] = table.targets[ids[known]]
+    for k, nutrient in enumerate(NUTRIENTS):
+        out[f"ratio_{nutrient}"] = targets[:, k]
+
+    out["error"] = pd.Series(errors, index=list(errors), dtype=object).reindex(range(n_rows)).to_numpy()
+    if keep_input:
+        out = pd.concat([frame, out], axis=1)
+    return out
+
+
+def pool_context():
+    # Fork shares the loaded bundle with the workers; other start methods
+    # make each worker import flask_backend and load its own copy
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("fork" if "fork" in methods else None)
+
+
+def score_file(input_path, output_path, chunksize=DEFAULT_CHUNKSIZE, workers=None, top_k=3,
+               keep_input=False):
+    """Score ``input_path`` into ``output_path``; returns throughput stats."""
+    if flask_backend.MODELS is None:
+        raise RuntimeError(f"Models failed to load: {flask_backend.MODEL_STATUS['error']}")
+    if top_k < 0:
+        raise ValueError("top_k must be 0 or a positive integer")
+    if top_k:
+        top_k = min(int(top_k), len(flask_backend.MODELS.engine.classes))
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    writer = ChunkWriter(output_path)
+    totals = {"rows": 0, "errors": 0}
+
+    def tasks():
+        first_row = 0
+        for frame in read_chunks(input_path, chunksize):
+            yield first_row, frame, top_k, keep_input
+            first_row += len(frame)
+
+    def emit(result):
+        writer.write(result)
+        totals["rows"] += len(result)
+        totals["errors"] += int(result["error"].notna().sum())
+
+    try:
+        if workers == 1:
+            for task in tasks():
+                emit(score_chunk(task))
+        else:
+            with pool_context().Pool(workers) as pool:
+                pending = deque()
+                for task in tasks():
+                    pending.append(pool.apply_async(score_chunk, (task,)))
+                    # Bounded read-ahead; results are written in input order
+                    while len(pending) >= 2 * workers:
+                        emit(pending.popleft().get())
+                while pending:
+                    emit(pending.popleft().get())
+    except BaseException:
+        # A failed run must not leave a truncated file under the output name
+        writer.abort()
+        raise
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": totals["rows"],
+        "errors": totals["errors"],
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(totals["rows"] / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+# ---------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------
+def benchmark_workers(n_rows, worker_counts, chunksize=DEFAULT_CHUNKSIZE, top_k=3):
+    """rows/sec for each worker count on a synthetic file of ``n_rows`` rows."""
+    from data_io import write_synthetic_csv
+
+    synthetic = f"synthetic_{n_rows}.csv"
+    if not os.path.exists(synthetic):
+        print(f"Generating {synthetic}...")
+        write_synthetic_csv(synthetic, n_rows, flask_backend.SMOKE_SET_PATH)
+    results = []
+    for workers in worker_counts:
+        output = f"synthetic_{n_rows}.scored.csv"
+        results.append(score_file(synthetic, output, chunksize, workers, top_k))
+        os.remove(output)
+    return results
+
+
+def non_negative_int(value):
+    k = int(value)
+    if k < 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return k
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Offline batch scoring of soil-survey files")
+    parser.add_argument("command", choices=["score", "bench"])
+    parser.add_argument("input", nargs="?", help="CSV or Parquet file to score")
+    parser.add_argument("output", nargs="?", help="CSV or Parquet file to write")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1],
+                        help="worker processes ('bench' accepts several counts)")
+    parser.add_argument("--top-k", type=non_negative_int, default=3,
+                        help="most probable crops per row (0 = label only)")
+    parser.add_argument("--model-format", choices=["auto", "flat", "pickle"], default=DEFAULT_MODEL_FORMAT,
+                        help="bundle to score with (see MODEL_FORMAT in flask_backend)")
+    parser.add_argument("--keep-input", action="store_true", help="copy the input columns to the output")
+    parser.add_argument("--synthetic-rows", type=int, default=1_000_000, help="rows generated for 'bench'")
+    args = parser.parse_args()
+    use_model_format(args.model_format)
+
+    if args.command == "score":
+        if not args.input or not args.output:
+            parser.error("'score' needs an input and an output file")
+        stats = score_file(args.input, args.output, args.chunksize, args.workers[0], args.top_k,
+                           args.keep_input)
+        print(f"Scored {stats['rows']} rows ({stats['errors']} errors) with {stats['workers']} workers "
+              f"in {stats['seconds']} s: {stats['rows_per_sec']} rows/s")
+    else:
+        results = benchmark_workers(args.synthetic_rows, args.workers, args.chunksize, args.top_k)
+        base = results[0]["rows_per_sec"]
+        print(f"{'workers':>8} {'seconds':>9} {'rows/s':>11} {'speedup':>8}")
+        for r in results:
+            print(f"{r['workers']:>8} {r['seconds']:>9.2f} {r['rows_per_sec']:>11.0f} "
+                  f"{r['rows_per_sec'] / base:>8.2f}")
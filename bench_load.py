@@ -0,0 +1,234 @@
+# bench_load.py
+"""Latency and throughput benchmark for the crop and fertilizer endpoints.
+
+Replays rows sampled from the CSV against /predict and crop names against
+/fertilizer_recommendation at a given concurrency, and reports p50/p95/p99
+latency, throughput and error rate per endpoint.
+
+    python bench_load.py                                  # in-process test client
+    python bench_load.py --target subprocess --workers 2  # local gunicorn
+    python bench_load.py --target http://10.0.0.5:5000    # a running server
+    python bench_load.py --out run.json --baseline main.json
+
+With --baseline, any endpoint whose p95 latency or throughput is worse than
+the baseline by more than --tolerance, or whose error rate went up, is
+flagged and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(HERE, "Crop_recommendation_with_soil.csv")
+ENDPOINTS = ("predict", "fertilizer")
+
+
+# ---------------------------------------------------
+# PAYLOADS
+# ---------------------------------------------------
+def sample_payloads(endpoint, n, seed=0):
+    """Request bodies drawn from the CSV: feature rows or crop names."""
+    df = pd.read_csv(DATASET_PATH).sample(n, replace=True, random_state=seed)
+    if endpoint == "predict":
+        return "/predict", df.drop(columns="label").to_dict("records")
+    return "/fertilizer_recommendation", [{"crop": crop} for crop in df["label"]]
+
+
+# ---------------------------------------------------
+# TARGETS
+# ---------------------------------------------------
+class InProcessTarget:
+    """flask_backend loaded in this process, driven through Flask test clients."""
+
+    def __init__(self):
+        import warnings
+        warnings.filterwarnings("ignore")
+        import flask_backend
+        self.app = flask_backend.app
+        self._local = threading.local()
+
+    def post(self, path, body):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.test_client()
+        return self._local.client.post(path, json=body).status_code
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """A server reached over HTTP, one keep-alive session per client thread."""
+
+    def __init__(self, url, proc=None):
+        self.url = url.rstrip("/")
+        self.proc = proc
+        self._local = threading.local()
+
+    def post(self, path, body):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        try:
+            return self._local.session.post(self.url + path, json=body, timeout=10).status_code
+        except requests.RequestException:
+            return None
+
+    def close(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+
+
+def open_target(target, workers, threads):
+    if target == "inprocess":
+        return InProcessTarget()
+    if target == "subprocess":
+        from bench_serving import free_port, start_server
+        proc, url = start_server(workers, threads, free_port())
+        return HttpTarget(url, proc)
+    return HttpTarget(target)
+
+
+# ---------------------------------------------------
+# LOAD GENERATION
+# ---------------------------------------------------
+def summarize(latencies_s, n_errors, elapsed):
+    latencies = np.asarray(latencies_s) * 1000
+    n = len(latencies)
+    if not n:
+        return {"requests": 0, "errors": n_errors, "error_rate": None, "req_per_sec": 0.0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": n,
+        "errors": n_errors,
+        "error_rate": round(n_errors / n, 5),
+        "req_per_sec": round(n / elapsed, 1),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+
+def run_scenario(target, path, payloads, concurrency, duration):
+    """Send requests back to back from ``concurrency`` threads for ``duration`` seconds."""
+    end = time.monotonic() + duration
+
+    def client(offset):
+        latencies, errors, i = [], 0, offset
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            status = target.post(path, payloads[i % len(payloads)])
+            latencies.append(time.perf_counter() - start)
+            errors += status is None or status >= 400
+            i += concurrency
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = [l for r in results for l in r[0]]
+    return summarize(latencies, sum(r[1] for r in results), elapsed)
+
+
+# ---------------------------------------------------
+# REGRESSION CHECK
+# ---------------------------------------------------
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    flagged = []
+    for endpoint, new in results.items():
+        old = baseline.get(endpoint)
+        if not old or not old.get("requests") or not new.get("requests"):
+            continue
+        if new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            flagged.append(f"{endpoint}: p95 {old['p95_ms']:.2f} -> {new['p95_ms']:.2f} ms")
+        if new["req_per_sec"] < old["req_per_sec"] * (1 - tolerance):
+            flagged.append(f"{endpoint}: throughput {old['req_per_sec']:.1f} -> {new['req_per_sec']:.1f} req/s")
+        if new["error_rate"] > old["error_rate"]:
+            flagged.append(f"{endpoint}: error rate {old['error_rate']:.4f} -> {new['error_rate']:.4f}")
+    return flagged
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="inprocess",
+                        help="'inprocess', 'subprocess' (local gunicorn) or a base URL")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds of unrecorded load first")
+    parser.add_argument("--payloads", type=int, default=2000, help="distinct payloads sampled from the CSV")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for --target subprocess")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads for --target subprocess")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed relative slowdown before a regression is flagged")
+    args = parser.parse_args(argv)
+
+    target = open_target(args.target, args.workers, args.threads)
+    results = {}
+    try:
+        print(f"{'endpoint':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6}")
+        for endpoint in args.endpoints:
+            path, payloads = sample_payloads(endpoint, args.payloads, args.seed)
+            if args.warmup:
+                run_scenario(target, path, payloads, args.concurrency, args.warmup)
+            row = run_scenario(target, path, payloads, args.concurrency, args.duration)
+            results[endpoint] = row
+            if row["requests"]:
+                print(f"{endpoint:<12} {row['req_per_sec']:>8.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                      f"{row['p99_ms']:>8.2f} {row['error_rate'] * 100:>6.2f}")
+    finally:
+        target.close()
+
+    run = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "target": args.target,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "cpus": os.cpu_count(),
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            flagged = compare(results, json.load(f)["results"], args.tolerance)
+        for line in flagged:
+            print(f"REGRESSION {line}")
+        if flagged:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# bench_serving.py
+"""Load test gunicorn-served flask_backend at increasing worker counts.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py wsgi:app` on a
+free port, waits for /ready, then runs client processes that replay rows
+sampled from the CSV against /predict for a fixed duration.
+
+    python bench_serving.py --workers 1 2 4 --clients 8 --duration 10
+    python bench_serving.py --workers 1 --threads 16 --clients 16 --env MICRO_BATCHING=1
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+from bench_load import sample_payloads, summarize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(n_workers, threads, port, extra_env=None):
+    env = dict(os.environ, **(extra_env or {}), WEB_CONCURRENCY=str(n_workers), GUNICORN_THREADS=str(threads),
+               GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_ACCESS_LOG="/dev/null")
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url + "/ready", timeout=1).status_code == 200:
+                return proc, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn with {n_workers} workers did not become ready")
+
+
+def client_loop(url, payloads, duration):
+    """One client process: send requests back to back until ``duration`` is up."""
+    session = requests.Session()
+    latencies, errors = [], 0
+    end = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            ok = session.post(url + "/predict", json=payloads[i % len(payloads)], timeout=10).ok
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        errors += not ok
+        i += 1
+    return latencies, errors
+
+
+def run_load(url, n_clients, duration, payloads):
+    chunks = [payloads[i::n_clients] for i in range(n_clients)]
+    with ProcessPoolExecutor(n_clients) as pool:
+        futures = [pool.submit(client_loop, url, chunk, duration) for chunk in chunks]
+        results = [f.result() for f in futures]
+    return summarize([l for r in results for l in r[0]], sum(r[1] for r in results), duration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra server environment, e.g. MICRO_BATCHING=1")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    _, payloads = sample_payloads("predict", 2000)
+    results = []
+    print(f"{os.cpu_count()} CPUs; {args.clients} clients; {args.duration:.0f}s per run")
+    print(f"{'workers':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for n in args.workers:
+        proc, url = start_server(n, args.threads, free_port(), extra_env)
+        try:
+            run_load(url, args.clients, 1.0, payloads)  # warm up every worker
+            row = dict(run_load(url, args.clients, args.duration, payloads), workers=n,
+                       threads=args.threads, clients=args.clients, env=extra_env)
+        finally:
+            proc.terminate()
+            proc.wait()
+        results.append(row)
+        print(f"{n:>8} {row['req_per_sec']:>8.1f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['errors']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
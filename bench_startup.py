@@ -0,0 +1,90 @@
+# bench_startup.py
+"""Worker cold-start time and memory for the pickle vs memory-mapped bundle.
+
+Starts N worker processes that each import flask_backend (which runs
+load_models) and score one row, then reports import time plus RSS and PSS
+while all N are alive.  PSS splits shared pages between the processes that
+map them, so it shows how much of the model is actually shared.
+
+    python bench_startup.py --workers 1 4 16
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+WORKER_CODE = r"""
+import contextlib, json, sys, time, warnings
+warnings.filterwarnings("ignore")
+start = time.perf_counter()
+with contextlib.redirect_stdout(sys.stderr):
+    import flask_backend
+loaded = time.perf_counter() - start
+client = flask_backend.app.test_client()
+row = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+       "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+assert client.post("/predict", json=row).get_json()["recommended_crop"]
+mem = {}
+with open("/proc/self/smaps_rollup") as f:
+    for line in f:
+        key, _, rest = line.partition(":")
+        if key in ("Rss", "Pss"):
+            mem[key] = int(rest.split()[0])
+print(json.dumps({"load_s": loaded, "rss_kb": mem["Rss"], "pss_kb": mem["Pss"]}), flush=True)
+sys.stdin.read()
+"""
+
+
+def run_workers(n_workers, model_format):
+    env = dict(os.environ, MODEL_FORMAT=model_format)
+    here = os.path.dirname(os.path.abspath(__file__))
+    procs = [
+        subprocess.Popen([sys.executable, "-c", WORKER_CODE], cwd=here, env=env,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, text=True)
+        for _ in range(n_workers)
+    ]
+    # Every worker reports only after it has loaded, and stays alive until all
+    # have reported, so PSS reflects the pages shared between them
+    stats = [json.loads(p.stdout.readline()) for p in procs]
+    for p in procs:
+        p.stdin.close()
+        p.wait()
+    return stats
+
+
+def summarize(stats):
+    n = len(stats)
+    return {
+        "workers": n,
+        "load_s_mean": sum(s["load_s"] for s in stats) / n,
+        "rss_mb_mean": sum(s["rss_kb"] for s in stats) / n / 1024,
+        "pss_mb_mean": sum(s["pss_kb"] for s in stats) / n / 1024,
+        "pss_mb_total": sum(s["pss_kb"] for s in stats) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--formats", nargs="+", default=["pickle", "flat"])
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'format':>8} {'workers':>8} {'load s':>8} {'RSS MB':>8} {'PSS MB':>8} {'PSS total':>10}")
+    for model_format in args.formats:
+        for n in args.workers:
+            start = time.perf_counter()
+            row = dict(summarize(run_workers(n, model_format)), format=model_format,
+                       wall_s=time.perf_counter() - start)
+            results.append(row)
+            print(f"{model_format:>8} {n:>8} {row['load_s_mean']:>8.3f} {row['rss_mb_mean']:>8.1f} "
+                  f"{row['pss_mb_mean']:>8.1f} {row['pss_mb_total']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
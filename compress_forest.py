@@ -0,0 +1,360 @@
+# compress_forest.py
+"""Shrink the crop forest and report what each setting costs.
+
+    python compress_forest.py report                   # size / accuracy / latency grid
+    python compress_forest.py export --tolerance 0.005 # ship the smallest setting within tolerance
+
+A compressed forest is the saved ``crop_model.pkl`` with three kinds of
+pruning applied after the fact, so no refit is needed:
+
+- ``max_depth``: nodes at this depth become leaves;
+- ``min_samples_leaf``: a split is collapsed into a leaf when either side
+  holds fewer distinct training rows than this (``n_node_samples``, the
+  count sklearn's own ``min_samples_leaf`` uses; a row drawn twice by the
+  bootstrap counts once);
+- ``n_trees``: trees are dropped greedily, each time removing the one whose
+  absence lowers the out-of-bag probability of the true crop least.
+
+A collapsed node keeps the class counts of every bootstrap sample that
+reached it.  Thresholds are stored as float32, rounded down so that
+``x <= threshold`` gives the same answer for every float32 input (trees see
+float32 features), and leaf values as unsigned integer class counts instead
+of float64 fractions.  Only leaves carry values: split nodes are numbered
+first and leaves after them.
+
+The report is measured on a stratified held-out split with a forest refit
+on the rest using crop_model.pkl's own parameters, since the shipped model
+has seen every row.  ``export`` applies the chosen setting to crop_model.pkl
+and writes an ordinary flat bundle (``crop_model_compact/`` by default);
+point ``FLAT_BUNDLE_DIR`` at it to serve it.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from forest_engine import TREE_LEAF, FlatForest, export_forest, save_bundle
+
+DEPTHS = [None, 16, 12, 10, 8, 6]
+MIN_LEAF_SIZES = [1, 2, 4, 8]
+TREE_COUNTS = [100, 50, 30, 20, 10]
+DEFAULT_OUT = "crop_model_compact"
+DEFAULT_REPORT = "compression_report.json"
+
+
+# ---------------------------------------------------
+# OUT-OF-BAG TREE RANKING
+# ---------------------------------------------------
+def bootstrap_mask(estimator, n_samples):
+    """True for the rows in ``estimator``'s bootstrap sample.
+
+    Same draw as sklearn's forest (``RandomState(tree seed).randint``) for
+    unweighted fits without ``max_samples``.
+    """
+    indices = np.random.RandomState(estimator.random_state).randint(0, n_samples, n_samples)
+    mask = np.zeros(n_samples, dtype=bool)
+    mask[indices] = True
+    return mask
+
+
+def rank_trees(forest, X, y_encoded, in_bag):
+    """Tree indices, most useful first, by greedy out-of-bag backward elimination.
+
+    ``forest`` is a FlatForest and ``in_bag`` an (n_trees, n_rows) mask.  At
+    each step the tree whose removal keeps the mean OOB probability of the
+    true class highest is dropped; the ranking is the reverse drop order.
+    """
+    leaves = forest.apply(X)
+    n_trees, n_rows = leaves.shape
+    true_proba = np.empty((n_trees, n_rows))
+    for t in range(n_trees):
+        rows = leaves[t] - forest.value_offset
+        values = forest.value[rows, y_encoded].astype(np.float64)
+        if forest.value_total is not None:
+            values /= forest.value_total[rows, 0]
+        true_proba[t] = values
+    oob = ~in_bag
+    contribution = true_proba * oob
+
+    alive = list(range(n_trees))
+    total = contribution.sum(axis=0)
+    votes = oob.sum(axis=0).astype(np.float64)
+    dropped = []
+    while len(alive) > 1:
+        best_tree, best_score = None, -np.inf
+        for t in alive:
+            remaining = votes - oob[t]
+            scored = remaining > 0
+            score = np.mean((total[scored] - contribution[t, scored]) / remaining[scored])
+            if score > best_score:
+                best_tree, best_score = t, score
+        alive.remove(best_tree)
+        dropped.append(best_tree)
+        total -= contribution[best_tree]
+        votes -= oob[best_tree]
+    return alive + dropped[::-1]
+
+
+# ---------------------------------------------------
+# PRUNING
+# ---------------------------------------------------
+def float32_floor(values):
+    """Largest float32 not above each value, so float32 ``x <= t`` is unchanged."""
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def smallest_uint(max_value):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def pruned_nodes(tree, max_depth=None, min_samples_leaf=1):
+    """(split nodes, leaves, depth) of one sklearn tree after pruning, in sklearn node ids."""
+    splits, leaves = [], []
+    deepest = 0
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        left, right = tree.children_left[node], tree.children_right[node]
+        if (left == TREE_LEAF
+                or (max_depth is not None and depth >= max_depth)
+                # Distinct rows, not the bootstrap-weighted weighted_n_node_samples
+                or min(tree.n_node_samples[left], tree.n_node_samples[right]) < min_samples_leaf):
+            leaves.append(node)
+            deepest = max(deepest, depth)
+        else:
+            splits.append(node)
+            stack.append((right, depth + 1))
+            stack.append((left, depth + 1))
+    return splits, leaves, deepest
+
+
+def compress_forest(model, tree_ids=None, max_depth=None, min_samples_leaf=1):
+    """Flat arrays (``export_forest`` layout) for a pruned, compacted copy of ``model``."""
+    # A lone DecisionTreeClassifier (distill_model.py) is a one-tree forest
+    trees = getattr(model, "estimators_", [model])
+    estimators = [trees[i] for i in (range(len(trees)) if tree_ids is None else tree_ids)]
+    n_classes = model.n_classes_
+    pruned = [pruned_nodes(e.tree_, max_depth, min_samples_leaf) for e in estimators]
+
+    # Split nodes of every tree first, then every leaf, so value rows are leaf-only
+    n_splits = sum(len(splits) for splits, _, _ in pruned)
+    split_base, leaf_base = 0, n_splits
+    global_ids, roots = [], []
+    for splits, leaves, _ in pruned:
+        ids = {node: split_base + i for i, node in enumerate(splits)}
+        ids.update({node: leaf_base + i for i, node in enumerate(leaves)})
+        global_ids.append(ids)
+        roots.append(ids[0])
+        split_base += len(splits)
+        leaf_base += len(leaves)
+    n_nodes = leaf_base
+
+    feature = np.zeros(n_nodes, dtype=np.uint8 if model.n_features_in_ < 256 else np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float64)
+    node_ids = np.arange(n_nodes, dtype=np.int32)
+    children_left = node_ids.copy()
+    children_right = node_ids.copy()
+    counts = np.zeros((n_nodes - n_splits, n_classes))
+
+    for estimator, (splits, leaves, _), ids in zip(estimators, pruned, global_ids):
+        tree = estimator.tree_
+        if splits:
+            mine = np.array([ids[n] for n in splits])
+            splits = np.array(splits)
+            feature[mine] = tree.feature[splits]
+            threshold[mine] = tree.threshold[splits]
+            children_left[mine] = [ids[n] for n in tree.children_left[splits]]
+            children_right[mine] = [ids[n] for n in tree.children_right[splits]]
+        leaves = np.array(leaves)
+        # Class fractions times the bootstrap weight are the exact class counts
+        leaf_counts = tree.value[leaves, 0, :n_classes] * tree.weighted_n_node_samples[leaves, np.newaxis]
+        counts[np.array([ids[n] for n in leaves]) - n_splits] = np.rint(leaf_counts)
+
+    return {
+        "feature": feature,
+        "threshold": float32_floor(threshold),
+        "children_left": children_left,
+        "children_right": children_right,
+        "value": counts.astype(smallest_uint(counts.max())),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "max_depth": max(depth for _, _, depth in pruned),
+        "n_features": int(model.n_features_in_),
+        "value_offset": int(n_splits),
+    }
+
+
+# ---------------------------------------------------
+# REPORT
+# ---------------------------------------------------
+def bundle_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.endswith(".npy"))
+
+
+def single_row_latency(engine, X, n_calls=500, seed=0):
+    """p50 / p99 milliseconds of one-row predict calls."""
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n_calls)]
+    engine.predict(rows[:1])
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        engine.predict(row[np.newaxis, :])
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+
+def evaluate(arrays, artifacts, X_test, y_test, workdir):
+    """Size, accuracy and latency of one compressed forest."""
+    directory = os.path.join(workdir, "bundle")
+    save_bundle(directory, artifacts["model"], artifacts["crop_encoder"], artifacts["model_features"],
+                artifacts["fertilizer_ratios"], artifacts["soil_types"], arrays=arrays)
+    engine = FlatForest(**arrays)
+    p50, p99 = single_row_latency(engine, X_test)
+    result = {
+        "bytes": bundle_bytes(directory),
+        "nodes": len(arrays["feature"]),
+        "accuracy": round(float(np.mean(engine.predict(X_test) == y_test)), 4),
+        "p50_ms": round(p50, 4),
+        "p99_ms": round(p99, 4),
+    }
+    shutil.rmtree(directory)
+    return result
+
+
+def load_artifacts(directory="."):
+    import joblib
+
+    def path(name):
+        return os.path.join(directory, name)
+
+    model = joblib.load(path("crop_model.pkl"))
+    soil_encoder = joblib.load(path("soil_encoder.pkl"))
+    return {
+        "model": model,
+        "crop_encoder": joblib.load(path("crop_encoder.pkl")),
+        "model_features": joblib.load(path("model_features.pkl")),
+        "fertilizer_ratios": joblib.load(path("fertilizer_ratios.pkl")),
+        "soil_types": list(soil_encoder.classes_),
+    }
+
+
+def encoded_dataset(artifacts, data_path):
+    """Feature matrix and model class ids for every row of the training CSV, in file order."""
+    import pandas as pd
+
+    from features import FeatureEncoder
+
+    df = pd.read_csv(data_path)
+    encoder = FeatureEncoder(artifacts["model"].feature_names_in_, artifacts["soil_types"])
+    X = encoder.transform_frame(df).to_numpy()
+    y = artifacts["crop_encoder"].transform(df["label"].astype(str))
+    return X, y
+
+
+def build_report(artifacts, X, y, test_size=0.25, random_state=0,
+                 depths=DEPTHS, min_leaf_sizes=MIN_LEAF_SIZES, tree_counts=TREE_COUNTS):
+    """Evaluate every (depth, min leaf, trees) setting on a held-out split."""
+    from sklearn.base import clone
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state, stratify=y)
+    reference = clone(artifacts["model"]).fit(X_train, y_train)
+    in_bag = np.array([bootstrap_mask(e, len(X_train)) for e in reference.estimators_])
+    model_classes = np.searchsorted(reference.classes_, y_train)
+    test_labels = np.asarray(y_test)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        reference_artifacts = dict(artifacts, model=reference)
+        # The uncompressed float64 bundle forest_engine.py exports today
+        baseline = evaluate(export_forest(reference), reference_artifacts, X_test, test_labels, workdir)
+        rows.append(dict(baseline, setting="baseline", max_depth=None, min_samples_leaf=1,
+                         n_trees=len(reference.estimators_)))
+
+        for depth in depths:
+            for min_leaf in min_leaf_sizes:
+                full = FlatForest(**compress_forest(reference, None, depth, min_leaf))
+                ranking = rank_trees(full, X_train, model_classes, in_bag)
+                for n_trees in tree_counts:
+                    if n_trees > len(ranking):
+                        continue
+                    arrays = compress_forest(reference, ranking[:n_trees], depth, min_leaf)
+                    result = evaluate(arrays, reference_artifacts, X_test, test_labels, workdir)
+                    rows.append(dict(result, setting=f"d{depth or 'max'}-l{min_leaf}-t{n_trees}",
+                                     max_depth=depth, min_samples_leaf=min_leaf, n_trees=n_trees))
+                    print(f"{rows[-1]['setting']:>14} {result['bytes'] / 1024:>9.1f} "
+                          f"{result['accuracy']:>9.4f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f}")
+    return rows
+
+
+def choose_setting(rows, tolerance):
+    """Smallest compressed setting whose accuracy is within ``tolerance`` of the baseline."""
+    baseline = rows[0]
+    eligible = [r for r in rows[1:] if r["accuracy"] >= baseline["accuracy"] - tolerance]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r["bytes"], r["p50_ms"]))
+
+
+def export_compressed(artifacts, X, y, setting, out_dir, sources=()):
+    """Apply ``setting`` to crop_model.pkl (trees ranked on its own OOB rows) and save a bundle."""
+    model = artifacts["model"]
+    full = FlatForest(**compress_forest(model, None, setting["max_depth"], setting["min_samples_leaf"]))
+    in_bag = np.array([bootstrap_mask(e, len(X)) for e in model.estimators_])
+    ranking = rank_trees(full, X, np.searchsorted(model.classes_, y), in_bag)
+    arrays = compress_forest(model, ranking[:setting["n_trees"]], setting["max_depth"],
+                             setting["min_samples_leaf"])
+    save_bundle(out_dir, model, artifacts["crop_encoder"], artifacts["model_features"],
+                artifacts["fertilizer_ratios"], artifacts["soil_types"], sources=sources, arrays=arrays)
+    return arrays
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    parser = argparse.ArgumentParser(description="Forest compression and trade-off report")
+    parser.add_argument("command", choices=["report", "export"])
+    parser.add_argument("--data", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="JSON report written by 'report', read by 'export'")
+    parser.add_argument("--tolerance", type=float, default=0.005,
+                        help="largest held-out accuracy drop accepted by 'export'")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="bundle directory written by 'export'")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    artifacts = load_artifacts()
+    X, y = encoded_dataset(artifacts, args.data)
+
+    if args.command == "report" or not os.path.exists(args.report):
+        print(f"{'setting':>14} {'KiB':>9} {'accuracy':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        rows = build_report(artifacts, X, y)
+        with open(args.report, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.report}")
+    else:
+        with open(args.report) as f:
+            rows = json.load(f)
+
+    if args.command == "export":
+        chosen = choose_setting(rows, args.tolerance)
+        if chosen is None:
+            raise SystemExit(f"No setting keeps accuracy within {args.tolerance} of the baseline")
+        sources = ["crop_model.pkl", "crop_encoder.pkl", "model_features.pkl",
+                   "fertilizer_ratios.pkl", "soil_encoder.pkl"]
+        arrays = export_compressed(artifacts, X, y, chosen, args.out, sources)
+        print(f"Exported {chosen['setting']} to {args.out}/: {bundle_bytes(args.out) / 1024:.1f} KiB, "
+              f"held-out accuracy {chosen['accuracy']} (baseline {rows[0]['accuracy']})")
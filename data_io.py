@@ -0,0 +1,325 @@
+# data_io.py
+"""Chunked, compact-dtype ingestion of the crop survey CSV.
+
+Survey exports can be far larger than RAM, so nothing here ever holds more
+than one chunk plus fixed-size state:
+
+- ``iter_chunks`` streams the CSV with float32 numerics and categorical
+  ``soil_type`` / ``label`` columns.
+- ``NutrientAggregator`` accumulates per-crop N/P/K sums and counts, giving
+  the same result as ``df.groupby('label')[['N', 'P', 'K']].mean()``.
+- ``ReservoirSample`` keeps a uniform random sample of a fixed number of rows
+  for fitting the crop model.
+
+Scikit-learn trees work on float32 internally, so the compact numeric dtype
+does not change what the forest sees.
+
+``write_columnar_cache`` converts the CSV to a Parquet file that stores the
+CSV's hash.  ``read_dataset`` and ``iter_dataset_chunks`` use that file when
+it is still fresh and fall back to the CSV otherwise, or when pyarrow is not
+installed.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from forest_engine import file_sha256
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet cache is optional; CSV always works
+    pa = None
+    pq = None
+
+NUMERIC_COLUMNS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+NUTRIENT_COLUMNS = ["N", "P", "K"]
+
+CSV_DTYPES = {column: np.float32 for column in NUMERIC_COLUMNS}
+CSV_DTYPES.update({"soil_type": "category", "label": "category"})
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Keys stored in the Parquet schema metadata to detect a stale cache
+SOURCE_HASH_KEY = b"source_sha256"
+SOURCE_STAT_KEY = b"source_size_mtime"
+
+
+# ---------------------------------------------------
+# READING
+# ---------------------------------------------------
+def iter_chunks(path, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    """Yield DataFrame chunks of at most ``chunksize`` rows with compact dtypes."""
+    dtypes = CSV_DTYPES if usecols is None else {c: CSV_DTYPES[c] for c in usecols}
+    yield from pd.read_csv(path, dtype=dtypes, usecols=usecols, chunksize=chunksize)
+
+
+def read_csv_compact(path):
+    """Read a whole (small) CSV with the same compact dtypes as ``iter_chunks``."""
+    return pd.read_csv(path, dtype=CSV_DTYPES)
+
+
+def read_dataset(path, columns=None):
+    """Read the dataset from its columnar cache when fresh, else from the CSV."""
+    cache_path = columnar_cache_path(path)
+    if cache_is_fresh(path, cache_path):
+        return pd.read_parquet(cache_path, columns=columns)
+    if columns is None:
+        return read_csv_compact(path)
+    return pd.read_csv(path, dtype={c: CSV_DTYPES[c] for c in columns}, usecols=columns)
+
+
+def iter_dataset_chunks(path, chunksize=DEFAULT_CHUNKSIZE, usecols=None):
+    """Like ``iter_chunks`` but served from the Parquet cache when it is fresh."""
+    cache_path = columnar_cache_path(path)
+    if not cache_is_fresh(path, cache_path):
+        yield from iter_chunks(path, chunksize, usecols)
+        return
+    for batch in pq.ParquetFile(cache_path).iter_batches(batch_size=chunksize, columns=usecols):
+        yield batch.to_pandas()
+
+
+def scan_categories(path, columns=("soil_type", "label"), chunksize=DEFAULT_CHUNKSIZE):
+    """Sorted distinct values of the given columns, read one chunk at a time."""
+    seen = {column: set() for column in columns}
+    for chunk in iter_dataset_chunks(path, chunksize, usecols=list(columns)):
+        for column in columns:
+            seen[column].update(chunk[column].dropna().unique().tolist())
+    return {column: sorted(values) for column, values in seen.items()}
+
+
+# ---------------------------------------------------
+# STREAMING AGGREGATES
+# ---------------------------------------------------
+class NutrientAggregator:
+    """Per-crop running sums and counts of N, P and K.
+
+    Sums are kept in float64, so for the bundled CSV (integer nutrient values)
+    the means are bit-identical to a full in-memory groupby.
+    """
+
+    def __init__(self):
+        self.sums = {}
+        self.counts = {}
+
+    def update(self, chunk):
+        values = chunk[NUTRIENT_COLUMNS].astype(np.float64)
+        grouped = values.groupby(chunk["label"], observed=True)
+        sums = grouped.sum()
+        counts = grouped.size()
+        for label, row in zip(sums.index.tolist(), sums.to_numpy()):
+            if label in self.sums:
+                self.sums[label] += row
+            else:
+                self.sums[label] = row.copy()
+            self.counts[label] = self.counts.get(label, 0) + int(counts[label])
+
+    def ratios(self):
+        """{crop: {"N": mean, "P": mean, "K": mean}}, the fertilizer_ratios.pkl layout."""
+        return {
+            label: dict(zip(NUTRIENT_COLUMNS, (self.sums[label] / self.counts[label]).tolist()))
+            for label in sorted(self.sums)
+        }
+
+
+class ReservoirSample:
+    """Uniform sample of at most ``size`` rows from a stream of chunks.
+
+    Every row gets a random key and the ``size`` rows with the smallest keys
+    are kept, which is a uniform sample without replacement regardless of how
+    the stream is chunked or ordered (the bundled CSV is sorted by crop).
+    The sample is indexed by each row's 0-based position in the stream.
+    """
+
+    def __init__(self, size, random_state=42):
+        self.size = int(size)
+        self.rng = np.random.default_rng(random_state)
+        self.rows = None
+        self.keys = np.empty(0)
+        self.seen = 0
+
+    def update(self, chunk):
+        chunk = chunk.set_axis(pd.RangeIndex(self.seen, self.seen + len(chunk)))
+        self.seen += len(chunk)
+        keys = self.rng.random(len(chunk))
+        if self.rows is None:
+            rows, all_keys = chunk, keys
+        else:
+            rows = pd.concat([self.rows, chunk])
+            all_keys = np.concatenate([self.keys, keys])
+            # Chunks carry different category sets, which concat widens to strings
+            for column in ("soil_type", "label"):
+                if column in rows.columns:
+                    rows[column] = rows[column].astype("category")
+
+        if len(all_keys) > self.size:
+            keep = np.argpartition(all_keys, self.size - 1)[:self.size]
+            keep.sort()
+            rows, all_keys = rows.iloc[keep], all_keys[keep]
+        self.rows = rows
+        self.keys = all_keys
+
+    def frame(self):
+        return self.rows if self.rows is not None else pd.DataFrame(columns=list(CSV_DTYPES))
+
+
+def stream_dataset(path, chunksize=DEFAULT_CHUNKSIZE, sample_rows=200_000, random_state=42):
+    """One pass over the CSV returning (fertilizer ratios, training sample, rows seen)."""
+    aggregator = NutrientAggregator()
+    sample = ReservoirSample(sample_rows, random_state)
+    for chunk in iter_dataset_chunks(path, chunksize):
+        aggregator.update(chunk)
+        sample.update(chunk)
+    return aggregator.ratios(), sample.frame(), sample.seen
+
+
+# ---------------------------------------------------
+# COLUMNAR CACHE
+# ---------------------------------------------------
+def columnar_cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def file_stat_key(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def arrow_schema(columns=None):
+    fields = [pa.field(c, pa.float32()) for c in NUMERIC_COLUMNS]
+    fields += [pa.field(c, pa.dictionary(pa.int32(), pa.string())) for c in ("label", "soil_type")]
+    schema = pa.schema(fields)
+    if columns is not None:
+        schema = pa.schema([schema.field(c) for c in columns])
+    return schema
+
+
+def cache_is_fresh(csv_path, cache_path):
+    """True if the Parquet cache exists and was built from the current CSV.
+
+    The size/mtime recorded at conversion time is checked first; the CSV is
+    only re-hashed when those differ (e.g. after a fresh git checkout).
+    """
+    if pq is None or not os.path.exists(cache_path) or not os.path.exists(csv_path):
+        return False
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+    except Exception:
+        return False
+    if SOURCE_HASH_KEY not in metadata:
+        return False
+    if metadata.get(SOURCE_STAT_KEY, b"").decode() == file_stat_key(csv_path):
+        return True
+    return metadata[SOURCE_HASH_KEY].decode() == file_sha256(csv_path)
+
+
+def write_columnar_cache(csv_path, cache_path=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Convert the CSV to Parquet one chunk (row group) at a time.
+
+    The file is written under a temporary name and renamed into place, and
+    the CSV hash plus size/mtime go into the schema metadata.
+    """
+    if pq is None:
+        raise RuntimeError("pyarrow is required for the columnar cache (pip install pyarrow)")
+    cache_path = cache_path or columnar_cache_path(csv_path)
+
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    schema = arrow_schema([c for c in header if c in CSV_DTYPES])
+    schema = schema.with_metadata({
+        SOURCE_HASH_KEY: file_sha256(csv_path).encode(),
+        SOURCE_STAT_KEY: file_stat_key(csv_path).encode(),
+    })
+
+    tmp_path = cache_path + ".tmp"
+    rows = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        for chunk in iter_chunks(csv_path, chunksize):
+            table = pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    os.replace(tmp_path, cache_path)
+    return cache_path, rows
+
+
+# ---------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------
+READ_BENCH_CODE = r"""
+import json, resource, sys, time
+import pandas as pd
+import data_io
+baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if sys.argv[2] == "parquet":
+    df = pd.read_parquet(sys.argv[1])
+elif sys.argv[2] == "csv-compact":
+    df = data_io.read_csv_compact(sys.argv[1])
+else:
+    df = pd.read_csv(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"rows": len(df), "seconds": elapsed,
+                  "frame_mb": df.memory_usage(deep=True).sum() / 2 ** 20,
+                  "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024}))
+"""
+
+
+def write_synthetic_csv(path, n_rows, template_path, chunksize=1_000_000, random_state=0):
+    """Write an ``n_rows`` CSV by resampling the template with small numeric jitter."""
+    template = pd.read_csv(template_path)
+    rng = np.random.default_rng(random_state)
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < n_rows:
+            size = min(chunksize, n_rows - written)
+            chunk = template.iloc[rng.integers(0, len(template), size)].reset_index(drop=True)
+            for column in NUMERIC_COLUMNS[3:]:
+                chunk[column] = chunk[column] * rng.normal(1.0, 0.01, size)
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += size
+    return path
+
+
+def benchmark_reads(csv_path):
+    """Parse time and memory of CSV vs compact CSV vs Parquet, each in a fresh process."""
+    import json
+    import subprocess
+    import sys
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cache_path, _ = write_columnar_cache(csv_path)
+    results = {}
+    for fmt, path in (("csv", csv_path), ("csv-compact", csv_path), ("parquet", cache_path)):
+        out = subprocess.run([sys.executable, "-c", READ_BENCH_CODE, path, fmt], cwd=here,
+                             capture_output=True, text=True, check=True)
+        results[fmt] = json.loads(out.stdout.strip().splitlines()[-1])
+        results[fmt]["file_mb"] = os.path.getsize(path) / 2 ** 20
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Columnar cache for the crop dataset")
+    parser.add_argument("command", choices=["convert", "bench"])
+    parser.add_argument("csv", nargs="?", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--synthetic-rows", type=int, default=0,
+                        help="for 'bench', also benchmark a generated file of this many rows")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        cache_path, rows = write_columnar_cache(args.csv)
+        print(f"Wrote {rows} rows to {cache_path}")
+    else:
+        targets = [args.csv]
+        if args.synthetic_rows:
+            synthetic = f"synthetic_{args.synthetic_rows}.csv"
+            print(f"Generating {synthetic}...")
+            targets.append(write_synthetic_csv(synthetic, args.synthetic_rows, args.csv))
+        for target in targets:
+            print(f"\n{target}")
+            print(f"{'format':>12} {'file MB':>9} {'seconds':>9} {'frame MB':>9} {'peak RSS +MB':>13}")
+            for fmt, r in benchmark_reads(target).items():
+                print(f"{fmt:>12} {r['file_mb']:>9.1f} {r['seconds']:>9.3f} "
+                      f"{r['frame_mb']:>9.1f} {r['rss_growth_mb']:>13.1f}")
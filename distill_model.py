@@ -0,0 +1,260 @@
+# distill_model.py
+"""Distil the crop forest into one shallow tree for low-end kiosks.
+
+    python distill_model.py report                       # fidelity / size / latency per depth
+    python distill_model.py export --min-agreement 0.97  # ship the shallowest tree that agrees enough
+    python distill_model.py export --max-depth 12
+
+The teacher is the saved ``crop_model.pkl``.  It labels a dense synthetic
+sample of the feature space, and a single ``DecisionTreeClassifier`` (the
+student) is fitted to those labels plus the teacher's labels for the real
+rows.  The synthetic sample is half jittered copies of real rows, which fill
+in the regions crops actually occupy, and half uniform draws over the
+observed range of every feature with a random soil, which cover the rest.
+
+The student is exported as an ordinary flat bundle (``crop_model_distilled/``
+by default) through compress_forest.compress_forest: float32 thresholds,
+integer leaf counts and one tree, so serving it needs NumPy only.  Start the
+backend with ``MODEL_FORMAT=distilled`` to serve it without importing
+scikit-learn.
+
+Fidelity is measured against the teacher on a second synthetic sample with
+a different seed: top-1 agreement (overall, near the data and where the
+teacher is confident), whether the teacher's crop is in the student's top
+three, and the mean total-variation distance between the two probability
+vectors.  Accuracy on the real rows is reported as well.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+
+from compress_forest import bundle_bytes, compress_forest, evaluate, load_artifacts, single_row_latency
+from features import NUMERIC_FEATURES, SOIL_COLUMN, FeatureEncoder
+from forest_engine import FlatForest, export_forest, save_bundle
+
+DEPTHS = [6, 8, 10, 12, 14, 16, None]
+MIN_LEAF_SIZES = [1, 5]
+TRAIN_SAMPLES = 400_000
+EVAL_SAMPLES = 100_000
+DEFAULT_OUT = "crop_model_distilled"
+DEFAULT_REPORT = "distillation_report.json"
+SOURCES = ["crop_model.pkl", "crop_encoder.pkl", "model_features.pkl", "fertilizer_ratios.pkl",
+           "soil_encoder.pkl"]
+
+
+# ---------------------------------------------------
+# SYNTHETIC SAMPLES
+# ---------------------------------------------------
+def synthetic_frame(df, n_samples, seed=0, local_share=0.5, jitter=0.5, soil_swap=0.25):
+    """Synthetic field rows (numerics and soil_type) around and between the real ones.
+
+    ``local_share`` of the rows are real rows with Gaussian noise of
+    ``jitter`` times their crop's per-feature std added, a ``soil_swap``
+    share of them with a random soil, and come first; the rest are uniform
+    over each feature's observed range.  Everything is clipped to that range.
+    """
+    rng = np.random.default_rng(seed)
+    values = df[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+    low, high = values.min(axis=0), values.max(axis=0)
+    soils = np.sort(df[SOIL_COLUMN].astype(str).unique())
+    crop_std = df[NUMERIC_FEATURES].astype("float64").groupby(df["label"].astype(str)).transform("std")
+
+    n_local = int(n_samples * local_share)
+    rows = rng.integers(0, len(df), n_local)
+    local = values[rows] + rng.normal(0.0, 1.0, (n_local, len(NUMERIC_FEATURES))) \
+        * jitter * crop_std.to_numpy()[rows]
+    local_soils = df[SOIL_COLUMN].astype(str).to_numpy()[rows]
+    swapped = rng.random(n_local) < soil_swap
+    local_soils[swapped] = rng.choice(soils, swapped.sum())
+
+    n_uniform = n_samples - n_local
+    uniform = rng.uniform(low, high, (n_uniform, len(NUMERIC_FEATURES)))
+    uniform_soils = rng.choice(soils, n_uniform)
+
+    frame = pd.DataFrame(np.clip(np.vstack([local, uniform]), low, high), columns=NUMERIC_FEATURES)
+    frame[SOIL_COLUMN] = np.concatenate([local_soils, uniform_soils])
+    return frame
+
+
+def teacher_proba(model, X):
+    """Teacher class probabilities, on all cores, in blocks to bound memory."""
+    model.set_params(n_jobs=-1)
+    try:
+        return np.vstack([model.predict_proba(X[i:i + 100_000]) for i in range(0, len(X), 100_000)])
+    finally:
+        model.set_params(n_jobs=None)
+
+
+def encoded(encoder, frame):
+    return encoder.transform_frame(frame).to_numpy(dtype=np.float32)
+
+
+# ---------------------------------------------------
+# STUDENT
+# ---------------------------------------------------
+def fit_student(X, y, feature_names, max_depth=None, min_samples_leaf=1, random_state=0):
+    student = DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                     random_state=random_state)
+    # Fitted on a named frame so the exported manifest records the feature names
+    return student.fit(pd.DataFrame(X, columns=feature_names), y)
+
+
+def fidelity(engine, classes, X, proba, near_data):
+    """Agreement of a student engine with the teacher's probabilities ``proba`` on ``X``.
+
+    ``near_data`` marks the rows jittered from real ones.  Most disagreement
+    is far from the data, where the teacher itself is unsure, so agreement
+    is also given near the data and where the teacher's top crop has at
+    least half the probability.
+    """
+    student = np.zeros_like(proba)
+    student[:, np.searchsorted(classes, engine.classes)] = engine.predict_proba(X)
+    teacher_best = proba.argmax(axis=1)
+    agrees = student.argmax(axis=1) == teacher_best
+    confident = proba.max(axis=1) >= 0.5
+    top3 = np.argsort(-student, axis=1, kind="stable")[:, :3]
+    return {
+        "agreement": round(float(np.mean(agrees)), 4),
+        "agreement_near_data": round(float(np.mean(agrees[near_data])), 4),
+        "agreement_confident": round(float(np.mean(agrees[confident])), 4),
+        "teacher_in_top3": round(float(np.mean((top3 == teacher_best[:, np.newaxis]).any(axis=1))), 4),
+        "mean_tv_distance": round(float(np.mean(np.abs(student - proba).sum(axis=1) / 2)), 4),
+    }
+
+
+class Distiller:
+    """Teacher-labelled training and evaluation samples, built once per report."""
+
+    def __init__(self, artifacts, df, train_samples=TRAIN_SAMPLES, eval_samples=EVAL_SAMPLES, seed=0):
+        model = artifacts["model"]
+        self.artifacts = artifacts
+        self.classes = np.asarray(model.classes_)
+        self.feature_names = [str(f) for f in model.feature_names_in_]
+        encoder = FeatureEncoder(self.feature_names, artifacts["soil_types"])
+
+        self.X_real = encoded(encoder, df)
+        self.y_real = artifacts["crop_encoder"].transform(df["label"].astype(str))
+        X_synthetic = encoded(encoder, synthetic_frame(df, train_samples, seed))
+        # The student learns the teacher's answers for the real rows too
+        self.X_train = np.vstack([X_synthetic, self.X_real])
+        self.y_train = self.classes[teacher_proba(model, self.X_train).argmax(axis=1)]
+        self.X_eval = encoded(encoder, synthetic_frame(df, eval_samples, seed + 1))
+        self.eval_proba = teacher_proba(model, self.X_eval)
+        self.eval_near_data = np.arange(eval_samples) < int(eval_samples * 0.5)
+
+    def student(self, max_depth=None, min_samples_leaf=1):
+        start = time.perf_counter()
+        tree = fit_student(self.X_train, self.y_train, self.feature_names, max_depth, min_samples_leaf)
+        fit_s = time.perf_counter() - start
+        if len(tree.classes_) != len(self.classes):
+            raise ValueError("The teacher never predicted some crops; add more synthetic samples")
+        return tree, fit_s
+
+    def evaluate(self, arrays, workdir):
+        """Bundle size, latency and fidelity of one exported student (or of the teacher)."""
+        engine = FlatForest(**arrays)
+        teacher_best = self.classes[self.eval_proba.argmax(axis=1)]
+        result = evaluate(arrays, self.artifacts, self.X_eval, teacher_best, workdir)
+        result.pop("accuracy")
+        result.update(fidelity(engine, self.classes, self.X_eval, self.eval_proba, self.eval_near_data))
+        result["dataset_accuracy"] = round(float(np.mean(engine.predict(self.X_real) == self.y_real)), 4)
+        return result
+
+
+# ---------------------------------------------------
+# REPORT
+# ---------------------------------------------------
+def build_report(artifacts, df, depths=DEPTHS, min_leaf_sizes=MIN_LEAF_SIZES,
+                 train_samples=TRAIN_SAMPLES, eval_samples=EVAL_SAMPLES):
+    """Evaluate the teacher and a student per (depth, min leaf) setting."""
+    distiller = Distiller(artifacts, df, train_samples, eval_samples)
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        teacher = distiller.evaluate(export_forest(artifacts["model"]), workdir)
+        rows.append(dict(teacher, setting="teacher", max_depth=None, min_samples_leaf=None, fit_s=None))
+        print_row(rows[-1])
+        for depth in depths:
+            for min_leaf in min_leaf_sizes:
+                tree, fit_s = distiller.student(depth, min_leaf)
+                result = distiller.evaluate(compress_forest(tree), workdir)
+                rows.append(dict(result, setting=f"d{depth or 'max'}-l{min_leaf}", max_depth=depth,
+                                 min_samples_leaf=min_leaf, fit_s=round(fit_s, 2)))
+                print_row(rows[-1])
+    return rows
+
+
+def print_row(row):
+    print(f"{row['setting']:>9} {row['bytes'] / 1024:>9.1f} {row['nodes']:>7} {row['agreement']:>9.4f} "
+          f"{row['agreement_near_data']:>6.4f} {row['agreement_confident']:>6.4f} {row['teacher_in_top3']:>6.4f} {row['mean_tv_distance']:>7.4f} {row['dataset_accuracy']:>8.4f} "
+          f"{row['p50_ms']:>7.3f}")
+
+
+def choose_setting(rows, min_agreement):
+    """The smallest student whose agreement with the teacher near the data is at least ``min_agreement``."""
+    candidates = [r for r in rows[1:] if r["agreement_near_data"] >= min_agreement]
+    return min(candidates, key=lambda r: (r["bytes"], -r["agreement"])) if candidates else None
+
+
+def export_distilled(artifacts, df, max_depth, min_samples_leaf, out_dir, sources=(),
+                     train_samples=TRAIN_SAMPLES):
+    """Fit one student on a fresh teacher-labelled sample and write it as a flat bundle."""
+    distiller = Distiller(artifacts, df, train_samples, eval_samples=1)
+    tree, _ = distiller.student(max_depth, min_samples_leaf)
+    arrays = compress_forest(tree)
+    save_bundle(out_dir, tree, artifacts["crop_encoder"], artifacts["model_features"],
+                artifacts["fertilizer_ratios"], artifacts["soil_types"], sources=sources, arrays=arrays)
+    return arrays
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    from data_io import read_dataset
+
+    parser = argparse.ArgumentParser(description="Distil the crop forest into a single shallow tree")
+    parser.add_argument("command", choices=["report", "export"])
+    parser.add_argument("--data", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="JSON report written by 'report', read by 'export'")
+    parser.add_argument("--samples", type=int, default=TRAIN_SAMPLES, help="synthetic rows the student is fitted on")
+    parser.add_argument("--min-agreement", type=float, default=0.97,
+                        help="smallest top-1 agreement with the teacher near the data accepted by 'export'")
+    parser.add_argument("--max-depth", type=int, help="export this depth instead of choosing from the report")
+    parser.add_argument("--min-samples-leaf", type=int, default=1)
+    parser.add_argument("--out", default=DEFAULT_OUT, help="bundle directory written by 'export'")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    artifacts = load_artifacts()
+    df = read_dataset(args.data)
+
+    if args.command == "report" or (args.max_depth is None and not os.path.exists(args.report)):
+        print(f"{'setting':>9} {'KiB':>9} {'nodes':>7} {'agreement':>9} {'near':>6} {'conf':>6} {'top3':>6} {'TV':>7} "
+              f"{'accuracy':>8} {'p50 ms':>7}")
+        rows = build_report(artifacts, df, train_samples=args.samples)
+        with open(args.report, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.report}")
+    elif args.max_depth is None:
+        with open(args.report) as f:
+            rows = json.load(f)
+
+    if args.command == "export":
+        if args.max_depth is not None:
+            depth, min_leaf = args.max_depth, args.min_samples_leaf
+        else:
+            chosen = choose_setting(rows, args.min_agreement)
+            if chosen is None:
+                raise SystemExit(f"No student reaches {args.min_agreement} agreement with the teacher")
+            depth, min_leaf = chosen["max_depth"], chosen["min_samples_leaf"]
+        arrays = export_distilled(artifacts, df, depth, min_leaf, args.out, SOURCES, args.samples)
+        p50, _ = single_row_latency(FlatForest(**arrays), encoded(
+            FeatureEncoder(artifacts["model"].feature_names_in_, artifacts["soil_types"]), df))
+        print(f"Exported a depth-{arrays['max_depth']} student to {args.out}/: "
+              f"{bundle_bytes(args.out) / 1024:.1f} KiB, {len(arrays['feature'])} nodes, p50 {p50:.3f} ms")
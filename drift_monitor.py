@@ -0,0 +1,264 @@
+# drift_monitor.py
+"""Constant-memory input drift monitoring for the prediction endpoints.
+
+``train_model.py`` saves a reference profile of the training rows
+(``drift_reference.pkl``): for each of the seven numeric features, the
+decile edges of its training values and how many rows fell in each bin,
+plus the soil type and crop label counts.
+
+``DriftMonitor`` keeps the same counts for live traffic.  Recording a row
+is a bisect over eleven bounds per feature and a few integer increments, so
+each request costs a few microseconds and the monitor's memory does not
+grow with traffic.  Values below or above the training range get bins of
+their own, which the reference never fills.
+
+Counts are kept per window of ``window_seconds``.  When a window closes it
+is scored against the reference, the scores are kept as the previous
+window, and counting starts again.  Scores are the population stability
+index (PSI) of every feature, soil type and predicted crop, and for the
+numerics the Kolmogorov-Smirnov statistic over the binned distributions.
+A PSI of 0.1 is usually read as a moderate shift and 0.2 as a significant
+one.  Each process keeps its own counts, like its metrics.
+
+    python drift_monitor.py build        # rebuild drift_reference.pkl only
+    python drift_monitor.py bench        # microseconds per recorded request
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from features import NUMERIC_FEATURES, SOIL_COLUMN
+
+N_BINS = 10
+PSI_ALERT = 0.2
+# Proportions are floored at this before the PSI log ratio, so empty bins stay finite
+PSI_EPSILON = 1e-4
+
+
+# ---------------------------------------------------
+# REFERENCE PROFILE
+# ---------------------------------------------------
+def bin_bounds(low, high, edges):
+    """Sorted boundaries whose right bisection gives a value's bin.
+
+    Bin 0 is below ``low`` and bin len(edges) + 2 above ``high``; ``high``
+    itself still falls in the last in-range bin.
+    """
+    return [low] + list(edges) + [math.nextafter(high, math.inf)]
+
+
+def bin_values(values, bounds):
+    """Bin numbers of an array of values (same bins as DriftMonitor.observe)."""
+    return np.searchsorted(bounds, values, side="right")
+
+
+def build_reference(df, labels=None, n_bins=N_BINS):
+    """Reference profile of a training DataFrame (numerics, soil_type and label)."""
+    numeric = {}
+    for feature in NUMERIC_FEATURES:
+        values = df[feature].to_numpy(dtype=np.float64)
+        low, high = float(values.min()), float(values.max())
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(bin_values(values, bin_bounds(low, high, edges)), minlength=len(edges) + 3)
+        numeric[feature] = {"low": low, "high": high, "edges": edges.tolist(), "counts": counts.tolist()}
+
+    labels = df["label"] if labels is None else labels
+    return {
+        "rows": len(df),
+        "numeric": numeric,
+        SOIL_COLUMN: df[SOIL_COLUMN].astype(str).value_counts().to_dict(),
+        "label": labels.astype(str).value_counts().to_dict(),
+    }
+
+
+# ---------------------------------------------------
+# SCORES
+# ---------------------------------------------------
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64) / max(sum(expected), 1), PSI_EPSILON)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64) / max(sum(actual), 1), PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected, actual):
+    """Largest gap between the two cumulative distributions, at the bin edges."""
+    expected = np.cumsum(expected) / max(sum(expected), 1)
+    actual = np.cumsum(actual) / max(sum(actual), 1)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def category_counts(reference_counts, counts):
+    """Aligned (expected, actual) vectors over the union of both categories."""
+    names = sorted(set(reference_counts) | set(counts))
+    return [reference_counts.get(n, 0) for n in names], [counts.get(n, 0) for n in names]
+
+
+def score_window(reference, window, psi_alert=PSI_ALERT):
+    """PSI / KS of one window of counts against the reference profile."""
+    features = {}
+    for feature in NUMERIC_FEATURES:
+        expected = reference["numeric"][feature]["counts"]
+        actual = window["numeric"][feature]
+        features[feature] = {
+            "psi": round(psi(expected, actual), 4),
+            "ks": round(binned_ks(expected, actual), 4),
+            "below_range": actual[0],
+            "above_range": actual[-1],
+        }
+    for name in (SOIL_COLUMN, "label"):
+        features[name] = {"psi": round(psi(*category_counts(reference[name], window[name])), 4)}
+
+    drifted = sorted(name for name, scores in features.items() if scores["psi"] >= psi_alert)
+    return {
+        "rows": window["rows"],
+        "started_at": window["started_at"],
+        "ended_at": window.get("ended_at"),
+        "features": features,
+        "max_psi": max(scores["psi"] for scores in features.values()) if window["rows"] else None,
+        "drifted": drifted if window["rows"] else [],
+    }
+
+
+# ---------------------------------------------------
+# LIVE MONITOR
+# ---------------------------------------------------
+class DriftMonitor:
+    """Thread-safe fixed-size counts of live inputs and predictions, scored per window."""
+
+    def __init__(self, reference, window_seconds=3600.0, psi_alert=PSI_ALERT):
+        self.reference = reference
+        self.window_seconds = float(window_seconds)
+        self.psi_alert = float(psi_alert)
+        # Bin boundaries per numeric feature, in NUMERIC_FEATURES order
+        self._bounds = [bin_bounds(spec["low"], spec["high"], spec["edges"])
+                        for spec in (reference["numeric"][f] for f in NUMERIC_FEATURES)]
+        self._lock = threading.Lock()
+        self.previous = None
+        self._start_window(time.time())
+
+    def _start_window(self, now):
+        self._window_started = time.monotonic()
+        self._counts = [[0] * (len(bounds) + 1) for bounds in self._bounds]
+        self._soils = {}
+        self._labels = {}
+        self._rows = 0
+        self._started_at = now
+
+    def _window(self):
+        return {
+            "rows": self._rows,
+            "started_at": self._started_at,
+            "numeric": dict(zip(NUMERIC_FEATURES, [list(c) for c in self._counts])),
+            SOIL_COLUMN: dict(self._soils),
+            "label": dict(self._labels),
+        }
+
+    def _rotate_if_due(self):
+        # Called with the lock held
+        if time.monotonic() - self._window_started < self.window_seconds:
+            return
+        window = self._window()
+        window["ended_at"] = time.time()
+        self.previous = score_window(self.reference, window, self.psi_alert)
+        if self.previous["drifted"]:
+            print(f"Input Drift: PSI >= {self.psi_alert} for {', '.join(self.previous['drifted'])} "
+                  f"over the last {self.previous['rows']} rows")
+        self._start_window(window["ended_at"])
+
+    def observe(self, values, soil_type, label):
+        """Record one row: the seven numerics in NUMERIC_FEATURES order, its soil and the predicted crop."""
+        with self._lock:
+            self._rotate_if_due()
+            for counts, bounds, value in zip(self._counts, self._bounds, values):
+                counts[bisect_right(bounds, value)] += 1
+            self._soils[soil_type] = self._soils.get(soil_type, 0) + 1
+            self._labels[label] = self._labels.get(label, 0) + 1
+            self._rows += 1
+
+    def observe_batch(self, values, soil_types, labels):
+        """Record many rows: an (n, 7) array, and n soil types and predicted crops."""
+        values = np.asarray(values, dtype=np.float64)
+        binned = [np.bincount(bin_values(values[:, j], bounds), minlength=len(bounds) + 1)
+                  for j, bounds in enumerate(self._bounds)]
+        soils = dict(zip(*np.unique(np.asarray(soil_types, dtype=str), return_counts=True)))
+        crops = dict(zip(*np.unique(np.asarray(labels, dtype=str), return_counts=True)))
+        with self._lock:
+            self._rotate_if_due()
+            for counts, new in zip(self._counts, binned):
+                for i in np.flatnonzero(new):
+                    counts[i] += int(new[i])
+            for totals, new in ((self._soils, soils), (self._labels, crops)):
+                for name, n in new.items():
+                    totals[str(name)] = totals.get(str(name), 0) + int(n)
+            self._rows += len(values)
+
+    def report(self):
+        """Scores of the current window so far and of the last closed one."""
+        with self._lock:
+            self._rotate_if_due()
+            window = self._window()
+        return {
+            "window_seconds": self.window_seconds,
+            "psi_alert": self.psi_alert,
+            "reference_rows": self.reference["rows"],
+            "current": score_window(self.reference, window, self.psi_alert),
+            "previous": self.previous,
+        }
+
+
+# ---------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------
+def benchmark(reference, df, n_calls=100_000):
+    """Mean microseconds per observe() call, and per row through observe_batch()."""
+    monitor = DriftMonitor(reference)
+    rows = df[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+    soils = df[SOIL_COLUMN].astype(str).tolist()
+    labels = df["label"].astype(str).tolist()
+    # The request path hands over a float list, as flask_backend does
+    calls = [(rows[i % len(rows)].tolist(), soils[i % len(rows)], labels[i % len(rows)])
+             for i in range(n_calls)]
+
+    start = time.perf_counter()
+    for values, soil, label in calls:
+        monitor.observe(values, soil, label)
+    single_us = (time.perf_counter() - start) / n_calls * 1e6
+
+    start = time.perf_counter()
+    monitor.observe_batch(rows, soils, labels)
+    batch_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+    start = time.perf_counter()
+    monitor.report()
+    report_ms = (time.perf_counter() - start) * 1000
+    return {"observe_us": single_us, "observe_batch_us_per_row": batch_us, "report_ms": report_ms}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data_io import read_dataset
+
+    parser = argparse.ArgumentParser(description="Input drift monitor")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--data", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--out", default="drift_reference.pkl", help="reference written by 'build'")
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = read_dataset(args.data)
+    if args.command == "build":
+        from train_model import atomic_dump
+
+        atomic_dump(build_reference(df), args.out)
+        print(f"Drift reference of {len(df)} rows written to {args.out}")
+    else:
+        result = benchmark(build_reference(df), df, args.calls)
+        print(f"observe():       {result['observe_us']:.2f} us per request")
+        print(f"observe_batch(): {result['observe_batch_us_per_row']:.3f} us per row")
+        print(f"report():        {result['report_ms']:.2f} ms")
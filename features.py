@@ -0,0 +1,171 @@
+# features.py
+"""One feature encoder shared by train_model.py and every serving path.
+
+A ``FeatureEncoder`` is defined by the model's ordered feature names and the
+known soil types.  Two soil encodings are supported:
+
+- ``ordinal``: a single ``soil_type_enc`` column holding the soil's index in
+  ``soil_encoder.pkl`` (what ``crop_model.pkl`` was trained on);
+- ``onehot``: ``soil_type_<name>`` columns as produced by
+  ``pd.get_dummies(..., drop_first=True)``.
+
+The column layout is checked once when the encoder is built, so artifacts
+that disagree with each other are rejected at load time instead of producing
+wrong features on every request.
+"""
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+SOIL_COLUMN = "soil_type"
+ORDINAL_SOIL_FEATURE = "soil_type_enc"
+ONEHOT_PREFIX = "soil_type_"
+SCHEMES = ("ordinal", "onehot")
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+class FeatureEncoder:
+    """Turn request dicts or DataFrames into the model's exact feature matrix."""
+
+    def __init__(self, feature_names, soil_types):
+        self.feature_names = [str(f) for f in feature_names]
+        self.soil_types = [str(s) for s in soil_types]
+        self.column_index = {name: i for i, name in enumerate(self.feature_names)}
+        if len(self.column_index) != len(self.feature_names):
+            raise ValueError("Duplicate feature names in model schema")
+
+        missing = [f for f in NUMERIC_FEATURES if f not in self.column_index]
+        if missing:
+            raise ValueError(f"Model schema is missing numeric features {missing}")
+        self.numeric_index = np.array([self.column_index[f] for f in NUMERIC_FEATURES])
+        self.numeric_columns = self.numeric_index.tolist()
+
+        soil_columns = [f for f in self.feature_names if f not in NUMERIC_FEATURES]
+        if soil_columns == [ORDINAL_SOIL_FEATURE]:
+            self.scheme = "ordinal"
+            self.soil_codes = {soil: code for code, soil in enumerate(self.soil_types)}
+        else:
+            self.scheme = "onehot"
+            names = [c[len(ONEHOT_PREFIX):] for c in soil_columns if c.startswith(ONEHOT_PREFIX)]
+            unknown = [c for c, n in zip(soil_columns, names) if n not in self.soil_types]
+            if len(names) != len(soil_columns) or unknown:
+                raise ValueError(f"Unrecognised model features {unknown or soil_columns}")
+            dropped = [s for s in self.soil_types if s not in names]
+            if len(dropped) > 1 or (dropped and dropped[0] != self.soil_types[0]):
+                raise ValueError(f"One-hot soil columns do not cover soil types {dropped}")
+            # The drop_first baseline soil maps to "no column set"
+            self.soil_codes = {soil: self.column_index.get(ONEHOT_PREFIX + soil, -1)
+                               for soil in self.soil_types}
+
+        self.soil_index = self.column_index.get(ORDINAL_SOIL_FEATURE)
+
+    @classmethod
+    def fit(cls, soil_values, scheme="ordinal"):
+        """Build the encoder for a training set's soil column."""
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown soil encoding scheme '{scheme}'")
+        soil_types = sorted(pd.Series(soil_values).dropna().astype(str).unique().tolist())
+        if scheme == "ordinal":
+            soil_features = [ORDINAL_SOIL_FEATURE]
+        else:
+            soil_features = [ONEHOT_PREFIX + soil for soil in soil_types[1:]]
+        return cls(NUMERIC_FEATURES + soil_features, soil_types)
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    # ---------------------------------------------------
+    # ENCODING
+    # ---------------------------------------------------
+    def _place_soil(self, X, codes):
+        if self.scheme == "ordinal":
+            X[:, self.soil_index] = codes
+        else:
+            rows = np.flatnonzero(codes >= 0)
+            X[rows, codes[rows]] = 1.0
+
+    def encode_one(self, data):
+        """Encode one request dict into a (1, n_features) matrix.
+
+        Raises ValueError with a client-facing message on bad input.
+        """
+        X = np.zeros((1, self.n_features))
+        for feature, column in zip(NUMERIC_FEATURES, self.numeric_index):
+            value = data.get(feature)
+            if is_missing(value):
+                raise ValueError(f"Missing {feature}")
+            try:
+                X[0, column] = float(value)
+            except (TypeError, ValueError):
+                X[0, column] = np.nan
+            # Same messages as transform gives the batch paths
+            if not np.isfinite(X[0, column]):
+                raise ValueError(f"Invalid value for {feature}: {value!r}")
+
+        soil_type = data.get(SOIL_COLUMN)
+        if soil_type is None:
+            raise ValueError("Missing soil_type")
+        code = self.soil_codes.get(soil_type) if isinstance(soil_type, str) else None
+        if code is None:
+            raise ValueError(f"Soil type '{soil_type}' not recognized")
+        self._place_soil(X, np.array([code]))
+        return X
+
+    def transform(self, frame):
+        """Validate and encode a DataFrame column-wise.
+
+        Returns the (n_valid, n_features) matrix, the positions of the valid
+        rows and a {row: error message} dict for the rejected ones.
+        """
+        n_rows = len(frame)
+        errors = {}
+        numeric = np.empty((n_rows, len(NUMERIC_FEATURES)))
+
+        for j, feature in enumerate(NUMERIC_FEATURES):
+            if feature not in frame.columns:
+                values = pd.Series([None] * n_rows, index=frame.index, dtype=object)
+            else:
+                values = frame[feature]
+            parsed = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            bad = np.flatnonzero(~np.isfinite(parsed))
+            # tolist() gives plain Python values, so messages show inf rather than np.float64(inf)
+            for i, value in zip(bad, values.iloc[bad].tolist()):
+                if i in errors:
+                    continue
+                if is_missing(value):
+                    errors[i] = f"Missing {feature}"
+                else:
+                    errors[i] = f"Invalid value for {feature}: {value!r}"
+            numeric[:, j] = parsed
+
+        if SOIL_COLUMN in frame.columns:
+            soils = frame[SOIL_COLUMN]
+        else:
+            soils = pd.Series([None] * n_rows, index=frame.index, dtype=object)
+        codes = soils.map(lambda v: self.soil_codes.get(v) if isinstance(v, str) else None)
+        for i in np.flatnonzero(codes.isna().to_numpy()):
+            if i in errors:
+                continue
+            if is_missing(soils.iloc[i]):
+                errors[i] = "Missing soil_type"
+            else:
+                errors[i] = f"Soil type '{soils.iloc[i]}' not recognized"
+
+        valid_rows = np.array([i for i in range(n_rows) if i not in errors], dtype=int)
+        X = np.zeros((len(valid_rows), self.n_features))
+        X[:, self.numeric_index] = numeric[valid_rows]
+        self._place_soil(X, codes.to_numpy(dtype=float, na_value=-1)[valid_rows].astype(int))
+        return X, valid_rows, errors
+
+    def transform_frame(self, frame):
+        """Encode a training DataFrame as a model-ready DataFrame; every row must be valid."""
+        X, _, errors = self.transform(frame)
+        if errors:
+            row, message = next(iter(sorted(errors.items())))
+            raise ValueError(f"{len(errors)} invalid rows, first at {row}: {message}")
+        return pd.DataFrame(X, columns=self.feature_names, index=frame.index)
@@ -0,0 +1,151 @@
+# fertilizer_engine.py
+"""Deficit-based fertilizer doses, vectorized over any number of fields.
+
+The per-crop targets are the mean N, P, K of the crop in the training data
+(``fertilizer_ratios.pkl``).  For each field the deficit is the target minus
+the measured soil value, floored at zero, and it is met with three common
+products:
+
+- DAP (18-46-0) covers the P deficit, and its N counts towards the N deficit;
+- urea (46-0-0) covers the N still missing;
+- MOP (0-0-60) covers the K deficit.
+
+P and K are treated as P2O5 and K2O, the basis product grades are quoted on,
+and doses are in the same per-area unit as the inputs (kg/ha for the bundled
+dataset).
+"""
+
+import numpy as np
+import pandas as pd
+
+from features import is_missing
+
+NUTRIENTS = ["N", "P", "K"]
+PRODUCTS = ["urea", "DAP", "MOP"]
+
+# Nutrient fraction of each product, rows in PRODUCTS order, columns N, P2O5, K2O
+PRODUCT_GRADES = np.array([
+    [0.46, 0.00, 0.00],   # urea
+    [0.18, 0.46, 0.00],   # DAP
+    [0.00, 0.00, 0.60],   # MOP
+])
+
+
+def valid_amounts(values):
+    """Mask of soil values that are finite and not negative."""
+    return np.isfinite(values) & (values >= 0)
+
+
+def soil_error(nutrient, value):
+    return f"Missing {nutrient}" if is_missing(value) else f"Invalid value for {nutrient}: {value!r}"
+
+
+def parse_soil(record):
+    """Measured N, P, K of one request dict as a (1, 3) array.
+
+    Applies the checks FertilizerTable.transform applies per row and raises
+    ValueError with the same message for the first bad nutrient.
+    """
+    soil = np.empty((1, len(NUTRIENTS)))
+    for j, nutrient in enumerate(NUTRIENTS):
+        value = record.get(nutrient)
+        try:
+            soil[0, j] = float(value)
+        except (TypeError, ValueError):
+            soil[0, j] = np.nan
+        if not valid_amounts(soil[0, j]):
+            raise ValueError(soil_error(nutrient, value))
+    return soil
+
+
+class FertilizerTable:
+    """Per-crop N/P/K targets as an (n_crops, 3) array indexed by crop id.
+
+    Crop ids are positions in the sorted crop names, the same order
+    LabelEncoder gives crop_encoder.pkl, so model class ids index the table
+    directly.
+    """
+
+    def __init__(self, fertilizer_ratios):
+        self.crops = np.array(sorted(str(c) for c in fertilizer_ratios))
+        self.targets = np.array([[float(fertilizer_ratios[c][n]) for n in NUTRIENTS]
+                                 for c in self.crops])
+
+    def __len__(self):
+        return len(self.crops)
+
+    def crop_ids(self, names):
+        """Ids for an array of crop names (case-insensitive); -1 where unknown."""
+        names = np.char.lower(np.asarray(names, dtype=str))
+        ids = np.searchsorted(self.crops, names)
+        ids[ids == len(self.crops)] = 0
+        return np.where(self.crops[ids] == names, ids, -1)
+
+    def ratios(self, crop_ids):
+        """{"N", "P", "K"} target dicts for the given crop ids."""
+        return [dict(zip(NUTRIENTS, row)) for row in self.targets[crop_ids].tolist()]
+
+    def recommend(self, crop_ids, soil_npk):
+        """Deficits and product doses for n fields.
+
+        ``crop_ids`` has shape (n,) and ``soil_npk`` shape (n, 3).  Returns
+        (deficit, doses), both (n, 3): deficit in N, P, K order, doses in
+        PRODUCTS order.
+        """
+        deficit = np.maximum(self.targets[crop_ids] - soil_npk, 0.0)
+        doses = np.empty_like(deficit)
+        doses[:, 1] = deficit[:, 1] / PRODUCT_GRADES[1, 1]
+        n_from_dap = doses[:, 1] * PRODUCT_GRADES[1, 0]
+        doses[:, 0] = np.maximum(deficit[:, 0] - n_from_dap, 0.0) / PRODUCT_GRADES[0, 0]
+        doses[:, 2] = deficit[:, 2] / PRODUCT_GRADES[2, 2]
+        return deficit, doses
+
+    # ---------------------------------------------------
+    # REQUEST PARSING
+    # ---------------------------------------------------
+    def transform(self, frame):
+        """Validate a frame of crop + measured N, P, K rows column-wise.
+
+        Returns crop ids and soil values for the valid rows, their
+        positions, and a {row: error message} dict for the rejected ones.
+        """
+        n_rows = len(frame)
+        errors = {}
+
+        crops = frame["crop"] if "crop" in frame.columns else pd.Series([None] * n_rows, dtype=object)
+        present = np.array([isinstance(c, str) and c != "" for c in crops])
+        ids = np.full(n_rows, -1)
+        if present.any():
+            ids[present] = self.crop_ids(crops[present].to_numpy())
+        unknown = np.flatnonzero(ids < 0)
+        for i, crop in zip(unknown, crops.iloc[unknown].tolist()):
+            if present[i]:
+                errors[i] = f"No fertilizer data for crop '{crop}'"
+            elif is_missing(crop) or crop == "":
+                errors[i] = "Missing crop name"
+            else:
+                errors[i] = f"Invalid crop: {crop!r}"
+
+        soil = np.empty((n_rows, len(NUTRIENTS)))
+        for j, nutrient in enumerate(NUTRIENTS):
+            values = (frame[nutrient] if nutrient in frame.columns
+                      else pd.Series([None] * n_rows, dtype=object))
+            parsed = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            bad = np.flatnonzero(~valid_amounts(parsed))
+            # tolist() gives plain Python values, so messages show -5 rather than np.int64(-5)
+            raw = values.iloc[bad].tolist()
+            for i, value in zip(bad, raw):
+                if i not in errors:
+                    errors[i] = soil_error(nutrient, value)
+            soil[:, j] = parsed
+
+        valid_rows = np.array([i for i in range(n_rows) if i not in errors], dtype=int)
+        return ids[valid_rows], soil[valid_rows], valid_rows, errors
+
+
+def doses_json(deficit, doses):
+    """JSON-ready deficit and dose dicts for each row, rounded to 0.1."""
+    deficit = np.round(deficit, 1).tolist()
+    doses = np.round(doses, 1).tolist()
+    return [({n: v for n, v in zip(NUTRIENTS, d)}, {p: v for p, v in zip(PRODUCTS, q)})
+            for d, q in zip(deficit, doses)]
@@ -1,15 +1,77 @@
 import pandas as pd
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import os
+import json
+import hmac
+import time
+import itertools
+import threading
+from collections import namedtuple
 import joblib
 import numpy as np
+from forest_engine import FlatForest, bundle_is_stale, load_bundle
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+from features import NUMERIC_FEATURES, SOIL_COLUMN, FeatureEncoder
+from drift_monitor import DriftMonitor
+from metrics import Registry, RequestProfiler, timed
+from reloader import ArtifactWatcher
+from fertilizer_engine import NUTRIENTS, PRODUCTS, FertilizerTable, doses_json, parse_soil
 
 # ---------------------------------------------------
 # INITIALIZE FLASK APP
 # ---------------------------------------------------
 app = Flask(__name__)
-CORS(app)
+# Browsers may call the public API from any origin, but never the /admin/* routes
+CORS(app, resources={r"^/(?!admin/).*": {}})
+
+# Largest number of rows accepted by /predict/batch in one call
+app.config["MAX_BATCH_SIZE"] = int(os.environ.get("MAX_BATCH_SIZE", 10000))
+
+# Batches up to this size use the flat-array engine; larger ones go to sklearn,
+# whose compiled traversal wins once per-call overhead is amortised
+app.config["FLAT_ENGINE_MAX_ROWS"] = int(os.environ.get("FLAT_ENGINE_MAX_ROWS", 500))
+
+# Opt-in LRU cache for /predict. Quantization is a JSON object of per-feature
+# step sizes, e.g. {"temperature": 0.5, "humidity": 1}; unlisted features match exactly
+app.config["PREDICTION_CACHE"] = os.environ.get("PREDICTION_CACHE", "0") == "1"
+app.config["PREDICTION_CACHE_MAX_ENTRIES"] = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", 10000))
+app.config["PREDICTION_CACHE_TTL"] = float(os.environ.get("PREDICTION_CACHE_TTL", 300))
+app.config["PREDICTION_CACHE_QUANTIZATION"] = json.loads(os.environ.get("PREDICTION_CACHE_QUANTIZATION", "{}"))
+
+# Opt-in micro-batching for /predict: concurrent single-row requests in one
+# worker are scored together, flushed at MICRO_BATCH_MAX_SIZE rows or after
+# MICRO_BATCH_MAX_WAIT_MS, whichever comes first.  A request waits at most
+# MICRO_BATCH_TIMEOUT_MS for its batch, then predicts on its own thread
+app.config["MICRO_BATCHING"] = os.environ.get("MICRO_BATCHING", "0") == "1"
+app.config["MICRO_BATCH_MAX_SIZE"] = int(os.environ.get("MICRO_BATCH_MAX_SIZE", 32))
+app.config["MICRO_BATCH_MAX_WAIT_MS"] = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", 2))
+app.config["MICRO_BATCH_TIMEOUT_MS"] = float(os.environ.get("MICRO_BATCH_TIMEOUT_MS", 1000))
+
+# Opt-in profiling of live traffic through POST /admin/profile; merged
+# cProfile stats are written to PROFILE_DIR when the window closes
+app.config["PROFILING"] = os.environ.get("PROFILING", "0") == "1"
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", "profiles")
+
+# Hot reload: POST /admin/reload, or poll the artifacts every
+# MODEL_WATCH_INTERVAL seconds (0 = off).  A new bundle only goes live if it
+# scores at least RELOAD_MIN_ACCURACY on the smoke set.  /admin/* routes
+# require ADMIN_TOKEN in the X-Admin-Token header, and are disabled when it is unset
+app.config["MODEL_WATCH_INTERVAL"] = float(os.environ.get("MODEL_WATCH_INTERVAL", 0))
+app.config["RELOAD_MIN_ACCURACY"] = float(os.environ.get("RELOAD_MIN_ACCURACY", 0.9))
+app.config["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN")
+
+# Neighbours returned by /similar when the request gives no k, and the most it may ask for
+app.config["SIMILAR_DEFAULT_K"] = int(os.environ.get("SIMILAR_DEFAULT_K", 5))
+app.config["SIMILAR_MAX_K"] = int(os.environ.get("SIMILAR_MAX_K", 50))
+
+# Opt-in input drift monitoring: predicted rows are counted against the
+# training profile in drift_reference.pkl and scored every DRIFT_WINDOW_S
+# seconds; a PSI of DRIFT_PSI_ALERT or more is reported as drift
+app.config["DRIFT_MONITORING"] = os.environ.get("DRIFT_MONITORING", "0") == "1"
+app.config["DRIFT_WINDOW_S"] = float(os.environ.get("DRIFT_WINDOW_S", 3600))
+app.config["DRIFT_PSI_ALERT"] = float(os.environ.get("DRIFT_PSI_ALERT", 0.2))
 
 # ---------------------------------------------------
 # MODEL PATHS
@@ -19,39 +81,470 @@ CROP_MODEL_PATH = os.path.join(MODEL_DIR, "crop_model.pkl")
 CROP_ENCODER_PATH = os.path.join(MODEL_DIR, "crop_encoder.pkl")
 MODEL_FEATURES_PATH = os.path.join(MODEL_DIR, "model_features.pkl")
 FERTILIZER_RATIOS_PATH = os.path.join(MODEL_DIR, "fertilizer_ratios.pkl")
+SOIL_ENCODER_PATH = os.path.join(MODEL_DIR, "soil_encoder.pkl")
+# Per-soil KD-trees over the training rows, written by train_model.py (optional)
+SIMILAR_INDEX_PATH = os.path.join(MODEL_DIR, "similar_index.pkl")
+# Training-time histograms the drift monitor compares live inputs with (optional)
+DRIFT_REFERENCE_PATH = os.path.join(MODEL_DIR, "drift_reference.pkl")
+
+# Memory-mapped bundle exported by `python forest_engine.py export`, or a
+# pruned one from `python compress_forest.py export` (crop_model_compact)
+FLAT_BUNDLE_DIR = os.environ.get("FLAT_BUNDLE_DIR", os.path.join(MODEL_DIR, "crop_model_flat"))
+
+# Single-tree student of the forest from `python distill_model.py export`
+DISTILLED_BUNDLE_DIR = os.environ.get("DISTILLED_BUNDLE_DIR", os.path.join(MODEL_DIR, "crop_model_distilled"))
+
+# "auto" uses the bundle when present and in sync with the pickles,
+# "flat" always uses the bundle, "pickle" always unpickles, "distilled"
+# serves DISTILLED_BUNDLE_DIR and never imports scikit-learn
+MODEL_FORMAT = os.environ.get("MODEL_FORMAT", "auto")
+
+# Labelled rows every candidate bundle must score before it is swapped in
+SMOKE_SET_PATH = os.path.join(MODEL_DIR, "Crop_recommendation_with_soil.csv")
+SMOKE_SET_ROWS = 200
 
 # ---------------------------------------------------
 # GLOBAL VARIABLES
 # ---------------------------------------------------
-CROP_MODEL = None
-CROP_ENCODER = None
-MODEL_FEATURES = []
-FERTILIZER_RATIOS = {}
+# Everything a request needs, loaded together and never mutated afterwards.
+# Requests read MODELS once and use that bundle throughout, so a reload that
+# swaps the reference can never pair a new encoder with an old model.
+ModelBundle = namedtuple("ModelBundle", [
+    "version", "format", "model", "engine", "crop_encoder", "feature_encoder",
+    "model_features", "fertilizer_ratios", "fertilizer_table", "similar_index", "cache_quantization",
+    "loaded_at",
+])
+
+MODELS = None
+MODEL_VERSIONS = itertools.count(1)
+RELOAD_LOCK = threading.Lock()
+
+# What the last load_models() call did; /ready and /admin/reload report it
+MODEL_STATUS = {"loaded": False, "format": None, "error": "load_models() has not run", "load_s": None}
+
+# Counts of live inputs since the last load, or None when monitoring is off
+DRIFT_MONITOR = None
+
+# ---------------------------------------------------
+# PREDICTION CACHE
+# ---------------------------------------------------
+def check_cache_quantization(steps):
+    """Validate PREDICTION_CACHE_QUANTIZATION, {numeric feature name: step >= 0}."""
+    if not isinstance(steps, dict):
+        raise ValueError("PREDICTION_CACHE_QUANTIZATION must be a JSON object of feature name to step")
+    for name, step in steps.items():
+        if name not in NUMERIC_FEATURES:
+            raise ValueError(f"PREDICTION_CACHE_QUANTIZATION: unknown feature '{name}'; "
+                             f"expected one of {NUMERIC_FEATURES}")
+        if isinstance(step, bool) or not isinstance(step, (int, float)) or not step >= 0:
+            raise ValueError(f"PREDICTION_CACHE_QUANTIZATION: step for '{name}' must be a number >= 0")
+    return steps
+
+def cache_quantization(feature_encoder):
+    """The configured steps keyed by the model column each feature occupies in this bundle."""
+    return {feature_encoder.column_index[name]: step
+            for name, step in app.config["PREDICTION_CACHE_QUANTIZATION"].items()}
+
+check_cache_quantization(app.config["PREDICTION_CACHE_QUANTIZATION"])
+PREDICTION_CACHE = PredictionCache(
+    max_entries=app.config["PREDICTION_CACHE_MAX_ENTRIES"],
+    ttl_seconds=app.config["PREDICTION_CACHE_TTL"],
+)
+
+# ---------------------------------------------------
+# METRICS
+# ---------------------------------------------------
+METRICS = Registry()
+REQUESTS = METRICS.counter("crop_api_requests_total", "HTTP requests by endpoint and status.",
+                           ("endpoint", "method", "status"))
+REQUEST_ERRORS = METRICS.counter("crop_api_errors_total", "Failed requests by endpoint and error type.",
+                                 ("endpoint", "type"))
+REQUEST_SECONDS = METRICS.histogram("crop_api_request_seconds", "Request latency by endpoint.",
+                                    ("endpoint",))
+STAGE_SECONDS = METRICS.histogram("crop_api_stage_seconds", "Time spent in each hot-path stage.",
+                                  ("endpoint", "stage"))
+MODEL_LOADS = METRICS.counter("crop_api_model_loads_total", "load_models() calls by outcome.",
+                              ("outcome", "format"))
+MODEL_LOAD_SECONDS = METRICS.gauge("crop_api_model_load_seconds", "Duration of the last load_models().")
+METRICS.gauge("crop_api_model_loaded", "1 while a model bundle is being served.",
+              fn=lambda: int(MODELS is not None))
+METRICS.gauge("crop_api_model_version", "Version of the model bundle being served.",
+              fn=lambda: MODELS.version if MODELS else None)
+METRICS.gauge("crop_api_prediction_cache_hits", "Prediction cache hits.",
+              fn=lambda: PREDICTION_CACHE.hits)
+METRICS.gauge("crop_api_prediction_cache_misses", "Prediction cache misses.",
+              fn=lambda: PREDICTION_CACHE.misses)
+METRICS.gauge("crop_api_micro_batch_queue_depth", "Rows waiting in the micro-batcher.",
+              fn=lambda: MICRO_BATCHER.queue_depth())
+METRICS.gauge("process_pid", "Process id of the worker that answered this scrape.", fn=os.getpid)
+METRICS.gauge("crop_api_drift_max_psi", "Largest feature PSI over the last closed drift window.",
+              fn=lambda: (DRIFT_MONITOR.previous or {}).get("max_psi") if DRIFT_MONITOR else None)
+
+PROFILER = RequestProfiler(app.config["PROFILE_DIR"])
+
+def fail(kind, body, status):
+    """Error response that is also counted in crop_api_errors_total under ``kind``."""
+    g.error_type = kind
+    return jsonify(body), status
+
+def admin_denied():
+    """Error response unless the request carries the configured admin token; None if allowed."""
+    token = app.config["ADMIN_TOKEN"]
+    if not token:
+        return fail("unauthorized", {"error": "Admin routes are disabled; set ADMIN_TOKEN"}, 403)
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), token.encode()):
+        return fail("unauthorized", {"error": "Missing or wrong X-Admin-Token"}, 403)
+    return None
 
 # ---------------------------------------------------
 # LOAD MODELS
 # ---------------------------------------------------
-def load_models():
-    global CROP_MODEL, CROP_ENCODER, MODEL_FEATURES, FERTILIZER_RATIOS
+def bundle_dir():
+    return DISTILLED_BUNDLE_DIR if MODEL_FORMAT == "distilled" else FLAT_BUNDLE_DIR
 
-    try:
-        CROP_MODEL = joblib.load(CROP_MODEL_PATH)
-        print("Crop Model loaded successfully.")
+def use_flat_bundle():
+    if MODEL_FORMAT == "distilled":
+        # No pickle fallback: kiosks serving the student may not ship the forest
+        return True
+    if MODEL_FORMAT == "pickle" or not os.path.isdir(FLAT_BUNDLE_DIR):
+        return False
+    if MODEL_FORMAT == "flat":
+        return True
+    sources = [CROP_MODEL_PATH, CROP_ENCODER_PATH, MODEL_FEATURES_PATH,
+               FERTILIZER_RATIOS_PATH, SOIL_ENCODER_PATH]
+    if bundle_is_stale(FLAT_BUNDLE_DIR, sources):
+        print("Flat bundle is older than the pickled models, falling back to pickles.")
+        return False
+    return True
 
-        CROP_ENCODER = joblib.load(CROP_ENCODER_PATH)
-        print("Crop Encoder loaded successfully.")
+def build_feature_encoder(feature_names, soil_types, model_features):
+    """Build the shared encoder and reject artifacts that disagree on the schema."""
+    encoder = FeatureEncoder(feature_names, soil_types)
+    if [str(f) for f in model_features] != encoder.feature_names:
+        raise ValueError(f"model_features.pkl {list(model_features)} does not match "
+                         f"the model's features {encoder.feature_names}")
+    return encoder
 
-        MODEL_FEATURES = joblib.load(MODEL_FEATURES_PATH)
-        print(f"Model Features loaded: {len(MODEL_FEATURES)} features.")
+def load_similar_index():
+    """The similar-fields index, or None when it has not been built or cannot be read.
 
-        FERTILIZER_RATIOS = joblib.load(FERTILIZER_RATIOS_PATH)
-        print("Fertilizer Ratios loaded successfully.")
+    The index is optional, so a bad file disables /similar instead of
+    blocking the models.
+    """
+    if not os.path.exists(SIMILAR_INDEX_PATH):
+        return None
+    try:
+        index = joblib.load(SIMILAR_INDEX_PATH)
+    except Exception as e:
+        print("Similar Index Error:", e)
+        return None
+    print(f"Similar-fields index loaded: {index.n_rows} rows, {len(index.partitions)} soil types.")
+    return index
 
+def load_drift_monitor():
+    """A fresh DriftMonitor on drift_reference.pkl, or None when off, missing or unreadable."""
+    if not app.config["DRIFT_MONITORING"] or not os.path.exists(DRIFT_REFERENCE_PATH):
+        return None
+    try:
+        reference = joblib.load(DRIFT_REFERENCE_PATH)
     except Exception as e:
-        print(f"Error loading models: {e}")
+        print("Drift Reference Error:", e)
+        return None
+    return DriftMonitor(reference, app.config["DRIFT_WINDOW_S"], app.config["DRIFT_PSI_ALERT"])
+
+def set_model_status(loaded, model_format, error, start, **extra):
+    global MODEL_STATUS
+    load_s = time.perf_counter() - start
+    MODEL_STATUS = dict({"loaded": loaded, "format": model_format, "error": error,
+                         "load_s": round(load_s, 3)}, **extra)
+    MODEL_LOADS.inc("success" if loaded else "failure", model_format or "none")
+    MODEL_LOAD_SECONDS.set(load_s)
+
+def build_models():
+    """Load every artifact into a new ModelBundle; raises if any is missing or inconsistent."""
+    if use_flat_bundle():
+        # Arrays are mmapped read-only, so forked or sibling workers share
+        # the same page-cache pages; sklearn is only imported for the
+        # similar-fields index, when one has been built, and never for the
+        # distilled model (/similar then answers no_index)
+        directory = bundle_dir()
+        bundle = load_bundle(directory, mmap_mode="r")
+        feature_encoder = build_feature_encoder(bundle["feature_names"] or bundle["model_features"],
+                                                bundle["soil_types"], bundle["model_features"])
+        print(f"Flat model bundle mapped from {directory}: {bundle['engine'].n_trees} trees.")
+        distilled = MODEL_FORMAT == "distilled"
+        return ModelBundle(version=next(MODEL_VERSIONS), format="distilled" if distilled else "flat",
+                           model=None, engine=bundle["engine"], crop_encoder=bundle["encoder"],
+                           feature_encoder=feature_encoder, model_features=bundle["model_features"],
+                           fertilizer_ratios=bundle["fertilizer_ratios"],
+                           fertilizer_table=FertilizerTable(bundle["fertilizer_ratios"]),
+                           similar_index=None if distilled else load_similar_index(),
+                           cache_quantization=cache_quantization(feature_encoder), loaded_at=time.time())
+
+    crop_model = joblib.load(CROP_MODEL_PATH)
+    print("Crop Model loaded successfully.")
+
+    engine = FlatForest.from_sklearn(crop_model)
+    print(f"Flat inference engine built: {engine.n_trees} trees.")
+
+    crop_encoder = joblib.load(CROP_ENCODER_PATH)
+    print("Crop Encoder loaded successfully.")
+
+    model_features = joblib.load(MODEL_FEATURES_PATH)
+    print(f"Model Features loaded: {len(model_features)} features.")
+
+    soil_encoder = joblib.load(SOIL_ENCODER_PATH)
+    feature_encoder = build_feature_encoder(getattr(crop_model, "feature_names_in_", model_features),
+                                            soil_encoder.classes_, model_features)
+    print(f"Feature Encoder built: {feature_encoder.scheme} soil encoding.")
+
+    fertilizer_ratios = joblib.load(FERTILIZER_RATIOS_PATH)
+    print("Fertilizer Ratios loaded successfully.")
+
+    return ModelBundle(version=next(MODEL_VERSIONS), format="pickle", model=crop_model, engine=engine,
+                       crop_encoder=crop_encoder, feature_encoder=feature_encoder,
+                       model_features=model_features, fertilizer_ratios=fertilizer_ratios,
+                       fertilizer_table=FertilizerTable(fertilizer_ratios),
+                       similar_index=load_similar_index(),
+                       cache_quantization=cache_quantization(feature_encoder), loaded_at=time.time())
+
+def smoke_check(models):
+    """Score labelled rows with a candidate bundle before it goes live.
+
+    Also touches every part of the new bundle, so the first real requests
+    after the swap do not pay for page faults.
+    """
+    if not os.path.exists(SMOKE_SET_PATH):
+        return {"rows": 0, "accuracy": None}
+    df = pd.read_csv(SMOKE_SET_PATH)
+    df = df.sample(min(SMOKE_SET_ROWS, len(df)), random_state=0)
+    features, valid_rows, errors = models.feature_encoder.transform(df)
+    if errors:
+        row, message = next(iter(sorted(errors.items())))
+        raise ValueError(f"Smoke set rejected by the feature encoder: {message}")
+
+    predicted = decode_labels(models, model_predict(models, features))
+    proba = model_predict_proba(models, features[:10])
+    if not np.allclose(proba.sum(axis=1), 1.0):
+        raise ValueError("Smoke set probabilities do not sum to 1")
+    missing = sorted(set(predicted.tolist()) - set(models.fertilizer_ratios))
+    if missing:
+        raise ValueError(f"No fertilizer ratios for predicted crops {missing}")
+
+    accuracy = float(np.mean(predicted == df["label"].astype(str).to_numpy()))
+    if accuracy < app.config["RELOAD_MIN_ACCURACY"]:
+        raise ValueError(f"Smoke set accuracy {accuracy:.3f} is below "
+                         f"{app.config['RELOAD_MIN_ACCURACY']}")
+    return {"rows": len(df), "accuracy": round(accuracy, 4)}
+
+def load_models():
+    """Load and validate a new bundle, then swap it in.
+
+    On any failure the bundle already being served stays live.  Returns
+    True when a new bundle was swapped in.
+    """
+    global MODELS, DRIFT_MONITOR
+
+    with RELOAD_LOCK:
+        start = time.perf_counter()
+        ARTIFACT_WATCHER.rebase()
+        try:
+            models = build_models()
+            smoke = smoke_check(models)
+        except Exception as e:
+            print(f"Error loading models: {e}")
+            set_model_status(False, None, str(e), start,
+                             serving_version=MODELS.version if MODELS else None)
+            return False
+
+        # A single reference assignment; in-flight requests keep the bundle they took
+        MODELS = models
+        # Cached answers came from the previous artifacts
+        PREDICTION_CACHE.clear()
+        # Predicted crops now come from the new model; count from scratch
+        DRIFT_MONITOR = load_drift_monitor()
+        set_model_status(True, models.format, None, start, version=models.version, smoke=smoke)
+        print(f"Model bundle v{models.version} ({models.format}) is live; smoke accuracy {smoke['accuracy']}.")
+        return True
+
+def reload_in_background():
+    """Run load_models() on its own thread; False if a reload is already running."""
+    if RELOAD_LOCK.locked():
+        return False
+    threading.Thread(target=load_models, name="model-reload", daemon=True).start()
+    return True
+
+def model_predict(models, features):
+    """Predict encoded crop labels for an encoded feature matrix."""
+    if models.model is None or len(features) <= app.config["FLAT_ENGINE_MAX_ROWS"]:
+        return models.engine.predict(features)
+    return models.model.predict(features)
+
+def model_predict_proba(models, features):
+    """Class probabilities for an encoded feature matrix, columns in model class order."""
+    if models.model is None or len(features) <= app.config["FLAT_ENGINE_MAX_ROWS"]:
+        return models.engine.predict_proba(features)
+    return models.model.predict_proba(features)
+
+def decode_labels(models, encoded):
+    """Turn encoded model classes into crop names."""
+    if models.crop_encoder:
+        return np.asarray(models.crop_encoder.inverse_transform(encoded))
+    return np.asarray(encoded).astype(str)
+
+def predict_labels(features, models):
+    """Crop names for an encoded feature matrix."""
+    return decode_labels(models, model_predict(models, features)).tolist()
+
+# ---------------------------------------------------
+# MICRO-BATCHER
+# ---------------------------------------------------
+# Each row is submitted with the bundle it was encoded with
+MICRO_BATCHER = MicroBatcher(
+    predict_labels,
+    max_batch_size=app.config["MICRO_BATCH_MAX_SIZE"],
+    max_wait_ms=app.config["MICRO_BATCH_MAX_WAIT_MS"],
+)
+
+# ---------------------------------------------------
+# INITIAL LOAD
+# ---------------------------------------------------
+ARTIFACT_WATCHER = ArtifactWatcher(
+    [CROP_MODEL_PATH, CROP_ENCODER_PATH, FERTILIZER_RATIOS_PATH, MODEL_FEATURES_PATH,
+     SOIL_ENCODER_PATH, SIMILAR_INDEX_PATH, DRIFT_REFERENCE_PATH, os.path.join(bundle_dir(), "manifest.json")],
+    on_change=load_models,
+    interval=app.config["MODEL_WATCH_INTERVAL"],
+)
 
 load_models()
 
+# ---------------------------------------------------
+# TOP-K RECOMMENDATIONS
+# ---------------------------------------------------
+def strict_int(raw):
+    """An integer from JSON or a query string; ValueError for bools, fractions and other text."""
+    if isinstance(raw, int) and not isinstance(raw, bool):
+        return raw
+    if isinstance(raw, str) and raw.strip().lstrip("+-").isdecimal():
+        return int(raw)
+    raise ValueError(f"{raw!r} is not an integer")
+
+def parse_top_k(data, models):
+    """Read the optional top_k from the JSON body or the query string."""
+    raw = data.get("top_k") if isinstance(data, dict) else None
+    if raw is None:
+        raw = request.args.get("top_k")
+    if raw is None:
+        return None
+    k = strict_int(raw)
+    if k < 1:
+        raise ValueError("top_k must be a positive integer")
+    return min(k, len(models.engine.classes))
+
+def rank_crops(models, proba, k):
+    """Best crop and the k most probable crops for every row of ``proba``.
+
+    Returns (best, labels, scores); labels and scores have shape (n, k), best
+    first.  Ties are broken towards the lower class index, matching argmax.
+    """
+    n_classes = proba.shape[1]
+    top = np.argpartition(proba, n_classes - k, axis=1)[:, n_classes - k:]
+    scores = np.take_along_axis(proba, top, axis=1)
+    order = np.lexsort((top, -scores))
+    top = np.take_along_axis(top, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+
+    # Decode the class table once and index into it
+    names = decode_labels(models, models.engine.classes)
+    return names[np.argmax(proba, axis=1)], names[top], scores
+
+def top_crops_json(labels, scores):
+    return [{"crop": label, "probability": score}
+            for label, score in zip(labels.tolist(), scores.tolist())]
+
+def fertilizer_plans(models, crops, soil_npk):
+    """Target ratio, deficit and doses for each crop on one field; None where no data."""
+    table = models.fertilizer_table
+    ids = table.crop_ids(crops)
+    known = np.flatnonzero(ids >= 0)
+    deficit, doses = table.recommend(ids[known], np.tile(soil_npk, (len(known), 1)))
+    plans = [None] * len(crops)
+    for i, ratio, (row_deficit, row_dose) in zip(known.tolist(), table.ratios(ids[known]),
+                                                 doses_json(deficit, doses)):
+        plans[i] = {"recommended_ratio": ratio, "deficit": row_deficit, "dose_kg": row_dose}
+    return plans
+
+# ---------------------------------------------------
+# REQUEST METRICS
+# ---------------------------------------------------
+@app.before_request
+def start_request_metrics():
+    g.start_time = time.perf_counter()
+    g.profiler = PROFILER.begin() if app.config["PROFILING"] else None
+    ARTIFACT_WATCHER.ensure_running()
+
+@app.after_request
+def record_request_metrics(response):
+    # Route templates keep the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - g.start_time, endpoint)
+    REQUESTS.inc(endpoint, request.method, str(response.status_code))
+    if response.status_code >= 400:
+        REQUEST_ERRORS.inc(endpoint, g.get("error_type", "http_%d" % response.status_code))
+    return response
+
+@app.teardown_request
+def stop_request_profiler(exc):
+    PROFILER.end(g.pop("profiler", None))
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+def profile_window():
+    """POST opens a profiling window (?seconds=30&sample_rate=0.1); GET reports on it."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    if not app.config["PROFILING"]:
+        return fail("disabled", {"error": "Profiling is disabled; set PROFILING=1"}, 404)
+    if request.method == "POST":
+        try:
+            seconds = float(request.args.get("seconds", 30))
+            sample_rate = float(request.args.get("sample_rate", 1.0))
+            if not (0 < seconds <= 600 and 0 < sample_rate <= 1):
+                raise ValueError
+        except ValueError:
+            return fail("validation", {"error": "seconds must be in (0, 600], sample_rate in (0, 1]"}, 400)
+        try:
+            PROFILER.start(seconds, sample_rate)
+        except RuntimeError as e:
+            return fail("conflict", {"error": str(e)}, 409)
+    return jsonify(PROFILER.status())
+
+@app.route("/admin/reload", methods=["GET", "POST"])
+def reload_models():
+    """POST reloads the artifacts in the background (?wait=1 to block); GET reports the last load."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    status = {"serving_version": MODELS.version if MODELS else None,
+              "reloading": RELOAD_LOCK.locked(), "last_load": MODEL_STATUS, "pid": os.getpid()}
+    if request.method == "GET":
+        return jsonify(status)
+
+    if request.args.get("wait") == "1":
+        swapped = load_models()
+        status.update(serving_version=MODELS.version if MODELS else None, reloading=False,
+                      last_load=MODEL_STATUS, swapped=swapped)
+        if not swapped:
+            return fail("reload_failed", status, 500)
+        return jsonify(status)
+
+    status["started"] = reload_in_background()
+    return jsonify(status), 202
+
 # ---------------------------------------------------
 # ROUTES
 # ---------------------------------------------------
@@ -59,138 +552,492 @@ load_models()
 def index():
     return "Agri-Tech ML API is running on localhost!", 200
 
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Liveness: the worker is up and answering requests."""
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once a model bundle has passed its smoke check and is being served."""
+    models = MODELS
+    status = {"pid": os.getpid(), "last_load": MODEL_STATUS}
+    if models is None:
+        status["status"] = "unavailable"
+        status["error"] = MODEL_STATUS["error"]
+        return jsonify(status), 503
+    status.update(status="ready", version=models.version, format=models.format,
+                  n_trees=models.engine.n_trees, feature_scheme=models.feature_encoder.scheme)
+    return jsonify(status), 200
+
+def recommend_one(endpoint, models, generation, final_features, top_k):
+    """Best crop for one encoded row, plus the top-k ranking when asked.
+
+    Returns (label, top_labels, top_scores); the last two are None without
+    top_k.  Plain answers go through the prediction cache and the
+    micro-batcher when those are enabled.
+    """
+    # Top-k answers come from one predict_proba pass and skip the label cache
+    if top_k:
+        with timed(STAGE_SECONDS, endpoint, "predict_proba"):
+            proba = model_predict_proba(models, final_features)
+        with timed(STAGE_SECONDS, endpoint, "rank"):
+            best, labels, scores = rank_crops(models, proba, top_k)
+        return str(best[0]), labels[0], scores[0]
+
+    use_cache = app.config["PREDICTION_CACHE"]
+    if use_cache:
+        with timed(STAGE_SECONDS, endpoint, "cache"):
+            cache_key = ((models.version,) +
+                         PREDICTION_CACHE.key(final_features[0], models.cache_quantization))
+            cached_label = PREDICTION_CACHE.get(cache_key)
+        if cached_label is not None:
+            return cached_label, None, None
+
+    # Prediction, coalesced with concurrent requests when micro-batching is on
+    pred_label = None
+    if app.config["MICRO_BATCHING"]:
+        try:
+            with timed(STAGE_SECONDS, endpoint, "micro_batch"):
+                pred_label = str(MICRO_BATCHER.predict(
+                    final_features[0], models, timeout=app.config["MICRO_BATCH_TIMEOUT_MS"] / 1000))
+        except TimeoutError:
+            # A stuck or backed-up flusher must not hang the request
+            print("Micro-batch Timeout: predicting directly")
+    if pred_label is None:
+        with timed(STAGE_SECONDS, endpoint, "predict"):
+            pred_encoded = model_predict(models, final_features)
+        with timed(STAGE_SECONDS, endpoint, "decode"):
+            pred_label = str(decode_labels(models, pred_encoded)[0])
+
+    if use_cache:
+        PREDICTION_CACHE.put(cache_key, pred_label, generation)
+    return pred_label, None, None
+
+def observe_drift(endpoint, models, features, soil_types, labels):
+    """Count served rows in the drift monitor: encoded features, soil names and predicted crops."""
+    monitor = DRIFT_MONITOR
+    if monitor is None or not len(features):
+        return
+    with timed(STAGE_SECONDS, endpoint, "drift"):
+        if len(features) == 1:
+            # A Python list is cheaper to pick from than a NumPy gather for one row
+            row = features[0].tolist()
+            monitor.observe([row[i] for i in models.feature_encoder.numeric_columns], soil_types[0], labels[0])
+        else:
+            monitor.observe_batch(features[:, models.feature_encoder.numeric_index], soil_types, labels)
+
+def parse_and_encode(endpoint, models):
+    """Read and encode a single-row request.
+
+    Returns ((data, features, top_k), None), or (None, error response).
+    """
+    with timed(STAGE_SECONDS, endpoint, "parse"):
+        data = request.get_json()
+
+    try:
+        top_k = parse_top_k(data, models)
+    except (TypeError, ValueError):
+        return None, fail("validation", {"error": "top_k must be a positive integer"}, 400)
+
+    # Encode with the same FeatureEncoder the trainer used
+    try:
+        with timed(STAGE_SECONDS, endpoint, "encode"):
+            final_features = models.feature_encoder.encode_one(data)
+    except (TypeError, ValueError) as e:
+        return None, fail("validation", {"error": str(e)}, 400)
+    return (data, final_features, top_k), None
+
 @app.route("/predict", methods=["POST"])
 def predict_crop():
-    if not CROP_MODEL:
-        return jsonify({"recommended_crop": None, "error": "Model not loaded"}), 500
+    # The cache generation is read before the bundle, so an answer from a
+    # bundle that is swapped out mid-request is never cached
+    generation = PREDICTION_CACHE.generation
+    models = MODELS
+    if models is None:
+        return fail("not_loaded", {"recommended_crop": None, "error": "Model not loaded"}, 500)
 
+    endpoint = "/predict"
     try:
-        data = request.get_json()
+        parsed, error = parse_and_encode(endpoint, models)
+        if error:
+            return error
+        data, final_features, top_k = parsed
 
-        # Numeric features
-        required_numeric = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
-        input_data = {}
-        for feature in required_numeric:
-            if feature not in data:
-                return jsonify({"error": f"Missing {feature}"}), 400
-            input_data[feature] = float(data[feature])
-
-        # Soil type as number (instead of one-hot)
-        soil_type = data.get("soil_type")
-        if soil_type is None:
-            return jsonify({"error": "Missing soil_type"}), 400
-
-        # Map soil type string to numeric value
-        soil_mapping = {"Alluvial": 0, "Loamy": 1, "Loamy (Light Soil)": 2, 
-                        "Sandy Loam": 3, "Black Soil (Regur)": 4, "Laterite": 5}
-        soil_num = soil_mapping.get(soil_type)
-        if soil_num is None:
-            return jsonify({"error": f"Soil type '{soil_type}' not recognized"}), 400
-
-        # Prepare feature vector in correct order (8 features)
-        final_features = np.array([
-            input_data["N"], input_data["P"], input_data["K"],
-            input_data["temperature"], input_data["humidity"], input_data["ph"],
-            input_data["rainfall"], soil_num
-        ]).reshape(1, -1)
-
-        # Prediction
-        pred_encoded = CROP_MODEL.predict(final_features)[0]
-
-        # If your model uses LabelEncoder to encode crop names
-        if CROP_ENCODER:
-            pred_label = CROP_ENCODER.inverse_transform([pred_encoded])[0]
-        else:
-            pred_label = str(pred_encoded)
+        best, top_labels, top_scores = recommend_one(endpoint, models, generation, final_features, top_k)
+        observe_drift(endpoint, models, final_features, [data[SOIL_COLUMN]], [best])
 
-        return jsonify({"recommended_crop": pred_label, "error": None})
+        with timed(STAGE_SECONDS, endpoint, "serialize"):
+            response = {"recommended_crop": best, "error": None}
+            if top_k:
+                response["top_crops"] = top_crops_json(top_labels, top_scores)
+            return jsonify(response)
 
     except Exception as e:
         print("Prediction Error:", e)
-        return jsonify({"error": str(e)}), 500
+        return fail(type(e).__name__, {"error": str(e)}, 500)
 
 
+@app.route("/recommend", methods=["POST"])
+def recommend():
+    """Crop recommendation and the fertilizer plan for it in one round trip.
 
-'''@app.route("/predict", methods=["POST"])
-def predict_crop():
-    if not CROP_MODEL or not CROP_ENCODER or not MODEL_FEATURES:
-        return jsonify({"recommended_crop": None, "error": "Model not loaded"}), 500
+    Takes the /predict body.  The measured N, P, K double as the soil test
+    for the fertilizer deficit; with top_k every ranked crop gets its plan.
+    """
+    generation = PREDICTION_CACHE.generation
+    models = MODELS
+    if models is None:
+        return fail("not_loaded", {"recommended_crop": None, "error": "Model not loaded"}, 500)
 
+    endpoint = "/recommend"
     try:
-        data = request.get_json()
+        parsed, error = parse_and_encode(endpoint, models)
+        if error:
+            return error
+        data, final_features, top_k = parsed
+        # The soil test must also pass the fertilizer checks (no negative amounts)
+        try:
+            soil = parse_soil(data)
+        except ValueError as e:
+            return fail("validation", {"recommended_crop": None, "error": str(e)}, 400)
+
+        best, top_labels, top_scores = recommend_one(endpoint, models, generation, final_features, top_k)
+        observe_drift(endpoint, models, final_features, [data[SOIL_COLUMN]], [best])
+
+        with timed(STAGE_SECONDS, endpoint, "fertilizer"):
+            crops = [best] + (top_labels.tolist() if top_k else [])
+            plans = fertilizer_plans(models, crops, soil)
 
-        required_numeric = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+        with timed(STAGE_SECONDS, endpoint, "serialize"):
+            response = {"recommended_crop": best, "fertilizer": plans[0], "error": None}
+            if top_k:
+                response["top_crops"] = [dict(entry, fertilizer=plan) for entry, plan in
+                                         zip(top_crops_json(top_labels, top_scores), plans[1:])]
+            return jsonify(response)
+
+    except Exception as e:
+        print("Recommendation Error:", e)
+        return fail(type(e).__name__, {"error": str(e)}, 500)
 
-        # Validate numeric features
-        input_data = {}
-        for feature in required_numeric:
-            if feature not in data:
-                return jsonify({"error": f"Missing {feature}"}), 400
-            input_data[feature] = float(data[feature])
 
-        # Validate soil type
-        soil_type = data.get("soil_type")
-        if not soil_type:
-            return jsonify({"error": "Missing soil_type"}), 400
+def parse_k(data):
+    """Read the optional neighbour count k from the JSON body or the query string."""
+    raw = data.get("k") if isinstance(data, dict) else None
+    if raw is None:
+        raw = request.args.get("k", app.config["SIMILAR_DEFAULT_K"])
+    k = strict_int(raw)
+    if not 1 <= k <= app.config["SIMILAR_MAX_K"]:
+        raise ValueError("k out of range")
+    return k
 
-        # Prepare final feature vector
-        final_dict = {}
 
-        # Add numeric features
-        for f in required_numeric:
-            final_dict[f] = input_data[f]
+@app.route("/similar", methods=["POST"])
+def similar_fields():
+    """Historical samples closest to a field, from the training-time KD-tree index.
 
-        # Initialize all one-hot soil features as 0
-        ohe_cols = [col for col in MODEL_FEATURES if col.startswith("soil_type_")]
-        for col in ohe_cols:
-            final_dict[col] = 0
+    Takes a /predict body, or {"records": [...]} / {"columns": {...}} for a
+    batch, plus an optional k.  Neighbours share the field's soil type and
+    are ranked by distance over the standardized numeric features.
+    """
+    models = MODELS
+    if models is None:
+        return fail("not_loaded", {"neighbors": None, "error": "Model not loaded"}, 500)
+    index = models.similar_index
+    if index is None:
+        return fail("no_index", {"neighbors": None,
+                                 "error": "Similar-fields index not built; run train_model.py"}, 503)
 
-        soil_ohe = f"soil_type_{soil_type}"
-        if soil_ohe not in final_dict:
-            return jsonify({"error": f"Soil type '{soil_type}' not recognized"}), 400
+    endpoint = "/similar"
+    try:
+        start = time.perf_counter()
+        with timed(STAGE_SECONDS, endpoint, "parse"):
+            data = request.get_json()
 
-        final_dict[soil_ohe] = 1
+        try:
+            k = parse_k(data)
+        except (TypeError, ValueError):
+            return fail("validation", {"neighbors": None,
+                                       "error": f"k must be an integer from 1 to {app.config['SIMILAR_MAX_K']}"}, 400)
 
-        # Create final feature vector in correct order
-        final_features = np.array([final_dict[f] for f in MODEL_FEATURES]).reshape(1, -1)
+        encoder = models.feature_encoder
+        if not isinstance(data, list) and not (isinstance(data, dict) and ("records" in data or "columns" in data)):
+            try:
+                with timed(STAGE_SECONDS, endpoint, "encode"):
+                    features = encoder.encode_one(data)
+            except (AttributeError, TypeError, ValueError) as e:
+                return fail("validation", {"neighbors": None, "error": str(e)}, 400)
+            with timed(STAGE_SECONDS, endpoint, "query"):
+                neighbors = index.query(features[:, encoder.numeric_index], [data["soil_type"]], k)[0]
+            return jsonify({"neighbors": neighbors, "k": k, "error": None})
 
-        # Prediction
-        pred_encoded = CROP_MODEL.predict(final_features)[0]
-        pred_label = CROP_ENCODER.inverse_transform([pred_encoded])[0]
+        try:
+            with timed(STAGE_SECONDS, endpoint, "frame"):
+                frame, record_errors = batch_frame(data)
+        except ValueError as e:
+            return fail("validation", {"results": None, "error": str(e)}, 400)
+        n_rows = len(frame)
+        if n_rows > app.config["MAX_BATCH_SIZE"]:
+            return fail("too_large", {"results": None, "error": f"Batch of {n_rows} rows exceeds limit of "
+                                                                f"{app.config['MAX_BATCH_SIZE']}"}, 413)
 
-        return jsonify({"recommended_crop": pred_label, "error": None})
+        with timed(STAGE_SECONDS, endpoint, "encode"):
+            features, valid_rows, errors = encoder.transform(frame)
+        errors.update(record_errors)
+
+        with timed(STAGE_SECONDS, endpoint, "query"):
+            found = {}
+            if len(valid_rows):
+                soils = frame["soil_type"].to_numpy(dtype=object)[valid_rows]
+                numeric = features[:, encoder.numeric_index]
+                found = dict(zip(valid_rows.tolist(), index.query(numeric, soils, k)))
+
+        elapsed = time.perf_counter() - start
+        return jsonify({
+            "results": [{"row": i, "neighbors": found.get(i), "error": errors.get(i)} for i in range(n_rows)],
+            "k": k,
+            "n_rows": n_rows,
+            "n_errors": len(errors),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "error": None
+        })
 
     except Exception as e:
-        print("Prediction Error:", e)
-        return jsonify({"error": str(e)}), 500
+        print("Similar Fields Error:", e)
+        return fail(type(e).__name__, {"neighbors": None, "error": str(e)}, 500)
+
+
+@app.route("/drift", methods=["GET"])
+def drift():
+    """PSI / KS of live inputs and predicted crops against the training profile."""
+    monitor = DRIFT_MONITOR
+    if monitor is None:
+        reason = "disabled" if not app.config["DRIFT_MONITORING"] else "no drift reference loaded"
+        return fail("no_reference", {"error": f"Drift monitoring unavailable: {reason}"}, 503)
+    report = monitor.report()
+    report["pid"] = os.getpid()
+    return jsonify(report)
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    stats = PREDICTION_CACHE.stats()
+    stats["enabled"] = app.config["PREDICTION_CACHE"]
+    return jsonify(stats)
+
+
+@app.route("/batcher/stats", methods=["GET"])
+def batcher_stats():
+    stats = MICRO_BATCHER.stats()
+    stats["enabled"] = app.config["MICRO_BATCHING"]
+    return jsonify(stats)
+
+
+# ---------------------------------------------------
+# BATCH PREDICTION
+# ---------------------------------------------------
+def batch_frame(data):
+    """Build a DataFrame from a list of records or a columnar payload."""
+    if isinstance(data, dict) and "columns" in data:
+        columns = data["columns"]
+        if not isinstance(columns, dict):
+            raise ValueError("'columns' must be an object of equal-length arrays")
+        lengths = {len(v) if isinstance(v, list) else -1 for v in columns.values()}
+        if -1 in lengths or len(lengths) > 1:
+            raise ValueError("'columns' must be an object of equal-length arrays")
+        return pd.DataFrame(columns), {}
+
+    records = data.get("records") if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise ValueError("Expected a list of records, {'records': [...]} or {'columns': {...}}")
+
+    # Non-object rows are reported individually and scored as empty records
+    errors = {i: "Record must be a JSON object" for i, r in enumerate(records)
+              if not isinstance(r, dict)}
+    rows = [r if isinstance(r, dict) else {} for r in records]
+    return pd.DataFrame.from_records(rows, index=range(len(rows))), errors
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_crop_batch():
+    models = MODELS
+    if models is None:
+        return fail("not_loaded", {"results": None, "error": "Model not loaded"}, 500)
+
+    endpoint = "/predict/batch"
+    try:
+        start = time.perf_counter()
+        with timed(STAGE_SECONDS, endpoint, "parse"):
+            data = request.get_json()
+
+        try:
+            with timed(STAGE_SECONDS, endpoint, "frame"):
+                frame, record_errors = batch_frame(data)
+        except ValueError as e:
+            return fail("validation", {"results": None, "error": str(e)}, 400)
+
+        try:
+            top_k = parse_top_k(data, models)
+        except (TypeError, ValueError):
+            return fail("validation", {"results": None, "error": "top_k must be a positive integer"}, 400)
+
+        n_rows = len(frame)
+        max_rows = app.config["MAX_BATCH_SIZE"]
+        if n_rows > max_rows:
+            return fail("too_large", {"results": None,
+                                      "error": f"Batch of {n_rows} rows exceeds limit of {max_rows}"}, 413)
+
+        with timed(STAGE_SECONDS, endpoint, "encode"):
+            features, valid_rows, errors = models.feature_encoder.transform(frame)
+        errors.update(record_errors)
+
+        # One forest pass and one decode for the whole batch
+        labels = {}
+        top_crops = {}
+        if len(valid_rows) and top_k:
+            with timed(STAGE_SECONDS, endpoint, "predict_proba"):
+                proba = model_predict_proba(models, features)
+            with timed(STAGE_SECONDS, endpoint, "rank"):
+                pred_labels, top_labels, top_scores = rank_crops(models, proba, top_k)
+                labels = dict(zip(valid_rows.tolist(), pred_labels.tolist()))
+                top_crops = {row: top_crops_json(l, s)
+                             for row, l, s in zip(valid_rows.tolist(), top_labels, top_scores)}
+        elif len(valid_rows):
+            with timed(STAGE_SECONDS, endpoint, "predict"):
+                pred_encoded = model_predict(models, features)
+            with timed(STAGE_SECONDS, endpoint, "decode"):
+                pred_labels = decode_labels(models, pred_encoded)
+                labels = dict(zip(valid_rows.tolist(), pred_labels.tolist()))
+        if len(valid_rows):
+            observe_drift(endpoint, models, features, frame[SOIL_COLUMN].to_numpy()[valid_rows], pred_labels)
+
+        with timed(STAGE_SECONDS, endpoint, "serialize"):
+            results = []
+            for i in range(n_rows):
+                result = {"row": i, "recommended_crop": labels.get(i), "error": errors.get(i)}
+                if top_k:
+                    result["top_crops"] = top_crops.get(i)
+                results.append(result)
+
+            elapsed = time.perf_counter() - start
+            return jsonify({
+                "results": results,
+                "n_rows": n_rows,
+                "n_errors": len(errors),
+                "elapsed_ms": round(elapsed * 1000, 3),
+                "rows_per_sec": round(n_rows / elapsed, 1) if elapsed > 0 else None,
+                "error": None
+            })
+
+    except Exception as e:
+        print("Batch Prediction Error:", e)
+        return fail(type(e).__name__, {"results": None, "error": str(e)}, 500)
+
 
-'''
 @app.route("/fertilizer_recommendation", methods=["POST"])
 def fertilizer_recommendation():
     try:
         data = request.get_json()
-        crop = data.get("crop", "").lower()
-
-        if not crop:
-            return jsonify({"error": "Missing crop name"}), 400
+        if not isinstance(data, dict):
+            return fail("validation", {"error": "Expected a JSON object"}, 400)
+        crop = data.get("crop")
+        if crop is None or crop == "":
+            return fail("validation", {"error": "Missing crop name"}, 400)
+        if not isinstance(crop, str):
+            return fail("validation", {"error": f"Invalid crop: {crop!r}"}, 400)
+        crop = crop.lower()
 
-        if crop not in FERTILIZER_RATIOS:
-            return jsonify({"error": f"No fertilizer data for crop '{crop}'"}), 404
+        models = MODELS
+        fertilizer_ratios = models.fertilizer_ratios if models else {}
+        if crop not in fertilizer_ratios:
+            return fail("unknown_crop", {"error": f"No fertilizer data for crop '{crop}'"}, 404)
 
-        ratio = FERTILIZER_RATIOS[crop]
-
-        return jsonify({
+        ratio = fertilizer_ratios[crop]
+        response = {
             "recommended_ratio": {
                 "N": ratio.get("N"),
                 "P": ratio.get("P"),
                 "K": ratio.get("K")
             },
             "error": None
-        })
+        }
+
+        # With the measured soil N, P, K also return the deficit and product doses
+        if any(n in data for n in NUTRIENTS):
+            try:
+                soil = parse_soil(data)
+            except ValueError as e:
+                return fail("validation", {"error": str(e)}, 400)
+            table = models.fertilizer_table
+            deficit, doses = table.recommend(table.crop_ids([crop]), soil)
+            response["deficit"], response["dose_kg"] = doses_json(deficit, doses)[0]
+
+        return jsonify(response)
 
     except Exception as e:
         print("Fertilizer Error:", e)
-        return jsonify({"error": str(e)}), 500
+        return fail(type(e).__name__, {"error": str(e)}, 500)
+
+
+@app.route("/fertilizer/batch", methods=["POST"])
+def fertilizer_batch():
+    """Deficits and doses for many fields, e.g. a whole village, in one call."""
+    models = MODELS
+    if models is None:
+        return fail("not_loaded", {"results": None, "error": "Model not loaded"}, 500)
+
+    endpoint = "/fertilizer/batch"
+    try:
+        start = time.perf_counter()
+        with timed(STAGE_SECONDS, endpoint, "parse"):
+            data = request.get_json()
+        try:
+            with timed(STAGE_SECONDS, endpoint, "frame"):
+                frame, record_errors = batch_frame(data)
+        except ValueError as e:
+            return fail("validation", {"results": None, "error": str(e)}, 400)
+
+        n_rows = len(frame)
+        max_rows = app.config["MAX_BATCH_SIZE"]
+        if n_rows > max_rows:
+            return fail("too_large", {"results": None,
+                                      "error": f"Batch of {n_rows} rows exceeds limit of {max_rows}"}, 413)
+
+        table = models.fertilizer_table
+        with timed(STAGE_SECONDS, endpoint, "encode"):
+            crop_ids, soil, valid_rows, errors = table.transform(frame)
+        errors.update(record_errors)
+
+        with timed(STAGE_SECONDS, endpoint, "dose"):
+            deficit, doses = table.recommend(crop_ids, soil)
+
+        with timed(STAGE_SECONDS, endpoint, "serialize"):
+            # Rows with a record-level error were parsed as empty and never valid
+            rows = dict(zip(valid_rows.tolist(), zip(table.crops[crop_ids].tolist(),
+                                                     doses_json(deficit, doses))))
+            results = []
+            for i in range(n_rows):
+                result = {"row": i, "crop": None, "deficit": None, "dose_kg": None, "error": errors.get(i)}
+                if i in rows:
+                    crop, (row_deficit, row_dose) = rows[i]
+                    result.update(crop=crop, deficit=row_deficit, dose_kg=row_dose)
+                results.append(result)
+
+            elapsed = time.perf_counter() - start
+            return jsonify({
+                "results": results,
+                "total_dose_kg": dict(zip(PRODUCTS, np.round(doses.sum(axis=0), 1).tolist())),
+                "n_rows": n_rows,
+                "n_errors": len(errors),
+                "elapsed_ms": round(elapsed * 1000, 3),
+                "error": None
+            })
+
+    except Exception as e:
+        print("Fertilizer Batch Error:", e)
+        return fail(type(e).__name__, {"results": None, "error": str(e)}, 500)
 
 # ---------------------------
 # TEST MODEL LOADING
@@ -214,7 +1061,9 @@ def test_models():
 # ---------------------------------------------------
 
 if __name__ == "__main__":
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`
     test_models()  # Test if all models load correctly
-    print("Starting Flask server on http://127.0.0.1:5000 ...")
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    debug = os.environ.get("FLASK_DEBUG", "0") == "1"
+    print(f"Starting Flask development server on http://127.0.0.1:5000 (debug={debug}) ...")
+    app.run(host="127.0.0.1", port=5000, debug=debug)
 
@@ -0,0 +1,347 @@
+# forest_engine.py
+"""Array-backed inference for the crop RandomForest.
+
+The exporter flattens every tree of a fitted ``RandomForestClassifier`` into
+one set of contiguous NumPy arrays, and ``FlatForest`` walks all trees for all
+rows at once.  Comparisons, leaf normalisation and the order in which tree
+probabilities are summed follow scikit-learn exactly, so labels (and
+probabilities) are bit-identical to ``model.predict`` / ``predict_proba``.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# sklearn marks leaves with TREE_LEAF (-1) children and TREE_UNDEFINED (-2) features
+TREE_LEAF = -1
+
+# Arrays stored as individual .npy files so they can be memory-mapped
+ARRAY_NAMES = ["feature", "threshold", "children_left", "children_right", "value", "roots", "classes"]
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 2
+
+
+# ---------------------------------------------------
+# EXPORT
+# ---------------------------------------------------
+def export_forest(model):
+    """Convert a fitted RandomForestClassifier into a dict of flat arrays."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        node_ids = np.arange(offset, offset + n_nodes, dtype=np.int32)
+        is_leaf = tree.children_left == TREE_LEAF
+
+        # Leaves point at themselves so a fixed number of steps is always safe
+        left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+        right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+
+        # Same normalisation as DecisionTreeClassifier.predict_proba
+        value = np.ascontiguousarray(tree.value[:, 0, :model.n_classes_], dtype=np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+
+        features.append(feature)
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(left)
+        rights.append(right)
+        values.append(value / normalizer)
+        roots.append(offset)
+
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children_left": np.concatenate(lefts),
+        "children_right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "classes": np.asarray(model.classes_),
+        "max_depth": int(max_depth),
+        "n_features": int(model.n_features_in_),
+    }
+
+
+# ---------------------------------------------------
+# INFERENCE ENGINE
+# ---------------------------------------------------
+class FlatForest:
+    """Vectorized traversal over the arrays produced by ``export_forest``."""
+
+    # Rows traversed together; keeps the (trees x rows) working set cache-sized
+    CHUNK_ROWS = 1024
+
+    def __init__(self, feature, threshold, children_left, children_right,
+                 value, roots, classes, max_depth, n_features, value_offset=0):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        # Compressed forests (compress_forest.py) number leaves after every
+        # split node and store value rows for leaves only, as integer counts
+        self.value_offset = int(value_offset)
+        if np.issubdtype(value.dtype, np.integer):
+            self.value_total = value.sum(axis=1, keepdims=True, dtype=np.float64)
+        else:
+            self.value_total = None
+
+        # Column 0 is taken when the split test fails, column 1 when it passes
+        self.children = np.stack([children_right, children_left], axis=1)
+        self.is_leaf = children_left == np.arange(len(children_left))
+
+    @classmethod
+    def from_sklearn(cls, model):
+        return cls(**export_forest(model))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_rows)."""
+        # Trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input of shape (n, {self.n_features}), got {X.shape}")
+
+        if len(X) <= self.CHUNK_ROWS:
+            return self._apply_chunk(X)
+        return np.concatenate([self._apply_chunk(X[i:i + self.CHUNK_ROWS])
+                               for i in range(0, len(X), self.CHUNK_ROWS)], axis=1)
+
+    def _apply_chunk(self, X):
+        n_rows = X.shape[0]
+        flat_X = np.ascontiguousarray(X).ravel()
+        leaves = np.repeat(self.roots[:, np.newaxis], n_rows, axis=1).ravel()
+
+        # Walk every (tree, row) pair one level per step, dropping pairs that
+        # have reached a leaf so deep trees do not drag shallow ones along
+        active = np.arange(leaves.size)
+        offsets = np.tile(np.arange(n_rows) * self.n_features, self.n_trees)
+        nodes = leaves.copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X[offsets + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self.children[nodes, go_left.view(np.int8)]
+            done = self.is_leaf[nodes]
+            if done.any():
+                leaves[active[done]] = nodes[done]
+                pending = ~done
+                active, nodes, offsets = active[pending], nodes[pending], offsets[pending]
+                if not active.size:
+                    break
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        if self.value_total is not None:
+            return self._proba_from_counts(leaves)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        # Accumulate tree by tree, in order, as the sklearn ensemble does
+        for tree_leaves in leaves:
+            proba += self.value[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def _proba_from_counts(self, leaves):
+        # One gather over all trees per block of rows instead of a Python loop per tree
+        proba = np.empty((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, leaves.shape[1], self.CHUNK_ROWS):
+            rows = leaves[:, start:start + self.CHUNK_ROWS] - self.value_offset
+            proba[start:start + self.CHUNK_ROWS] = (self.value[rows] / self.value_total[rows]).sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+class LabelTable:
+    """Minimal stand-in for a fitted LabelEncoder, decoding ids to crop names."""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, y):
+        return self.classes_[np.asarray(y, dtype=np.intp)]
+
+    def transform(self, labels):
+        index = {label: i for i, label in enumerate(self.classes_.tolist())}
+        return np.array([index[label] for label in labels], dtype=np.intp)
+
+
+# ---------------------------------------------------
+# ARTIFACT FORMAT
+# ---------------------------------------------------
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_bundle(directory, model, encoder, model_features, fertilizer_ratios, soil_types, sources=(),
+                arrays=None):
+    """Write the forest arrays as .npy files plus a JSON manifest.
+
+    ``arrays`` defaults to ``export_forest(model)``; compress_forest.py
+    passes the arrays of a pruned forest instead.
+
+    ``sources`` are the pickle paths the bundle was built from; their hashes
+    are recorded so loaders can tell when the bundle is stale.  The directory
+    is written next to the target and renamed into place, so readers never see
+    a partially written bundle.
+    """
+    arrays = arrays or export_forest(model)
+    tmp_dir = directory + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "max_depth": arrays["max_depth"],
+        "n_features": arrays["n_features"],
+        "value_offset": arrays.get("value_offset", 0),
+        "feature_names": [str(f) for f in getattr(model, "feature_names_in_", [])],
+        "crop_labels": [str(c) for c in encoder.classes_],
+        "model_features": list(model_features),
+        "soil_types": [str(s) for s in soil_types],
+        "fertilizer_ratios": {
+            crop: {k: float(v) for k, v in ratio.items()}
+            for crop, ratio in fertilizer_ratios.items()
+        },
+        "sources": {os.path.basename(p): file_sha256(p) for p in sources},
+        "arrays": {},
+    }
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(arrays[name])
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        manifest["arrays"][name] = {"dtype": str(array.dtype), "shape": list(array.shape)}
+
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = directory + ".old"
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def bundle_is_stale(directory, source_paths):
+    """True if any source pickle no longer matches the hash in the manifest."""
+    recorded = read_manifest(directory).get("sources", {})
+    for path in source_paths:
+        name = os.path.basename(path)
+        if name in recorded and os.path.exists(path) and file_sha256(path) != recorded[name]:
+            return True
+    return False
+
+
+def load_bundle(directory, mmap_mode="r"):
+    """Open a bundle written by ``save_bundle``.
+
+    With ``mmap_mode='r'`` the arrays are read-only views of the files, so
+    every worker process shares the same page-cache pages instead of holding
+    a private copy of the forest.
+    """
+    manifest = read_manifest(directory)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format_version')}")
+
+    arrays = {}
+    for name, spec in manifest["arrays"].items():
+        array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+        if str(array.dtype) != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ValueError(f"Array '{name}' does not match the manifest")
+        arrays[name] = array
+
+    engine = FlatForest(max_depth=manifest["max_depth"], n_features=manifest["n_features"],
+                        value_offset=manifest.get("value_offset", 0), **arrays)
+    return {
+        "engine": engine,
+        "encoder": LabelTable(manifest["crop_labels"]),
+        "model_features": manifest["model_features"],
+        "feature_names": manifest["feature_names"],
+        "soil_types": manifest["soil_types"],
+        "fertilizer_ratios": manifest["fertilizer_ratios"],
+        "manifest": manifest,
+    }
+
+
+# ---------------------------------------------------
+# LATENCY COMPARISON
+# ---------------------------------------------------
+def compare_latency(model, engine, X, batch_sizes=(1, 100, 10000), repeats=20):
+    """Print median predict latency for sklearn vs the flat engine."""
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>8} {'sklearn ms':>12} {'flat ms':>10} {'speedup':>8}")
+    for size in batch_sizes:
+        batch = X[rng.integers(0, len(X), size)]
+        timings = {}
+        for name, predict in (("sklearn", model.predict), ("flat", engine.predict)):
+            predict(batch)
+            runs = []
+            for _ in range(max(3, repeats if size < 10000 else 3)):
+                start = time.perf_counter()
+                predict(batch)
+                runs.append(time.perf_counter() - start)
+            timings[name] = np.median(runs) * 1000
+        print(f"{size:>8} {timings['sklearn']:>12.3f} {timings['flat']:>10.3f} "
+              f"{timings['sklearn'] / timings['flat']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Flat forest export and benchmarks")
+    parser.add_argument("command", nargs="?", choices=["bench", "export"], default="bench")
+    parser.add_argument("--out", default="crop_model_flat", help="bundle directory for 'export'")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    crop_model = joblib.load("crop_model.pkl")
+
+    if args.command == "export":
+        sources = ["crop_model.pkl", "crop_encoder.pkl", "model_features.pkl",
+                   "fertilizer_ratios.pkl", "soil_encoder.pkl"]
+        manifest = save_bundle(args.out, crop_model, joblib.load("crop_encoder.pkl"),
+                               joblib.load("model_features.pkl"),
+                               joblib.load("fertilizer_ratios.pkl"),
+                               joblib.load("soil_encoder.pkl").classes_, sources=sources)
+        print(f"Bundle written to {args.out}/ ({len(manifest['arrays'])} arrays)")
+    else:
+        soil_encoder = joblib.load("soil_encoder.pkl")
+        df = pd.read_csv("Crop_recommendation_with_soil.csv")
+        df["soil_type_enc"] = soil_encoder.transform(df["soil_type"])
+        X = df[list(crop_model.feature_names_in_)].to_numpy(dtype=float)
+
+        flat = FlatForest.from_sklearn(crop_model)
+        assert np.array_equal(flat.predict(X), crop_model.predict(X)), "Parity check failed"
+        print(f"Parity OK on {len(X)} rows ({flat.n_trees} trees, {len(flat.feature)} nodes)")
+        compare_latency(crop_model, flat, X)
@@ -0,0 +1,241 @@
+# metrics.py
+"""Counters, histograms and stage timers exposed in Prometheus text format.
+
+A small in-process registry so the backend needs no extra dependency.  Each
+gunicorn worker keeps its own numbers; a scrape of /metrics reports the
+worker that answered, identified by its ``process_pid`` gauge.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Request and stage latencies in seconds: 50 us .. 2.5 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """A gauge that is either set directly or read from ``fn`` at scrape time."""
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self._value = 0.0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self.fn() if self.fn else self._value
+
+    def render(self):
+        value = self.value()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if value is not None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            series["counts"][i] += 1
+            series["sum"] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series["counts"]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    label_str = _format_labels(self.label_names + ("le",), labels + (le,))
+                    lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+                label_str = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{label_str} {series['sum']!r}")
+                lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs):
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self._add(Histogram(*args, **kwargs))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------
+# STAGE TIMING
+# ---------------------------------------------------
+@contextmanager
+def timed(histogram, *labels):
+    """Observe the wall time of the ``with`` block into ``histogram``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+
+# ---------------------------------------------------
+# PROFILING WINDOW
+# ---------------------------------------------------
+class RequestProfiler:
+    """Profile a sampled fraction of requests for a fixed window of live traffic.
+
+    ``start(seconds, sample_rate)`` opens a window; every sampled request
+    bracketed by ``begin()``/``end()`` during the window is profiled with
+    cProfile and the stats are merged.  When the window closes the merged stats are dumped to
+    a ``.prof`` file in ``output_dir`` (open it with snakeviz, or turn it into
+    a flamegraph with flameprof or gprof2dot).
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._stats = None
+        self._ends_at = 0.0
+        self._sample_rate = 1.0
+        self.requests = 0
+        self.last_dump = None
+
+    @property
+    def active(self):
+        return time.monotonic() < self._ends_at
+
+    def start(self, seconds, sample_rate=1.0):
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profiling window is already open")
+            self._stats = None
+            self.requests = 0
+            self._sample_rate = float(sample_rate)
+            self._ends_at = time.monotonic() + float(seconds)
+
+    def begin(self):
+        """Start profiling the current request if a window is open and it is sampled."""
+        if not self.active or random.random() >= self._sample_rate:
+            self._maybe_dump()
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; skip
+            # requests that overlap one already being profiled
+            return None
+        return profiler
+
+    def end(self, profiler):
+        """Stop a profiler returned by ``begin`` and merge its stats."""
+        if profiler is None:
+            return
+        profiler.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                self._stats.add(profiler)
+            self.requests += 1
+
+    def _maybe_dump(self):
+        """Write the merged stats once the window has closed."""
+        if self._stats is None or self.active:
+            return
+        with self._lock:
+            if self._stats is None:
+                return
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir,
+                                f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            self._stats.dump_stats(path)
+            self._stats = None
+            self.last_dump = path
+            print(f"Profile of {self.requests} requests written to {path}")
+
+    def status(self):
+        self._maybe_dump()
+        return {
+            "active": self.active,
+            "seconds_left": round(max(self._ends_at - time.monotonic(), 0.0), 3),
+            "sample_rate": self._sample_rate,
+            "requests_profiled": self.requests,
+            "last_dump": self.last_dump,
+        }
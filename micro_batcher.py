@@ -0,0 +1,172 @@
+# micro_batcher.py
+"""Coalesce concurrent single-row predictions into vectorized forest calls.
+
+Request threads call ``MicroBatcher.predict(row)`` and block; one background
+thread drains the queue, flushing when ``max_batch_size`` rows are waiting or
+the oldest row has waited ``max_wait_ms``, runs the batch through a single
+``predict_fn`` call and hands each request its own answer.  Under gunicorn's
+gthread workers this turns N concurrent /predict calls into one traversal.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+# Upper bounds (ms) of the queue-wait histogram buckets
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _bucket_counts(buckets):
+    return {str(b): 0 for b in buckets} | {"+Inf": 0}
+
+
+def _observe(histogram, buckets, value):
+    for b in buckets:
+        if value <= b:
+            histogram[str(b)] += 1
+            return
+    histogram["+Inf"] += 1
+
+
+class MicroBatcher:
+    """Queue single feature rows and score them in batches on one thread.
+
+    ``predict_fn(X, context)`` takes an (n, n_features) matrix and returns n
+    results.  ``context`` is whatever the caller passed to ``submit`` (the
+    model bundle the row was encoded with); rows with different contexts are
+    never scored together.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wait_ms_sum = 0.0
+        self.wait_ms_max = 0.0
+        self.batch_sizes = _bucket_counts(BATCH_SIZE_BUCKETS)
+        self.wait_ms = _bucket_counts(WAIT_MS_BUCKETS)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a gunicorn worker forked from a
+        # preloaded master starts its own flusher on first use
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, row, context=None):
+        """Queue one feature row; returns a Future for its prediction."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((np.asarray(row, dtype=float), future, time.perf_counter(), context))
+        return future
+
+    def predict(self, row, context=None, timeout=None):
+        """Prediction for one row; raises TimeoutError if it is not ready within ``timeout`` s.
+
+        A timed-out row is cancelled, so the flusher skips it if it has not
+        been picked up yet.
+        """
+        future = self.submit(row, context)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # ---------------------------------------------------
+    # FLUSH LOOP
+    # ---------------------------------------------------
+    def _collect(self):
+        """Block for the first row, then gather until the batch is full or the wait is up."""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            flushed_at = time.perf_counter()
+            # Normally one group; two only while a model reload is swapping bundles
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[3]), []).append(item)
+            for items in groups.values():
+                self._flush(items)
+                self._record(items, flushed_at)
+
+    def _flush(self, items):
+        # Drop rows whose caller gave up waiting
+        items = [item for item in items if item[1].set_running_or_notify_cancel()]
+        if not items:
+            return
+        X = np.vstack([row for row, _, _, _ in items])
+        try:
+            results = self.predict_fn(X, items[0][3])
+        except Exception as e:
+            print("Micro-batch Error:", e)
+            self.errors += 1
+            for _, future, _, _ in items:
+                future.set_exception(e)
+        else:
+            for (_, future, _, _), result in zip(items, results):
+                future.set_result(result)
+
+    def _record(self, batch, flushed_at):
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            _observe(self.batch_sizes, BATCH_SIZE_BUCKETS, len(batch))
+            for _, _, queued_at, _ in batch:
+                wait_ms = (flushed_at - queued_at) * 1000
+                self.wait_ms_sum += wait_ms
+                self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+                _observe(self.wait_ms, WAIT_MS_BUCKETS, wait_ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self.queue_depth(),
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else None,
+                "batch_size_histogram": dict(self.batch_sizes),
+                "mean_added_latency_ms": round(self.wait_ms_sum / self.requests, 3) if self.requests else None,
+                "max_added_latency_ms": round(self.wait_ms_max, 3),
+                "added_latency_ms_histogram": dict(self.wait_ms),
+            }
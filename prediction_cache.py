@@ -0,0 +1,106 @@
+# prediction_cache.py
+"""Bounded, thread-safe LRU cache for single-row crop predictions.
+
+Keys are the model's feature vector after per-feature quantization, so
+repeated or near-identical submissions (form resubmits, Streamlit reruns,
+client retries) reuse the previous answer instead of re-running the forest.
+Each process holds its own cache, which is what gunicorn workers need.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """LRU cache with a TTL, hit/miss counters and generation-based invalidation.
+
+    ``quantization`` maps feature position to a step size; values are snapped
+    to the nearest multiple of the step before being used as a key.  A step of
+    0 (the default for every feature) keys on the exact value.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=300.0, quantization=None):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.quantization = dict(quantization or {})
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def key(self, features, quantization=None):
+        """Build a hashable key from one feature vector.
+
+        ``quantization`` overrides the cache's own steps, for callers whose
+        column layout changes (flask_backend maps names per model bundle).
+        """
+        quantization = self.quantization if quantization is None else quantization
+        parts = []
+        for i, value in enumerate(features):
+            step = quantization.get(i, 0)
+            value = float(value)
+            parts.append(math.floor(value / step + 0.5) if step else value)
+        return tuple(parts)
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or an expired entry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """Store a value unless the cache was invalidated since ``generation``.
+
+        Callers read ``cache.generation`` before predicting and pass it back
+        here, so a result computed with an old model is never cached after a
+        reload has cleared the cache.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the model artifacts are reloaded."""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "generation": self.generation,
+            }
@@ -0,0 +1,74 @@
+# reloader.py
+"""Poll artifact files and trigger a model reload once a change has settled.
+
+train_model.py replaces several files one after another, so a change only
+fires ``on_change`` after the watched files have stopped changing for one
+full polling interval.  Like the micro-batcher, the polling thread starts
+lazily so each forked gunicorn worker runs its own.
+"""
+
+import os
+import threading
+import time
+
+
+def file_signature(path):
+    """(mtime_ns, size) of ``path``, or None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ArtifactWatcher:
+    def __init__(self, paths, on_change, interval):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = float(interval)
+        self.changes = 0
+        self._seen = self.snapshot()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def snapshot(self):
+        return {path: file_signature(path) for path in self.paths}
+
+    def rebase(self):
+        """Treat the files as they are now as already loaded."""
+        self._seen = self.snapshot()
+
+    def ensure_running(self):
+        if self.interval <= 0:
+            return
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="artifact-watcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def poll(self, previous):
+        """One polling step: returns the new snapshot and whether to reload now."""
+        current = self.snapshot()
+        if current != previous:
+            # Still being written; wait for a quiet interval
+            return current, False
+        return current, current != self._seen
+
+    def _run(self):
+        previous = self.snapshot()
+        while True:
+            time.sleep(self.interval)
+            previous, changed = self.poll(previous)
+            if changed:
+                self.changes += 1
+                print("Model artifacts changed on disk, reloading.")
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print("Artifact Watcher Error:", e)
+                # Don't retry the same files in a loop if the load failed
+                self._seen = previous
@@ -0,0 +1,181 @@
+# similar_index.py
+"""Nearest historical samples to a field, for the "similar fields" view.
+
+The seven numeric features are standardized with the training set's mean
+and standard deviation, and one KD-tree per soil type is built over them.
+A lookup only searches the tree of the field's own soil, in logarithmic
+time, so it stays sub-millisecond on multi-million-row surveys where a
+DataFrame scan would not.
+
+``train_model.py`` builds the index from the rows it trains on and saves it
+as ``similar_index.pkl``; ``flask_backend`` serves it on ``/similar``.
+
+    python similar_index.py build                       # rebuild similar_index.pkl only
+    python similar_index.py bench --synthetic-rows 2000000
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from features import NUMERIC_FEATURES, SOIL_COLUMN
+
+LABEL_COLUMN = "label"
+LEAF_SIZE = 40
+
+
+class SimilarFieldsIndex:
+    """Per-soil KD-trees over standardized numeric features."""
+
+    def __init__(self, mean, scale, labels, partitions):
+        self.mean = mean
+        self.scale = scale
+        self.labels = labels
+        # soil -> (KDTree, raw features, label codes, source row numbers)
+        self.partitions = partitions
+
+    @classmethod
+    def build(cls, frame, leaf_size=LEAF_SIZE):
+        """Index every row of a training DataFrame (numerics, soil_type and label).
+
+        Neighbours report the frame's index label as their ``row``: the
+        position in the source file, also for the sample streamed with
+        ``train_model.py --chunksize``.
+        """
+        source_rows = frame.index.to_numpy(dtype=np.int64)
+        values = frame[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+        # The data_io loaders read numerics as float32; echo those as their
+        # shortest decimal form (92.98254, not 92.9825439453125)
+        shown = values.copy()
+        for j, feature in enumerate(NUMERIC_FEATURES):
+            if frame[feature].dtype == np.float32:
+                shown[:, j] = frame[feature].to_numpy().astype(str).astype(np.float64)
+        mean = values.mean(axis=0)
+        scale = values.std(axis=0)
+        scale[scale == 0] = 1.0
+        standardized = (values - mean) / scale
+
+        label_codes, labels = pd.factorize(frame[LABEL_COLUMN].astype(str), sort=True)
+        soils = frame[SOIL_COLUMN].astype(str).to_numpy()
+        partitions = {}
+        for soil in sorted(set(soils)):
+            rows = np.flatnonzero(soils == soil)
+            partitions[soil] = (KDTree(standardized[rows], leaf_size=leaf_size), shown[rows],
+                                label_codes[rows].astype(np.int32), source_rows[rows])
+        return cls(mean, scale, np.asarray(labels), partitions)
+
+    @property
+    def n_rows(self):
+        return sum(len(part[3]) for part in self.partitions.values())
+
+    def query(self, values, soils, k=5):
+        """The k nearest indexed rows for each query row.
+
+        ``values`` is (n, 7) in NUMERIC_FEATURES order and ``soils`` the n
+        soil names.  Rows of one soil are looked up together, in a single
+        tree query.  Returns one list of neighbour dicts per row, nearest
+        first; a soil with no indexed rows gets an empty list.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(NUMERIC_FEATURES))
+        soils = np.asarray(soils, dtype=object)
+        standardized = (values - self.mean) / self.scale
+        results = [[] for _ in range(len(values))]
+        for soil in set(soils.tolist()):
+            if soil not in self.partitions:
+                continue
+            tree, raw, label_codes, source_rows = self.partitions[soil]
+            positions = np.flatnonzero(soils == soil)
+            distances, neighbors = tree.query(standardized[positions], k=min(k, len(source_rows)))
+            for position, row_distances, row_neighbors in zip(positions.tolist(), distances, neighbors):
+                results[position] = [
+                    dict(zip(NUMERIC_FEATURES, raw[j].tolist()),
+                         soil_type=soil, label=str(self.labels[label_codes[j]]),
+                         row=int(source_rows[j]), distance=round(float(d), 6))
+                    for d, j in zip(row_distances.tolist(), row_neighbors.tolist())
+                ]
+        return results
+
+
+# ---------------------------------------------------
+# BENCHMARK
+# ---------------------------------------------------
+def benchmark(frame, n_queries=1000, k=5, seed=0):
+    """Build time and per-query latency of the index against a full scan."""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    index = SimilarFieldsIndex.build(frame)
+    build_s = time.perf_counter() - start
+
+    probes = frame.iloc[rng.integers(0, len(frame), n_queries)]
+    values = probes[NUMERIC_FEATURES].to_numpy(dtype=np.float64)
+    soils = probes[SOIL_COLUMN].astype(str).to_numpy()
+
+    timings = []
+    for i in range(n_queries):
+        start = time.perf_counter()
+        index.query(values[i:i + 1], soils[i:i + 1], k)
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index.query(values, soils, k)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    # What app.load_data() offers today: a scan of the whole frame per lookup
+    standardized = ((frame[NUMERIC_FEATURES].to_numpy(dtype=np.float64) - index.mean) / index.scale)
+    all_soils = frame[SOIL_COLUMN].astype(str).to_numpy()
+    scan_timings = []
+    for i in range(min(n_queries, 20)):
+        start = time.perf_counter()
+        candidates = np.flatnonzero(all_soils == soils[i])
+        d = np.linalg.norm(standardized[candidates] - (values[i] - index.mean) / index.scale, axis=1)
+        candidates[np.argpartition(d, k)[:k]]
+        scan_timings.append(time.perf_counter() - start)
+
+    return {
+        "rows": len(frame),
+        "build_s": build_s,
+        "p50_ms": np.percentile(timings, 50) * 1000,
+        "p99_ms": np.percentile(timings, 99) * 1000,
+        "batch_ms_per_row": batch_ms / n_queries,
+        "scan_ms": np.median(scan_timings) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from data_io import read_dataset
+
+    parser = argparse.ArgumentParser(description="Similar-fields nearest-neighbour index")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--data", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--out", default="similar_index.pkl", help="index file written by 'build'")
+    parser.add_argument("--synthetic-rows", type=int, nargs="*", default=[],
+                        help="also benchmark frames resampled to these sizes")
+    args = parser.parse_args()
+
+    base = read_dataset(args.data)
+    if args.command == "build":
+        # Pickle the class under its module name, not __main__, so the backend can load it
+        from similar_index import SimilarFieldsIndex as Index
+        from train_model import atomic_dump
+
+        index = Index.build(base)
+        atomic_dump(index, args.out)
+        print(f"Indexed {index.n_rows} rows over {len(index.partitions)} soil types into {args.out}")
+    else:
+        frames = [base]
+        rng = np.random.default_rng(0)
+        for n in args.synthetic_rows:
+            frame = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+            for column in NUMERIC_FEATURES:
+                frame[column] = frame[column] * rng.normal(1.0, 0.02, n)
+            frames.append(frame)
+
+        print(f"{'rows':>10} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch ms/row':>13} {'scan ms':>9}")
+        for frame in frames:
+            r = benchmark(frame)
+            print(f"{r['rows']:>10} {r['build_s']:>8.2f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+                  f"{r['batch_ms_per_row']:>13.4f} {r['scan_ms']:>9.2f}")
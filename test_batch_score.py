@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import warnings
+
+import pandas as pd
+import pytest
+
+import batch_score
+import flask_backend
+from batch_score import non_negative_int, score_file
+
+warnings.filterwarnings("ignore")
+
+
+def survey_frame():
+    df = pd.read_csv('Crop_recommendation_with_soil.csv').sample(300, random_state=3).reset_index(drop=True)
+    df = df.drop(columns=['label']).astype({'N': object})
+    df.loc[4, 'N'] = 'abc'
+    df.loc[9, 'soil_type'] = 'Moon'
+    return df
+
+
+def test_matches_batch_endpoint(tmp_path):
+    """Offline scores, top-k and errors are what /predict/batch returns, row for row."""
+    df = survey_frame()
+    df.to_csv(tmp_path / 'survey.csv', index=False)
+    stats = score_file(str(tmp_path / 'survey.csv'), str(tmp_path / 'scored.csv'),
+                       chunksize=64, workers=2, top_k=2)
+    assert stats['rows'] == 300 and stats['errors'] == 2
+
+    scored = pd.read_csv(tmp_path / 'scored.csv')
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    api = flask_backend.app.test_client().post('/predict/batch', json={'records': records, 'top_k': 2})
+    results = api.get_json()['results']
+
+    assert scored['row'].tolist() == list(range(300))
+    for result, (_, row) in zip(results, scored.iterrows()):
+        if result['error']:
+            assert row['error'] == result['error'] and pd.isna(row['recommended_crop'])
+            continue
+        assert row['recommended_crop'] == result['recommended_crop']
+        assert [row['crop_1'], row['crop_2']] == [c['crop'] for c in result['top_crops']]
+        ratio = flask_backend.MODELS.fertilizer_ratios[row['recommended_crop']]
+        assert row['ratio_N'] == ratio['N'] and row['ratio_K'] == ratio['K']
+
+
+def test_parquet_round_trip(tmp_path):
+    """Parquet in and out, single process, with the input columns kept."""
+    df = survey_frame().astype({'N': str})
+    df.to_parquet(tmp_path / 'survey.parquet')
+    score_file(str(tmp_path / 'survey.parquet'), str(tmp_path / 'scored.parquet'),
+               chunksize=100, workers=1, top_k=0, keep_input=True)
+
+    scored = pd.read_parquet(tmp_path / 'scored.parquet')
+    assert len(scored) == 300
+    assert scored['soil_type'].tolist() == df['soil_type'].tolist()
+    assert scored['error'].notna().sum() == 2
+    assert 'crop_1' not in scored.columns
+
+
+@pytest.mark.parametrize('suffix', ['csv', 'parquet'])
+def test_failed_run_leaves_no_partial_output(tmp_path, monkeypatch, suffix):
+    """A run that dies after some chunks keeps the old output and removes its temp file."""
+    survey_frame().to_csv(tmp_path / 'survey.csv', index=False)
+    output = tmp_path / f'scored.{suffix}'
+    output.write_text('previous run')
+
+    score_chunk = batch_score.score_chunk
+
+    def failing_score_chunk(task):
+        if task[0] >= 200:
+            raise RuntimeError('worker died')
+        return score_chunk(task)
+
+    monkeypatch.setattr(batch_score, 'score_chunk', failing_score_chunk)
+    with pytest.raises(RuntimeError, match='worker died'):
+        score_file(str(tmp_path / 'survey.csv'), str(output), chunksize=100, workers=1)
+    assert output.read_text() == 'previous run'
+    assert not os.path.exists(f'{output}.tmp')
+
+
+def test_negative_top_k_is_rejected(tmp_path):
+    survey_frame().to_csv(tmp_path / 'survey.csv', index=False)
+    with pytest.raises(ValueError, match='top_k'):
+        score_file(str(tmp_path / 'survey.csv'), str(tmp_path / 'scored.csv'), workers=1, top_k=-1)
+    assert not os.path.exists(tmp_path / 'scored.csv')
+    assert non_negative_int('0') == 0
+    with pytest.raises(Exception, match='negative'):
+        non_negative_int('-1')
+
+
+def test_import_leaves_model_format_alone():
+    """The scoring format is chosen by the CLI, not by importing the module."""
+    env = {k: v for k, v in os.environ.items() if k != 'MODEL_FORMAT'}
+    code = "import os, batch_score; assert 'MODEL_FORMAT' not in os.environ; " \
+           "batch_score.use_model_format('pickle'); assert batch_score.flask_backend.MODELS.format == 'pickle'"
+    subprocess.run([sys.executable, '-c', code], env=env, check=True, capture_output=True)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    for test in (test_matches_batch_endpoint, test_parquet_round_trip):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("SUCCESS: offline scoring matches /predict/batch.")
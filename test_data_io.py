@@ -0,0 +1,60 @@
+import shutil
+
+import joblib
+import pandas as pd
+import pytest
+
+from data_io import (ReservoirSample, cache_is_fresh, columnar_cache_path, iter_chunks,
+                     read_dataset, stream_dataset, write_columnar_cache)
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+
+
+def test_streamed_ratios_match_groupby():
+    """Chunked N/P/K aggregates equal the in-memory groupby mean exactly."""
+    df = pd.read_csv(DATASET_PATH)
+    expected = df.groupby('label')[['N', 'P', 'K']].mean().to_dict('index')
+
+    for chunksize in (7, 137, 10_000):
+        ratios, _, n_rows = stream_dataset(DATASET_PATH, chunksize=chunksize, sample_rows=10)
+        assert n_rows == len(df)
+        assert ratios == expected
+
+    assert ratios == joblib.load('fertilizer_ratios.pkl')
+
+
+def test_reservoir_sample_is_bounded_and_covers_stream():
+    """The training sample never exceeds its size, even though the CSV is sorted by crop."""
+    sample = ReservoirSample(440, random_state=0)
+    for chunk in iter_chunks(DATASET_PATH, chunksize=100):
+        sample.update(chunk)
+        assert len(sample.frame()) <= 440
+
+    frame = sample.frame()
+    assert len(frame) == 440
+    assert frame['label'].nunique() == 22
+    assert str(frame['N'].dtype) == 'float32'
+
+
+def test_columnar_cache_round_trip_and_staleness(tmp_path):
+    """The Parquet cache is used while it matches the CSV and ignored once the CSV changes."""
+    pytest.importorskip('pyarrow')
+    csv_path = str(tmp_path / 'data.csv')
+    shutil.copy(DATASET_PATH, csv_path)
+    cache_path, rows = write_columnar_cache(csv_path, chunksize=500)
+
+    assert rows == 2200
+    assert cache_is_fresh(csv_path, cache_path)
+    cached = read_dataset(csv_path)
+    assert cached.equals(pd.read_csv(csv_path, dtype=dict(cached.dtypes)))
+
+    with open(csv_path, 'a') as f:
+        f.write('1,2,3,20.0,80.0,6.5,100.0,rice,Alluvial\n')
+    assert not cache_is_fresh(csv_path, columnar_cache_path(csv_path))
+    assert len(read_dataset(csv_path)) == 2201
+
+
+if __name__ == '__main__':
+    test_streamed_ratios_match_groupby()
+    test_reservoir_sample_is_bounded_and_covers_stream()
+    print("SUCCESS: Streaming ingestion matches the in-memory pipeline.")
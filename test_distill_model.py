@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import warnings
+
+import pandas as pd
+import pytest
+
+import flask_backend
+from compress_forest import load_artifacts
+from distill_model import SOURCES, build_report, choose_setting, export_distilled
+
+warnings.filterwarnings("ignore")
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+FIELD = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82.0, 'ph': 6.5,
+         'rainfall': 202.9, 'soil_type': 'Alluvial'}
+
+
+@pytest.fixture
+def restore_models(monkeypatch):
+    yield
+    monkeypatch.undo()
+    flask_backend.load_models()
+
+
+def test_deeper_students_are_more_faithful():
+    """The report covers the teacher and every student; depth buys fidelity for size."""
+    rows = build_report(load_artifacts(), pd.read_csv(DATASET_PATH), depths=[4, 10], min_leaf_sizes=[1],
+                        train_samples=20_000, eval_samples=5_000)
+    teacher, shallow, deep = rows
+    assert teacher['agreement'] == 1.0 and teacher['mean_tv_distance'] == 0.0
+    assert shallow['bytes'] < deep['bytes'] < teacher['bytes']
+    assert shallow['agreement_near_data'] < deep['agreement_near_data']
+    assert deep['dataset_accuracy'] > 0.95
+    assert choose_setting(rows, 0.0) is shallow and choose_setting(rows, 1.01) is None
+
+
+def test_distilled_serving_path(tmp_path, monkeypatch, restore_models):
+    """MODEL_FORMAT=distilled serves the student through the usual endpoints, without sklearn."""
+    out = str(tmp_path / 'distilled')
+    export_distilled(load_artifacts(), pd.read_csv(DATASET_PATH), 12, 1, out, SOURCES, train_samples=20_000)
+
+    monkeypatch.setattr(flask_backend, 'DISTILLED_BUNDLE_DIR', out)
+    monkeypatch.setattr(flask_backend, 'MODEL_FORMAT', 'distilled')
+    assert flask_backend.load_models()
+    assert flask_backend.MODELS.format == 'distilled' and flask_backend.MODELS.engine.n_trees == 1
+
+    client = flask_backend.app.test_client()
+    assert client.post('/predict', json=FIELD).get_json()['recommended_crop'] == 'rice'
+    assert client.post('/similar', json=FIELD).status_code == 503
+
+    code = "import sys, flask_backend; assert flask_backend.MODELS.format == 'distilled'; " \
+           "assert not any(m.startswith('sklearn') for m in sys.modules)"
+    env = dict(os.environ, MODEL_FORMAT='distilled', DISTILLED_BUNDLE_DIR=out)
+    subprocess.run([sys.executable, '-c', code], env=env, check=True, capture_output=True)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    test_deeper_students_are_more_faithful()
+    with tempfile.TemporaryDirectory() as tmp:
+        mp = pytest.MonkeyPatch()
+        try:
+            test_distilled_serving_path(Path(tmp), mp, None)
+        finally:
+            mp.undo()
+            flask_backend.load_models()
+    print("SUCCESS: distilled student is faithful and served without scikit-learn.")
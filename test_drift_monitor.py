@@ -0,0 +1,88 @@
+import warnings
+
+import pandas as pd
+
+import flask_backend
+from drift_monitor import DriftMonitor, build_reference
+from features import NUMERIC_FEATURES
+
+warnings.filterwarnings("ignore")
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+
+
+def observe_rows(monitor, df):
+    for row in df.itertuples(index=False):
+        values = [float(getattr(row, f)) for f in NUMERIC_FEATURES]
+        monitor.observe(values, row.soil_type, row.label)
+
+
+def test_training_rows_do_not_drift_and_shifted_rows_do():
+    df = pd.read_csv(DATASET_PATH)
+    reference = build_reference(df)
+
+    monitor = DriftMonitor(reference)
+    observe_rows(monitor, df.sample(1000, random_state=0))
+    current = monitor.report()['current']
+    assert current['rows'] == 1000 and current['drifted'] == []
+    assert current['max_psi'] < 0.05
+
+    # A wetter season, fed in one batch, with some rows above the training range
+    shifted = df.sample(1000, random_state=1)
+    shifted['rainfall'] *= 1.6
+    batch = DriftMonitor(reference)
+    batch.observe_batch(shifted[NUMERIC_FEATURES].to_numpy(), shifted['soil_type'], shifted['label'])
+    scores = batch.report()['current']['features']
+    assert batch.report()['current']['drifted'] == ['rainfall']
+    assert scores['rainfall']['ks'] > 0.2 and scores['rainfall']['above_range'] > 50
+    assert scores['N']['psi'] < 0.05
+
+    # One row at a time counts exactly what the batch counted
+    single = DriftMonitor(reference)
+    observe_rows(single, shifted)
+    assert single.report()['current'] == dict(batch.report()['current'],
+                                               started_at=single.report()['current']['started_at'])
+
+
+def test_closed_window_is_kept_as_previous():
+    df = pd.read_csv(DATASET_PATH)
+    monitor = DriftMonitor(build_reference(df), window_seconds=0)
+    observe_rows(monitor, df.head(10))
+    report = monitor.report()
+    assert report['previous']['rows'] == 1 and report['previous']['ended_at'] is not None
+    assert report['current']['rows'] == 0 and report['current']['max_psi'] is None
+
+
+def test_drift_endpoint(monkeypatch):
+    """Single and batch predictions are counted; /drift reports them."""
+    assert flask_backend.load_drift_monitor() is None  # opt-in
+    monkeypatch.setitem(flask_backend.app.config, 'DRIFT_MONITORING', True)
+    monkeypatch.setattr(flask_backend, 'DRIFT_MONITOR', flask_backend.load_drift_monitor())
+    client = flask_backend.app.test_client()
+    df = pd.read_csv(DATASET_PATH).sample(50, random_state=2).drop(columns=['label'])
+    records = df.to_dict('records')
+
+    client.post('/predict', json=records[0])
+    client.post('/recommend', json=records[1])
+    client.post('/predict/batch', json={'records': records[2:] + [{'N': 'abc'}], 'top_k': 2})
+    report = client.get('/drift').get_json()
+    assert report['current']['rows'] == 50
+    assert set(report['current']['features']) == set(NUMERIC_FEATURES) | {'soil_type', 'label'}
+
+    monkeypatch.setattr(flask_backend, 'DRIFT_MONITOR', None)
+    assert client.get('/drift').status_code == 503
+    monkeypatch.setitem(flask_backend.app.config, 'DRIFT_MONITORING', False)
+    assert 'disabled' in client.get('/drift').get_json()['error']
+
+
+if __name__ == '__main__':
+    import pytest
+
+    test_training_rows_do_not_drift_and_shifted_rows_do()
+    test_closed_window_is_kept_as_previous()
+    mp = pytest.MonkeyPatch()
+    try:
+        test_drift_endpoint(mp)
+    finally:
+        mp.undo()
+    print("SUCCESS: drift monitor counts live inputs and flags shifted features.")
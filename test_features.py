@@ -0,0 +1,136 @@
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+import flask_backend
+import train_model
+from features import FeatureEncoder
+
+warnings.filterwarnings("ignore")
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+ARTIFACT_PATHS = {
+    'CROP_MODEL_PATH': train_model.MODEL_PATH,
+    'CROP_ENCODER_PATH': train_model.CROP_ENCODER_PATH,
+    'MODEL_FEATURES_PATH': train_model.FEATURES_PATH,
+    'FERTILIZER_RATIOS_PATH': train_model.FERTILIZER_PATH,
+    'SOIL_ENCODER_PATH': train_model.SOIL_ENCODER_PATH,
+    'FLAT_BUNDLE_DIR': train_model.BUNDLE_DIR,
+}
+
+
+def serve_from(monkeypatch, out_dir, model_format):
+    """Point flask_backend at the artifacts in ``out_dir`` and reload them."""
+    for attr, name in ARTIFACT_PATHS.items():
+        monkeypatch.setattr(flask_backend, attr, str(out_dir / name))
+    monkeypatch.setattr(flask_backend, 'MODEL_FORMAT', model_format)
+    flask_backend.load_models()
+    return flask_backend.app.test_client()
+
+
+@pytest.fixture
+def restore_models(monkeypatch):
+    yield
+    # Put the real artifact paths back before reloading
+    monkeypatch.undo()
+    flask_backend.load_models()
+
+
+@pytest.mark.parametrize('scheme', ['ordinal', 'onehot'])
+@pytest.mark.parametrize('model_format', ['pickle', 'flat'])
+def test_training_and_serving_agree(tmp_path, monkeypatch, restore_models, scheme, model_format):
+    """Rows served through /predict and /predict/batch get the trained model's answer."""
+    train_model.main(['--out-dir', str(tmp_path), '--n-estimators', '10', '--scheme', scheme])
+    model = joblib.load(tmp_path / train_model.MODEL_PATH)
+    crop_encoder = joblib.load(tmp_path / train_model.CROP_ENCODER_PATH)
+    client = serve_from(monkeypatch, tmp_path, model_format)
+    assert flask_backend.MODELS.feature_encoder.scheme == scheme
+
+    df = pd.read_csv(DATASET_PATH).sample(200, random_state=0)
+    encoder = FeatureEncoder.fit(df['soil_type'], scheme)
+    expected = crop_encoder.inverse_transform(model.predict(encoder.transform_frame(df)))
+
+    records = df.drop(columns='label').to_dict('records')
+    batch = client.post('/predict/batch', json=records).get_json()
+    assert batch['n_errors'] == 0
+    assert [r['recommended_crop'] for r in batch['results']] == list(expected)
+
+    for record, crop in list(zip(records, expected))[:20]:
+        assert client.post('/predict', json=record).get_json()['recommended_crop'] == crop
+
+
+def test_soil_mapping_matches_training():
+    """Every soil type is encoded with the code soil_encoder.pkl gave it in training."""
+    soil_encoder = joblib.load('soil_encoder.pkl')
+    encoder = FeatureEncoder(joblib.load('model_features.pkl'), soil_encoder.classes_)
+    for soil in soil_encoder.classes_:
+        X = encoder.encode_one({f: 0 for f in ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']}
+                               | {'soil_type': soil})
+        assert X[0, encoder.soil_index] == soil_encoder.transform([soil])[0]
+
+
+def test_schema_drift_is_rejected():
+    """Artifacts that disagree on the feature layout fail at load time."""
+    soils = ['Alluvial', 'Loamy', 'Sandy Loam']
+    numeric = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+    with pytest.raises(ValueError, match='missing numeric'):
+        FeatureEncoder(numeric[1:] + ['soil_type_enc'], soils)
+    with pytest.raises(ValueError, match='Unrecognised'):
+        FeatureEncoder(numeric + ['soil_type_Clay'], soils)
+    with pytest.raises(ValueError, match='do not cover'):
+        FeatureEncoder(numeric + ['soil_type_Alluvial'], soils)
+    with pytest.raises(ValueError, match='does not match'):
+        flask_backend.build_feature_encoder(numeric + ['soil_type_enc'], soils,
+                                            ['soil_type_enc'] + numeric)
+
+
+def test_batch_errors_are_per_row():
+    encoder = FeatureEncoder.fit(['Alluvial', 'Loamy'])
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82,
+           'ph': 6.5, 'rainfall': 202.9, 'soil_type': 'Loamy'}
+    frame = pd.DataFrame([row, {**row, 'N': 'abc'}, {**row, 'soil_type': 'Clay'}, {**row, 'ph': None}])
+    X, valid_rows, errors = encoder.transform(frame)
+
+    assert list(valid_rows) == [0]
+    assert errors == {1: "Invalid value for N: 'abc'", 2: "Soil type 'Clay' not recognized",
+                      3: 'Missing ph'}
+    assert np.array_equal(X, encoder.encode_one(row))
+
+
+def test_non_finite_values_are_rejected():
+    """NaN and infinity parse as floats but are rejected on every path, single and batch."""
+    encoder = FeatureEncoder.fit(['Alluvial', 'Loamy'])
+    row = {'N': 90, 'P': 42, 'K': 43, 'temperature': 20.8, 'humidity': 82,
+           'ph': 6.5, 'rainfall': 202.9, 'soil_type': 'Loamy'}
+    for value in ('nan', 'inf', float('-inf')):
+        with pytest.raises(ValueError, match='Invalid value for N'):
+            encoder.encode_one({**row, 'N': value})
+    _, _, errors = encoder.transform(pd.DataFrame([{**row, 'N': float('inf')}]))
+    assert errors == {0: 'Invalid value for N: inf'}
+
+    # The single-row and batch paths word every rejection the same way
+    for value in ([1], {'a': 1}, 'abc', None, float('nan'), 'inf'):
+        with pytest.raises(ValueError) as single:
+            encoder.encode_one({**row, 'N': value})
+        _, _, errors = encoder.transform(pd.DataFrame([{**row, 'N': value}]))
+        assert str(single.value) == errors[0]
+
+    client = flask_backend.app.test_client()
+    field = {**row, 'soil_type': 'Alluvial'}
+    for path in ('/predict', '/recommend', '/similar'):
+        assert client.post(path, json={**field, 'N': 'inf'}).status_code == 400
+        assert client.post(path, json={**field, 'N': 'nan'}).status_code == 400
+        response = client.post(path, json={**field, 'N': [1]})
+        assert response.status_code == 400 and response.get_json()['error'] == 'Invalid value for N: [1]'
+
+
+if __name__ == '__main__':
+    test_soil_mapping_matches_training()
+    test_schema_drift_is_rejected()
+    test_batch_errors_are_per_row()
+    test_non_finite_values_are_rejected()
+    print("SUCCESS: Feature encoding checks passed.")
@@ -0,0 +1,109 @@
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import flask_backend
+from fertilizer_engine import PRODUCT_GRADES, FertilizerTable
+
+warnings.filterwarnings("ignore")
+
+RATIOS = joblib.load('fertilizer_ratios.pkl')
+TABLE = FertilizerTable(RATIOS)
+
+
+def test_crop_ids_match_the_crop_encoder():
+    """Table rows are in crop_encoder.pkl class order, so model ids index it directly."""
+    crop_encoder = joblib.load('crop_encoder.pkl')
+    assert list(TABLE.crops) == list(crop_encoder.classes_)
+    assert list(TABLE.crop_ids(['rice', 'Maize', 'avocado', 'zzz'])) == [
+        crop_encoder.transform(['rice'])[0], crop_encoder.transform(['maize'])[0], -1, -1]
+
+
+def test_doses_supply_the_deficit():
+    """Products at the returned doses add up to exactly the deficit (N may be over-met by DAP)."""
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, len(TABLE), 5000)
+    soil = rng.uniform(0, 150, (5000, 3))
+    deficit, doses = TABLE.recommend(ids, soil)
+
+    for j, crop in enumerate(TABLE.crops[ids[:50]]):
+        expected = np.maximum([RATIOS[crop][n] - soil[j, k] for k, n in enumerate('NPK')], 0)
+        assert np.allclose(deficit[j], expected)
+
+    supplied = doses @ PRODUCT_GRADES
+    assert np.all(doses >= 0)
+    assert np.allclose(supplied[:, 1:], deficit[:, 1:])
+    assert np.all(supplied[:, 0] >= deficit[:, 0] - 1e-9)
+    # Urea is only added when DAP's nitrogen falls short
+    assert np.allclose(supplied[doses[:, 0] > 0, 0], deficit[doses[:, 0] > 0, 0])
+
+
+def test_batch_endpoint_matches_single_requests():
+    df = pd.read_csv('Crop_recommendation_with_soil.csv').sample(100, random_state=1)
+    records = [{"crop": row.label, "N": row.N, "P": row.P, "K": row.K} for row in df.itertuples()]
+    records.append({"crop": "avocado", "N": 1, "P": 1, "K": 1})
+    client = flask_backend.app.test_client()
+    body = client.post('/fertilizer/batch', json={"records": records}).get_json()
+
+    assert body['n_errors'] == 1
+    assert body['results'][-1]['error'] == "No fertilizer data for crop 'avocado'"
+    for record, result in list(zip(records, body['results']))[:10]:
+        single = client.post('/fertilizer_recommendation', json=record).get_json()
+        assert result['dose_kg'] == single['dose_kg']
+        assert result['deficit'] == single['deficit']
+
+
+def test_recommend_combines_crop_and_fertilizer():
+    """/recommend answers what /predict and /fertilizer_recommendation would, in one call."""
+    client = flask_backend.app.test_client()
+    row = {"N": 60, "P": 30, "K": 20, "temperature": 20.9, "humidity": 82.0,
+           "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+    body = client.post('/recommend?top_k=3', json=row).get_json()
+
+    assert body['recommended_crop'] == client.post('/predict', json=row).get_json()['recommended_crop']
+    assert [c['crop'] for c in body['top_crops']] == [
+        c['crop'] for c in client.post('/predict?top_k=3', json=row).get_json()['top_crops']]
+    for entry in [{"crop": body['recommended_crop'], "fertilizer": body['fertilizer']}] + body['top_crops']:
+        single = client.post('/fertilizer_recommendation',
+                             json={"crop": entry['crop'], "N": 60, "P": 30, "K": 20}).get_json()
+        assert entry['fertilizer'] == {k: single[k] for k in ('recommended_ratio', 'deficit', 'dose_kg')}
+
+
+def test_single_row_paths_reject_bad_soil_like_the_batch():
+    """Negative, NaN or infinite soil values get a 400 with the batch endpoint's message."""
+    client = flask_backend.app.test_client()
+    field = {"N": 60, "P": 30, "K": 20, "temperature": 20.9, "humidity": 82.0,
+             "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+    for bad, message in [({"N": -5}, "Invalid value for N: -5"), ({"P": "nan"}, "Invalid value for P: 'nan'"),
+                         ({"K": "inf"}, "Invalid value for K: 'inf'")]:
+        record = dict({"crop": "rice", "N": 1, "P": 1, "K": 1}, **bad)
+        batch = client.post('/fertilizer/batch', json={"records": [record]}).get_json()
+        assert batch['results'][0]['error'] == message
+
+        single = client.post('/fertilizer_recommendation', json=record)
+        assert single.status_code == 400 and single.get_json()['error'] == message
+        assert client.post('/recommend', json=dict(field, **bad)).status_code == 400
+
+
+def test_non_string_crop_is_invalid_not_missing():
+    client = flask_backend.app.test_client()
+    for crop in (5, ['rice'], {'name': 'rice'}):
+        response = client.post('/fertilizer_recommendation', json={"crop": crop})
+        assert response.status_code == 400 and response.get_json()['error'] == f"Invalid crop: {crop!r}"
+    assert client.post('/fertilizer_recommendation', json={"crop": ""}).get_json()['error'] == "Missing crop name"
+
+    soil = {"N": 1, "P": 1, "K": 1}
+    records = [dict(soil, crop=5), soil, dict(soil, crop="rice")]
+    body = client.post('/fertilizer/batch', json={"records": records}).get_json()
+    assert [r['error'] for r in body['results']] == ["Invalid crop: 5", "Missing crop name", None]
+    columns = {"crop": [7, "rice"], "N": [1, 1], "P": [1, 1], "K": [1, 1]}
+    body = client.post('/fertilizer/batch', json={"columns": columns}).get_json()
+    assert [r['error'] for r in body['results']] == ["Invalid crop: 7", None]
+
+
+if __name__ == '__main__':
+    test_crop_ids_match_the_crop_encoder()
+    test_doses_supply_the_deficit()
+    print("SUCCESS: Fertilizer doses cover the deficits.")
@@ -0,0 +1,163 @@
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble._forest import _generate_sample_indices
+
+from compress_forest import bootstrap_mask, choose_setting, compress_forest, pruned_nodes
+from forest_engine import FlatForest, load_bundle, save_bundle
+
+warnings.filterwarnings("ignore")
+
+CROP_MODEL = joblib.load('crop_model.pkl')
+SOIL_ENCODER = joblib.load('soil_encoder.pkl')
+ENGINE = FlatForest.from_sklearn(CROP_MODEL)
+
+
+def dataset_features():
+    """All rows of the bundled CSV, encoded the way crop_model.pkl was trained."""
+    df = pd.read_csv('Crop_recommendation_with_soil.csv')
+    df['soil_type_enc'] = SOIL_ENCODER.transform(df['soil_type'])
+    return df[list(CROP_MODEL.feature_names_in_)].to_numpy(dtype=float)
+
+
+def test_parity_on_dataset():
+    """Flat engine labels and probabilities match sklearn on every CSV row."""
+    X = dataset_features()
+    assert len(X) == 2200
+
+    assert np.array_equal(ENGINE.predict(X), CROP_MODEL.predict(X))
+    assert np.array_equal(ENGINE.predict_proba(X), CROP_MODEL.predict_proba(X))
+
+
+def test_parity_on_split_thresholds():
+    """Inputs sitting exactly on split thresholds take the same branch as sklearn."""
+    rng = np.random.default_rng(42)
+    X = dataset_features()[rng.integers(0, 2200, 500)]
+
+    split_nodes = np.flatnonzero(~ENGINE.is_leaf)
+    nodes = rng.choice(split_nodes, len(X))
+    X[np.arange(len(X)), ENGINE.feature[nodes]] = ENGINE.threshold[nodes]
+
+    assert np.array_equal(ENGINE.predict(X), CROP_MODEL.predict(X))
+
+
+def test_parity_across_chunks():
+    """Batches larger than one traversal chunk are stitched back in row order."""
+    rng = np.random.default_rng(7)
+    X = dataset_features()[rng.integers(0, 2200, FlatForest.CHUNK_ROWS * 2 + 17)]
+
+    assert np.array_equal(ENGINE.predict(X), CROP_MODEL.predict(X))
+
+
+def test_bundle_round_trip(tmp_path):
+    """A saved bundle opens memory-mapped and predicts exactly like the pickle."""
+    directory = str(tmp_path / 'bundle')
+    save_bundle(directory, CROP_MODEL, joblib.load('crop_encoder.pkl'),
+                joblib.load('model_features.pkl'), joblib.load('fertilizer_ratios.pkl'),
+                SOIL_ENCODER.classes_)
+    bundle = load_bundle(directory, mmap_mode='r')
+
+    assert isinstance(bundle['engine'].value, np.memmap)
+    X = dataset_features()
+    assert np.array_equal(bundle['engine'].predict(X), CROP_MODEL.predict(X))
+    assert bundle['encoder'].inverse_transform([20])[0] == 'rice'
+    assert bundle['fertilizer_ratios'] == joblib.load('fertilizer_ratios.pkl')
+
+
+def test_compressed_forest(tmp_path):
+    """float32 thresholds and integer leaf counts lose nothing; pruning only shrinks."""
+    X = dataset_features()
+    lossless = compress_forest(CROP_MODEL)
+    assert lossless['threshold'].dtype == np.float32 and lossless['value'].dtype == np.uint8
+    assert np.array_equal(FlatForest(**lossless).predict(X), CROP_MODEL.predict(X))
+
+    # Values on split thresholds still take sklearn's branch after the float32 rounding
+    rng = np.random.default_rng(3)
+    X_edge = X[rng.integers(0, 2200, 500)]
+    nodes = rng.choice(np.flatnonzero(~ENGINE.is_leaf), len(X_edge))
+    X_edge[np.arange(len(X_edge)), ENGINE.feature[nodes]] = ENGINE.threshold[nodes]
+    assert np.array_equal(FlatForest(**lossless).predict(X_edge), CROP_MODEL.predict(X_edge))
+
+    pruned = compress_forest(CROP_MODEL, tree_ids=range(10), max_depth=8, min_samples_leaf=4)
+    assert pruned['max_depth'] <= 8 and len(pruned['roots']) == 10
+    directory = str(tmp_path / 'compact')
+    save_bundle(directory, CROP_MODEL, joblib.load('crop_encoder.pkl'), joblib.load('model_features.pkl'),
+                joblib.load('fertilizer_ratios.pkl'), SOIL_ENCODER.classes_, arrays=pruned)
+    engine = load_bundle(directory)['engine']
+    assert np.array_equal(engine.predict(X), FlatForest(**pruned).predict(X))
+    assert np.allclose(engine.predict_proba(X).sum(axis=1), 1.0)
+    assert np.mean(engine.predict(X) == CROP_MODEL.predict(X)) > 0.95
+
+
+def sklearn_bootstrap_indices(random_state, n_rows):
+    try:
+        return _generate_sample_indices(random_state, n_rows, n_rows, None)
+    except TypeError:
+        # Before scikit-learn 1.7 there was no sample_weight argument
+        return _generate_sample_indices(random_state, n_rows, n_rows)
+
+
+def test_bootstrap_mask_matches_sklearn():
+    """The in-bag rows are the ones sklearn drew, for crop_model.pkl and for a fresh OOB fit."""
+    n_rows = 2200
+    for estimator in CROP_MODEL.estimators_[:10]:
+        expected = np.zeros(n_rows, dtype=bool)
+        expected[sklearn_bootstrap_indices(estimator.random_state, n_rows)] = True
+        assert np.array_equal(bootstrap_mask(estimator, n_rows), expected)
+
+    # Averaging each tree over the rows it did not see reproduces sklearn's OOB estimate
+    X = dataset_features()[::5]
+    y = CROP_MODEL.predict(X)
+    forest = RandomForestClassifier(n_estimators=20, oob_score=True, random_state=1).fit(X, y)
+    votes = np.zeros((len(X), len(forest.classes_)))
+    for estimator in forest.estimators_:
+        oob = ~bootstrap_mask(estimator, len(X))
+        votes[oob] += estimator.predict_proba(X[oob])
+    assert np.allclose(votes / votes.sum(axis=1, keepdims=True), forest.oob_decision_function_)
+
+
+def test_min_samples_leaf_counts_distinct_rows():
+    """A side holding one row drawn twice by the bootstrap still counts as one row."""
+    for estimator in CROP_MODEL.estimators_:
+        tree = estimator.tree_
+        splits = np.flatnonzero(tree.children_left != -1)
+        smaller = np.minimum(tree.n_node_samples[tree.children_left[splits]],
+                             tree.n_node_samples[tree.children_right[splits]])
+        weighted = np.minimum(tree.weighted_n_node_samples[tree.children_left[splits]],
+                              tree.weighted_n_node_samples[tree.children_right[splits]])
+        candidates = splits[(smaller == 1) & (weighted >= 2)]
+        if len(candidates):
+            break
+    _, leaves, _ = pruned_nodes(tree, min_samples_leaf=2)
+    assert candidates[0] in leaves
+
+
+def test_choose_setting_respects_tolerance():
+    """The smallest setting within tolerance of the baseline wins; ties go to the faster one."""
+    rows = [{'name': 'baseline', 'accuracy': 0.95, 'bytes': 1000, 'p50_ms': 1.0},
+            {'name': 'close', 'accuracy': 0.948, 'bytes': 300, 'p50_ms': 0.4},
+            {'name': 'close_faster', 'accuracy': 0.947, 'bytes': 300, 'p50_ms': 0.3},
+            {'name': 'lossy', 'accuracy': 0.90, 'bytes': 100, 'p50_ms': 0.2},
+            {'name': 'better', 'accuracy': 0.96, 'bytes': 600, 'p50_ms': 0.6}]
+    assert choose_setting(rows, 0.0)['name'] == 'better'
+    assert choose_setting(rows, 0.0025)['name'] == 'close'
+    assert choose_setting(rows, 0.005)['name'] == 'close_faster'
+    assert choose_setting(rows, 0.1)['name'] == 'lossy'
+    assert choose_setting(rows[:2] + rows[3:4], 0.001) is None
+
+
+if __name__ == '__main__':
+    test_parity_on_dataset()
+    test_parity_on_split_thresholds()
+    test_parity_across_chunks()
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_compressed_forest(Path(tmp))
+    test_bootstrap_mask_matches_sklearn()
+    test_min_samples_leaf_counts_distinct_rows()
+    test_choose_setting_respects_tolerance()
+    print("SUCCESS: Flat engine matches the sklearn forest.")
@@ -0,0 +1,78 @@
+import os
+import pstats
+import time
+import warnings
+
+import flask_backend
+from metrics import Histogram, RequestProfiler
+
+warnings.filterwarnings("ignore")
+
+CLIENT = flask_backend.app.test_client()
+ROW = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+       "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+
+
+def sample(text, line_prefix):
+    """Value of the first exposition line starting with ``line_prefix``."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_cover_stages_and_errors():
+    before = CLIENT.get('/metrics').get_data(as_text=True)
+    CLIENT.post('/predict', json=ROW)
+    CLIENT.post('/predict', json=dict(ROW, soil_type='Moon Dust'))
+    text = CLIENT.get('/metrics').get_data(as_text=True)
+
+    for stage in ('parse', 'encode', 'predict', 'decode', 'serialize'):
+        prefix = f'crop_api_stage_seconds_count{{endpoint="/predict",stage="{stage}"}}'
+        assert sample(text, prefix) >= sample(before, prefix) + 1
+    errors = 'crop_api_errors_total{endpoint="/predict",type="validation"}'
+    assert sample(text, errors) == sample(before, errors) + 1
+    assert sample(text, 'crop_api_requests_total{endpoint="/predict",method="POST",status="200"}') >= 1
+    assert sample(text, 'crop_api_model_loaded') == 1
+    assert 'crop_api_model_load_seconds ' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        h.observe(value, "x")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="x",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="x"} 4' in lines
+
+
+def test_profile_window_dumps_stats(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    profiler.start(seconds=0.2)
+    for _ in range(3):
+        handle = profiler.begin()
+        sum(range(1000))
+        profiler.end(handle)
+    time.sleep(0.25)
+
+    status = profiler.status()
+    assert status['requests_profiled'] == 3
+    assert os.path.exists(status['last_dump'])
+    assert pstats.Stats(status['last_dump']).total_calls > 0
+
+
+def test_profile_endpoint_is_opt_in(monkeypatch):
+    monkeypatch.setitem(flask_backend.app.config, 'ADMIN_TOKEN', 'secret')
+    admin = {'X-Admin-Token': 'secret'}
+    assert CLIENT.post('/admin/profile?seconds=1', headers=admin).status_code == 404
+    monkeypatch.setitem(flask_backend.app.config, 'PROFILING', True)
+    assert CLIENT.post('/admin/profile?seconds=0', headers=admin).status_code == 400
+    assert CLIENT.post('/admin/profile?seconds=0').status_code == 403
+
+
+if __name__ == '__main__':
+    test_metrics_cover_stages_and_errors()
+    test_histogram_buckets_are_cumulative()
+    print("SUCCESS: Metrics are exported.")
@@ -0,0 +1,124 @@
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import flask_backend
+from micro_batcher import MicroBatcher
+
+warnings.filterwarnings("ignore")
+
+
+def dataset_rows(n):
+    df = pd.read_csv('Crop_recommendation_with_soil.csv').sample(n, random_state=0)
+    X, _, _ = flask_backend.MODELS.feature_encoder.transform(df)
+    return X
+
+
+def test_concurrent_rows_are_coalesced():
+    """Every waiting request gets its own row's answer, from fewer forest calls."""
+    X = dataset_rows(200)
+    models = flask_backend.MODELS
+    batcher = MicroBatcher(flask_backend.predict_labels, max_batch_size=16, max_wait_ms=20)
+    results = [None] * len(X)
+    start = threading.Barrier(len(X))
+
+    def worker(i):
+        start.wait()
+        results[i] = batcher.predict(X[i], models, timeout=10)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(X))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == flask_backend.predict_labels(X, models)
+    stats = batcher.stats()
+    assert stats['requests'] == len(X)
+    assert stats['batches'] < len(X)
+    assert sum(stats['batch_size_histogram'].values()) == stats['batches']
+    assert stats['batch_size_histogram']['32'] == 0 and stats['batch_size_histogram']['+Inf'] == 0
+
+
+def test_errors_reach_every_waiting_request():
+    def broken(X, context):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(broken, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="exploded"):
+        batcher.predict(np.zeros(8), timeout=10)
+    assert batcher.stats()['errors'] == 1
+
+
+def test_rows_from_different_bundles_are_not_mixed():
+    seen = []
+
+    def record(X, context):
+        seen.append((context, len(X)))
+        return [context] * len(X)
+
+    batcher = MicroBatcher(record, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(np.zeros(8), context) for context in ('old', 'new', 'old', 'new')]
+
+    assert [f.result(timeout=10) for f in futures] == ['old', 'new', 'old', 'new']
+    assert sorted(seen) == [('new', 2), ('old', 2)]
+
+
+def test_predict_route_uses_batcher(monkeypatch):
+    monkeypatch.setitem(flask_backend.app.config, 'MICRO_BATCHING', True)
+    before = flask_backend.MICRO_BATCHER.stats()['requests']
+    row = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+           "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+    response = flask_backend.app.test_client().post('/predict', json=row).get_json()
+
+    assert response['recommended_crop'] == 'rice'
+    assert flask_backend.MICRO_BATCHER.stats()['requests'] == before + 1
+
+
+def stuck_batcher():
+    """A batcher whose first batch blocks until the returned event is set."""
+    release = threading.Event()
+
+    def slow(X, context):
+        release.wait(10)
+        return ['slow'] * len(X)
+
+    return MicroBatcher(slow, max_batch_size=1, max_wait_ms=0), release
+
+
+def test_timed_out_rows_are_skipped():
+    batcher, release = stuck_batcher()
+    first = batcher.submit(np.zeros(8))
+    with pytest.raises(TimeoutError):
+        batcher.predict(np.zeros(8), timeout=0.05)
+    release.set()
+
+    assert first.result(timeout=10) == 'slow'
+    assert batcher.predict(np.zeros(8), timeout=10) == 'slow'
+    assert batcher.stats()['timeouts'] == 1
+
+
+def test_predict_route_falls_back_when_batcher_is_stuck(monkeypatch):
+    batcher, release = stuck_batcher()
+    batcher.submit(np.zeros(8))
+    monkeypatch.setattr(flask_backend, 'MICRO_BATCHER', batcher)
+    monkeypatch.setitem(flask_backend.app.config, 'MICRO_BATCHING', True)
+    monkeypatch.setitem(flask_backend.app.config, 'MICRO_BATCH_TIMEOUT_MS', 50)
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE', False)
+    row = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+           "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+    try:
+        response = flask_backend.app.test_client().post('/predict', json=row)
+        assert response.status_code == 200 and response.get_json()['recommended_crop'] == 'rice'
+        assert batcher.stats()['timeouts'] == 1
+    finally:
+        release.set()
+
+
+if __name__ == '__main__':
+    test_concurrent_rows_are_coalesced()
+    test_errors_reach_every_waiting_request()
+    print("SUCCESS: Micro-batcher coalesces requests.")
@@ -0,0 +1,119 @@
+import time
+import warnings
+
+import pytest
+
+import flask_backend
+from features import NUMERIC_FEATURES, FeatureEncoder
+from prediction_cache import PredictionCache
+
+warnings.filterwarnings("ignore")
+
+CLIENT = flask_backend.app.test_client()
+ROW = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+       "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+
+
+@pytest.fixture
+def restore_models(monkeypatch):
+    yield
+    monkeypatch.undo()
+    flask_backend.load_models()
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put(('a',), 'rice')
+    cache.put(('b',), 'maize')
+    assert cache.get(('a',)) == 'rice'
+    cache.put(('c',), 'coffee')
+
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) == 'rice' and cache.get(('c',)) == 'coffee'
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1 and stats['hit_rate'] == 0.75
+
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(ttl_seconds=0.05)
+    cache.put(('a',), 'rice')
+    assert cache.get(('a',)) == 'rice'
+    time.sleep(0.1)
+
+    assert cache.get(('a',)) is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_quantized_keys_are_shared():
+    """Values within half a step of the same multiple share one entry; others do not."""
+    cache = PredictionCache(quantization={0: 5, 1: 0.1})
+    key = cache.key([90.4, 6.52, 202.9])
+    assert cache.key([91.9, 6.48, 202.9]) == key
+    assert cache.key([93.0, 6.52, 202.9]) != key
+    assert cache.key([90.4, 6.52, 202.91]) != key  # no step: exact value
+
+    cache.put(key, 'rice')
+    assert cache.get(cache.key([88.0, 6.51, 202.9])) == 'rice'
+
+
+def test_quantization_follows_model_columns(monkeypatch, restore_models):
+    """Steps are configured by feature name and applied to that feature's column in each bundle."""
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE_QUANTIZATION', {'temperature': 5})
+    soil_first = FeatureEncoder(['soil_type_enc'] + NUMERIC_FEATURES, ['Alluvial', 'Loamy'])
+    assert flask_backend.cache_quantization(soil_first) == {1 + NUMERIC_FEATURES.index('temperature'): 5}
+
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE', True)
+    cache = PredictionCache()
+    monkeypatch.setattr(flask_backend, 'PREDICTION_CACHE', cache)
+    assert flask_backend.load_models()
+    CLIENT.post('/predict', json=ROW)
+    CLIENT.post('/predict', json=dict(ROW, temperature=21.9))
+    assert cache.stats()['entries'] == 1 and cache.stats()['hits'] == 1
+
+
+def test_bad_quantization_config_is_named():
+    with pytest.raises(ValueError, match="unknown feature 'x'"):
+        flask_backend.check_cache_quantization({'x': 1})
+    with pytest.raises(ValueError, match="'ph' must be a number"):
+        flask_backend.check_cache_quantization({'ph': -1})
+    assert flask_backend.check_cache_quantization({'ph': 0.1}) == {'ph': 0.1}
+
+
+def test_load_models_invalidates_the_cache(monkeypatch):
+    """A reload clears the cache, and answers computed before it are not stored."""
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE', True)
+    cache = PredictionCache()
+    monkeypatch.setattr(flask_backend, 'PREDICTION_CACHE', cache)
+
+    assert CLIENT.post('/predict', json=ROW).get_json()['recommended_crop'] == 'rice'
+    CLIENT.post('/predict', json=ROW)
+    assert cache.stats()['entries'] == 1 and cache.stats()['hits'] == 1
+
+    generation = cache.generation
+    assert flask_backend.load_models()
+    assert cache.stats()['entries'] == 0 and cache.generation == generation + 1
+    cache.put(('stale',), 'rice', generation)
+    assert cache.get(('stale',)) is None
+
+
+def test_cache_stats_endpoint(monkeypatch):
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE', True)
+    monkeypatch.setattr(flask_backend, 'PREDICTION_CACHE', PredictionCache(max_entries=50, ttl_seconds=60))
+    for _ in range(3):
+        CLIENT.post('/predict', json=ROW)
+
+    stats = CLIENT.get('/cache/stats').get_json()
+    assert stats['enabled'] is True
+    assert stats['max_entries'] == 50 and stats['ttl_seconds'] == 60
+    assert stats['entries'] == 1 and stats['hits'] == 2 and stats['misses'] == 1
+
+    monkeypatch.setitem(flask_backend.app.config, 'PREDICTION_CACHE', False)
+    assert CLIENT.get('/cache/stats').get_json()['enabled'] is False
+
+
+if __name__ == '__main__':
+    test_least_recently_used_entry_is_evicted()
+    test_entries_expire_after_ttl()
+    test_quantized_keys_are_shared()
+    print("SUCCESS: Prediction cache evicts, expires and shares quantized keys.")
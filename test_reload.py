@@ -0,0 +1,91 @@
+import threading
+import warnings
+
+import flask_backend
+from reloader import ArtifactWatcher
+
+warnings.filterwarnings("ignore")
+
+CLIENT = flask_backend.app.test_client()
+ROW = {"N": 90, "P": 42, "K": 43, "temperature": 20.9, "humidity": 82.0,
+       "ph": 6.5, "rainfall": 202.9, "soil_type": "Alluvial"}
+
+
+def test_reload_under_load_never_fails_a_request():
+    """Requests in flight across repeated swaps all get a consistent answer."""
+    stop = threading.Event()
+    answers, statuses = [], []
+
+    def hammer():
+        client = flask_backend.app.test_client()
+        while not stop.is_set():
+            response = client.post('/predict', json=ROW)
+            statuses.append(response.status_code)
+            answers.append(response.get_json().get('recommended_crop'))
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    versions = set()
+    for _ in range(5):
+        assert flask_backend.load_models() is True
+        versions.add(flask_backend.MODELS.version)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert len(versions) == 5
+    assert statuses and set(statuses) == {200}
+    assert set(answers) == {'rice'}
+
+
+def test_bundle_failing_smoke_check_is_not_swapped_in(monkeypatch):
+    version = flask_backend.MODELS.version
+    monkeypatch.setitem(flask_backend.app.config, 'RELOAD_MIN_ACCURACY', 1.01)
+
+    assert flask_backend.load_models() is False
+    assert flask_backend.MODELS.version == version
+    assert 'accuracy' in flask_backend.MODEL_STATUS['error']
+
+
+def test_admin_reload_endpoint(monkeypatch):
+    # Without ADMIN_TOKEN the admin routes are closed to everyone
+    assert CLIENT.post('/admin/reload').status_code == 403
+    assert CLIENT.get('/admin/reload', headers={'X-Admin-Token': ''}).status_code == 403
+
+    monkeypatch.setitem(flask_backend.app.config, 'ADMIN_TOKEN', 'secret')
+    version = flask_backend.MODELS.version
+    body = CLIENT.post('/admin/reload?wait=1', headers={'X-Admin-Token': 'secret'}).get_json()
+    assert body['swapped'] is True
+    assert body['serving_version'] > version
+    assert body['last_load']['smoke']['accuracy'] >= 0.9
+
+    assert CLIENT.post('/admin/reload').status_code == 403
+    assert CLIENT.get('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert CLIENT.get('/admin/reload', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+    # The public API answers cross-origin requests; the admin routes do not
+    origin = {'Origin': 'https://example.com'}
+    assert CLIENT.get('/health', headers=origin).headers.get('Access-Control-Allow-Origin') == origin['Origin']
+    assert 'Access-Control-Allow-Origin' not in CLIENT.get(
+        '/admin/reload', headers=dict(origin, **{'X-Admin-Token': 'secret'})).headers
+
+
+def test_watcher_waits_for_writes_to_settle(tmp_path):
+    path = tmp_path / 'crop_model.pkl'
+    path.write_bytes(b'v1')
+    watcher = ArtifactWatcher([str(path)], on_change=None, interval=1)
+
+    previous = watcher.snapshot()
+    assert watcher.poll(previous) == (previous, False)
+
+    path.write_bytes(b'v2 is longer')
+    previous, changed = watcher.poll(previous)
+    assert not changed  # first sighting of the change: maybe still being written
+    previous, changed = watcher.poll(previous)
+    assert changed      # unchanged for a full interval
+
+
+if __name__ == '__main__':
+    test_reload_under_load_never_fails_a_request()
+    print("SUCCESS: Models reload without failing requests.")
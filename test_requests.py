@@ -1,83 +1,86 @@
-import requests
-import json
+"""Endpoint checks run in-process; for load and latency see bench_load.py."""
+
+import warnings
+
+import bench_load
+import flask_backend
+
+warnings.filterwarnings("ignore")
+
+CLIENT = flask_backend.app.test_client()
+
+RICE_ROW = {
+    "N": 90.0, "P": 42.0, "K": 43.0, "temperature": 20.88,
+    "humidity": 82.0, "ph": 6.5, "rainfall": 202.94, "soil_type": "Alluvial"
+}
 
-# --- API Configuration ---
-BASE_URL = 'http://127.0.0.1:5000'
-CROP_PREDICT_URL = f'{BASE_URL}/predict'
-FERT_URL = f'{BASE_URL}/fertilizer_recommendation'
-headers = {'Content-Type': 'application/json'}
-# -------------------------
 
 def test_crop_prediction():
     """Tests the crop recommendation endpoint (/predict)."""
-    print("--- Testing Crop Recommendation Endpoint (/predict) ---")
-    
-    # Example input data for Rice/Alluvial soil (from dataset)
-    data = {
-        "N": 90.0,
-        "P": 42.0,
-        "K": 43.0,
-        "temperature": 20.88,
-        "humidity": 82.0,
-        "ph": 6.5,
-        "rainfall": 202.94,
-        "soil_type": "Alluvial" # This should match a one-hot feature in model_features.pkl
-    }
-    
-    try:
-        response = requests.post(CROP_PREDICT_URL, data=json.dumps(data), headers=headers, timeout=5)
-        
-        print("Status Code:", response.status_code)
-        
-        if response.status_code == 200:
-            print("Response JSON:")
-            print(json.dumps(response.json(), indent=4))
-            assert response.json().get('recommended_crop') == 'rice', "Expected 'rice' but got a different crop."
-            print("SUCCESS: Crop prediction seems to be working correctly.")
-        else:
-            print(f"ERROR: Received non-200 status code. Response: {response.text}")
-
-    except requests.exceptions.ConnectionError:
-        print("FATAL ERROR: Could not connect to the Flask API. Ensure 'api_app.py' is running on http://127.0.0.1:5000.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    response = CLIENT.post('/predict', json=RICE_ROW)
+    assert response.status_code == 200
+    assert response.get_json()['recommended_crop'] == 'rice'
+
+
+def test_top_k_prediction():
+    """top_k ranks the crops best first, from the body or the query string, and must be an integer."""
+    body = CLIENT.post('/predict', json=dict(RICE_ROW, top_k=3)).get_json()
+    crops = body['top_crops']
+    assert len(crops) == 3 and crops[0]['crop'] == body['recommended_crop'] == 'rice'
+    assert [c['probability'] for c in crops] == sorted((c['probability'] for c in crops), reverse=True)
+    assert CLIENT.post('/predict?top_k=3', json=RICE_ROW).get_json()['top_crops'] == crops
+
+    n_classes = len(flask_backend.MODELS.engine.classes)
+    assert len(CLIENT.post('/predict', json=dict(RICE_ROW, top_k=1000)).get_json()['top_crops']) == n_classes
+
+    for bad in (0, -1, 2.9, True, '2.9', 'abc'):
+        assert CLIENT.post('/predict', json=dict(RICE_ROW, top_k=bad)).status_code == 400
+    assert CLIENT.post('/predict?top_k=2.9', json=RICE_ROW).status_code == 400
+    assert CLIENT.post('/predict/batch', json={"records": [RICE_ROW], "top_k": True}).status_code == 400
+
+
+def test_batch_prediction():
+    """Tests the batch crop recommendation endpoint (/predict/batch)."""
+    # Second row is invalid and must be reported without failing the batch
+    bad_row = dict(RICE_ROW, soil_type="Moon Dust")
+    body = CLIENT.post('/predict/batch', json={"records": [RICE_ROW, bad_row]}).get_json()
+
+    assert body['n_rows'] == 2 and body['n_errors'] == 1
+    assert body['results'][0]['recommended_crop'] == 'rice'
+    assert body['results'][1]['error']
+
 
 def test_fertilizer_recommendation():
     """Tests the fertilizer recommendation endpoint (/fertilizer_recommendation)."""
-    print("\n--- Testing Fertilizer Recommendation Endpoint (/fertilizer_recommendation) ---")
-    
-    # Test case 1: A crop that is known to exist (e.g., 'rice')
-    fert_data = {"crop": "rice"}
-    
-    try:
-        fert_response = requests.post(FERT_URL, data=json.dumps(fert_data), headers=headers, timeout=5)
-        
-        print(f"Status Code (Rice): {fert_response.status_code}")
-        
-        if fert_response.status_code == 200:
-            print("Response JSON (Rice):")
-            print(json.dumps(fert_response.json(), indent=4))
-            print("SUCCESS: Fertilizer recommendation for 'rice' retrieved successfully.")
-            # Simple check for structure
-            assert 'N' in fert_response.json().get('recommended_ratio', {}), "Missing N key in ratio."
-        else:
-            print(f"ERROR: Received non-200 status code for rice. Response: {fert_response.text}")
-            
-        # Test case 2: A crop that does not exist
-        fert_data_fail = {"crop": "avocado"}
-        fert_response_fail = requests.post(FERT_URL, data=json.dumps(fert_data_fail), headers=headers, timeout=5)
-        
-        print(f"\nStatus Code (Avocado/Fail): {fert_response_fail.status_code}")
-        if fert_response_fail.status_code == 404:
-            print("SUCCESS: Handled unknown crop ('avocado') correctly with 404 status.")
-        else:
-            print(f"ERROR: Expected 404 for 'avocado' but got {fert_response_fail.status_code}. Response: {fert_response_fail.text}")
-
-    except requests.exceptions.ConnectionError:
-        print("FATAL ERROR: Could not connect to the Flask API. Ensure 'api_app.py' is running on http://127.0.0.1:5000.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    response = CLIENT.post('/fertilizer_recommendation', json={"crop": "rice"})
+    assert response.status_code == 200
+    assert 'N' in response.get_json()['recommended_ratio']
+
+    assert CLIENT.post('/fertilizer_recommendation', json={"crop": "avocado"}).status_code == 404
+
+
+def test_load_smoke():
+    """A short bench_load run over CSV payloads completes with no errors."""
+    target = bench_load.InProcessTarget()
+    for endpoint in bench_load.ENDPOINTS:
+        path, payloads = bench_load.sample_payloads(endpoint, 50)
+        row = bench_load.run_scenario(target, path, payloads, concurrency=2, duration=0.3)
+        assert row['requests'] > 0
+        assert row['errors'] == 0
+
+
+def test_regressions_are_flagged():
+    baseline = {"predict": {"requests": 100, "p95_ms": 10.0, "req_per_sec": 500.0, "error_rate": 0.0}}
+    same = {"predict": dict(baseline["predict"], p95_ms=11.0)}
+    slower = {"predict": dict(baseline["predict"], p95_ms=20.0, req_per_sec=300.0, error_rate=0.01)}
+
+    assert bench_load.compare(same, baseline, tolerance=0.15) == []
+    assert len(bench_load.compare(slower, baseline, tolerance=0.15)) == 3
+
 
 if __name__ == '__main__':
     test_crop_prediction()
-    test_fertilizer_recommendation()
\ No newline at end of file
+    test_top_k_prediction()
+    test_batch_prediction()
+    test_fertilizer_recommendation()
+    print("SUCCESS: All endpoints respond correctly.")
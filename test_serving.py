@@ -0,0 +1,41 @@
+import warnings
+
+import flask_backend
+
+warnings.filterwarnings("ignore")
+
+CLIENT = flask_backend.app.test_client()
+
+
+def test_health_and_ready():
+    assert CLIENT.get('/health').status_code == 200
+
+    response = CLIENT.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['last_load']['loaded'] is True
+
+
+def test_failed_reload_keeps_serving(monkeypatch):
+    """A bad reload is reported, but the bundle already live keeps answering."""
+    version = flask_backend.MODELS.version
+    monkeypatch.setattr(flask_backend, 'CROP_MODEL_PATH', '/nonexistent/crop_model.pkl')
+    monkeypatch.setattr(flask_backend, 'MODEL_FORMAT', 'pickle')
+
+    assert flask_backend.load_models() is False
+    response = CLIENT.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['version'] == version
+    assert 'crop_model.pkl' in response.get_json()['last_load']['error']
+
+
+def test_ready_without_models(monkeypatch):
+    """A worker that never loaded a bundle stays live but is not ready."""
+    monkeypatch.setattr(flask_backend, 'MODELS', None)
+    assert CLIENT.get('/health').status_code == 200
+    assert CLIENT.get('/ready').status_code == 503
+    assert CLIENT.post('/predict', json={}).status_code == 500
+
+
+if __name__ == '__main__':
+    test_health_and_ready()
+    print("SUCCESS: Health and readiness endpoints respond.")
@@ -0,0 +1,76 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import flask_backend
+from data_io import stream_dataset
+from features import NUMERIC_FEATURES
+from similar_index import SimilarFieldsIndex
+
+warnings.filterwarnings("ignore")
+
+DATASET = pd.read_csv('Crop_recommendation_with_soil.csv')
+CLIENT = flask_backend.app.test_client()
+
+
+def test_matches_a_full_scan():
+    """The per-soil KD-trees return the same rows as a brute-force scan of the same soil."""
+    index = SimilarFieldsIndex.build(DATASET)
+    values = DATASET[NUMERIC_FEATURES].to_numpy(dtype=float)
+    standardized = (values - index.mean) / index.scale
+    probes = DATASET.sample(40, random_state=1)
+
+    found = index.query(probes[NUMERIC_FEATURES].to_numpy() * 1.01, probes['soil_type'].to_numpy(), k=5)
+    for (_, probe), neighbors in zip(probes.iterrows(), found):
+        target = (probe[NUMERIC_FEATURES].to_numpy(dtype=float) * 1.01 - index.mean) / index.scale
+        same_soil = np.flatnonzero(DATASET['soil_type'].to_numpy() == probe['soil_type'])
+        distances = np.linalg.norm(standardized[same_soil] - target, axis=1)
+        assert [n['row'] for n in neighbors] == same_soil[np.argsort(distances, kind='stable')[:5]].tolist()
+        assert all(n['soil_type'] == probe['soil_type'] for n in neighbors)
+        assert neighbors[0]['label'] == DATASET.loc[neighbors[0]['row'], 'label']
+
+
+def test_similar_endpoint():
+    """A training row finds itself first; batches report bad rows in place."""
+    row = DATASET.iloc[17]
+    body = {f: float(row[f]) for f in NUMERIC_FEATURES}
+    body.update(soil_type=row['soil_type'], k=3)
+    response = CLIENT.post('/similar', json=body).get_json()
+    assert len(response['neighbors']) == 3
+    assert response['neighbors'][0]['row'] == 17 and response['neighbors'][0]['distance'] == 0.0
+    assert response['neighbors'][0]['label'] == row['label']
+
+    records = [dict(body), dict(body, soil_type='Moon'), 'not a record']
+    batch = CLIENT.post('/similar', json={'records': records, 'k': 2}).get_json()
+    assert [len(r['neighbors'] or []) for r in batch['results']] == [2, 0, 0]
+    assert batch['n_errors'] == 2
+
+    assert CLIENT.post('/similar', json=dict(body, k=0)).status_code == 400
+    assert CLIENT.post('/similar', json={'N': 1}).status_code == 400
+    for k in (2.9, True, '2.9'):
+        assert CLIENT.post('/similar', json=dict(body, k=k)).status_code == 400
+    assert CLIENT.post('/similar?k=2.9', json=dict(body, k=None)).status_code == 400
+    assert len(CLIENT.post('/similar?k=2', json=dict(body, k=None)).get_json()['neighbors']) == 2
+
+
+def test_neighbours_echo_source_rows_and_values():
+    """Rows of a streamed sample are file rows, and float32 values come back as the dataset wrote them."""
+    _, sample, _ = stream_dataset('Crop_recommendation_with_soil.csv', chunksize=500, sample_rows=300)
+    index = SimilarFieldsIndex.build(sample)
+    probes = DATASET.sample(20, random_state=4)
+    found = index.query(probes[NUMERIC_FEATURES].to_numpy(), probes['soil_type'].to_numpy(), k=3)
+    for neighbors in found:
+        for n in neighbors:
+            source = DATASET.iloc[n['row']]
+            assert n['label'] == source['label'] and n['soil_type'] == source['soil_type']
+            for f in NUMERIC_FEATURES:
+                assert n[f] == float(str(np.float32(source[f])))
+                assert abs(n[f] - source[f]) <= 1e-6 * max(abs(source[f]), 1)
+
+
+if __name__ == '__main__':
+    test_matches_a_full_scan()
+    test_similar_endpoint()
+    test_neighbours_echo_source_rows_and_values()
+    print("SUCCESS: similar-fields index matches a full scan.")
@@ -0,0 +1,49 @@
+import warnings
+
+import joblib
+import pandas as pd
+import pytest
+
+import train_model
+
+warnings.filterwarnings("ignore")
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+
+
+def test_warm_start_adds_trees(tmp_path):
+    """--warm-start keeps the saved trees and appends new ones that predict alongside them."""
+    out = str(tmp_path)
+    train_model.main(['--out-dir', out, '--n-estimators', '5', '--n-jobs', '1'])
+    first = joblib.load(tmp_path / train_model.MODEL_PATH)
+    train_model.main(['--out-dir', out, '--warm-start', '--add-trees', '3', '--n-jobs', '1'])
+    grown = joblib.load(tmp_path / train_model.MODEL_PATH)
+
+    assert len(grown.estimators_) == 8
+    assert grown.estimators_[0].tree_.node_count == first.estimators_[0].tree_.node_count
+    sample = pd.read_csv(DATASET_PATH).sample(20, random_state=0)
+    soil_types = joblib.load(tmp_path / train_model.SOIL_ENCODER_PATH).classes_
+    encoder = train_model.FeatureEncoder(grown.feature_names_in_, soil_types)
+    assert grown.predict_proba(encoder.transform_frame(sample)).shape == (20, len(grown.classes_))
+
+
+def test_warm_start_rejects_missing_crops(tmp_path):
+    """Data without one of the saved crops would give new trees fewer class columns."""
+    train_model.main(['--out-dir', str(tmp_path), '--n-estimators', '5', '--n-jobs', '1'])
+    df = pd.read_csv(DATASET_PATH)
+    df[df['label'] != 'rice'].to_csv(tmp_path / 'no_rice.csv', index=False)
+
+    with pytest.raises(ValueError, match="rice"):
+        train_model.main(['--out-dir', str(tmp_path), '--data', str(tmp_path / 'no_rice.csv'),
+                          '--warm-start', '--add-trees', '3', '--n-jobs', '1'])
+    assert len(joblib.load(tmp_path / train_model.MODEL_PATH).estimators_) == 5
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    for test in (test_warm_start_adds_trees, test_warm_start_rejects_missing_crops):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("SUCCESS: warm start grows the forest and refuses data missing a crop.")
@@ -0,0 +1,66 @@
+import json
+import warnings
+
+import numpy as np
+
+from tune_model import TRIALS_FILE, leaderboard, run_search, trial_grid
+
+warnings.filterwarnings("ignore")
+
+DATA = 'Crop_recommendation_with_soil.csv'
+
+
+def test_search_resumes_from_persisted_trials(tmp_path):
+    """Trials land in trials.jsonl as they finish; a rerun only runs the missing ones."""
+    out = str(tmp_path)
+    grid = trial_grid(n_estimators=[5], max_depths=[None, 4], min_samples_leaf=[1], max_features=['sqrt'])
+    first = run_search(DATA, out, grid[:2], n_folds=3, workers=2)
+    assert [r['params'] for r in first] == grid[:2]
+
+    # Simulate a run killed halfway through writing a line
+    with open(tmp_path / TRIALS_FILE, 'a') as f:
+        f.write('{"id": "cut sho')
+    results = run_search(DATA, out, grid, n_folds=3, workers=1)
+    with open(tmp_path / TRIALS_FILE) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(grid) + 1
+    assert results[:2] == first
+
+    for result in results:
+        assert 0 < result['accuracy'] <= 1 and result['latency_ms'] > 0 and result['bundle_kib'] > 0
+    # Shallow trees are smaller and less accurate
+    by_depth = {(r['params']['scheme'], r['params']['max_depth']): r for r in results}
+    assert by_depth[('ordinal', 4)]['nodes'] < by_depth[('ordinal', None)]['nodes']
+    assert by_depth[('ordinal', 4)]['accuracy'] < by_depth[('ordinal', None)]['accuracy']
+
+
+def test_fold_cache_is_stratified(tmp_path):
+    """Every crop is spread evenly over the cached folds."""
+    run_search(DATA, str(tmp_path), [], n_folds=4)
+    cache = next((tmp_path / 'cache').iterdir())
+    y, fold = np.load(cache / 'y.npy'), np.load(cache / 'fold.npy')
+    counts = np.array([np.bincount(fold[y == c], minlength=4) for c in np.unique(y)])
+    assert counts.max() - counts.min() <= 1
+    assert np.load(cache / 'X_onehot.npy', mmap_mode='r').dtype == np.float32
+
+
+def test_leaderboard_marks_pareto_front():
+    rows = leaderboard([
+        {'accuracy': 0.99, 'latency_ms': 0.4, 'bundle_kib': 900},
+        {'accuracy': 0.98, 'latency_ms': 0.2, 'bundle_kib': 300},
+        {'accuracy': 0.98, 'latency_ms': 0.3, 'bundle_kib': 400},
+    ])
+    assert [r['accuracy'] for r in rows] == [0.99, 0.98, 0.98]
+    assert [r['pareto'] for r in rows] == [True, True, False]
+    json.dumps(rows)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+
+    for test in (test_search_resumes_from_persisted_trials, test_fold_cache_is_stratified):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    test_leaderboard_marks_pareto_front()
+    print("SUCCESS: tuning search caches folds, resumes and ranks trials.")
@@ -0,0 +1,87 @@
+import json
+import threading
+
+from user_store import JsonUserStore, SqliteUserStore, open_user_store
+
+
+def write_users_json(path, users):
+    with open(path, "w") as f:
+        json.dump({"users": users}, f)
+
+
+def test_json_users_are_migrated_once(tmp_path):
+    """The first open imports users.json; later opens leave the database alone."""
+    legacy = str(tmp_path / "users.json")
+    write_users_json(legacy, {"Ananya": "a" * 64, "Ravi": "b" * 64})
+    url = "sqlite:" + str(tmp_path / "users.db")
+
+    store = open_user_store(url, legacy_json=legacy)
+    assert store.count() == 2
+    assert store.verify("Ananya", "a" * 64)
+    assert not store.verify("Ananya", "b" * 64)
+    assert store.get_hash("nobody") is None
+
+    # A password changed after the migration is not overwritten by reopening
+    assert store.set_hash("Ravi", "c" * 64)
+    assert open_user_store(url, legacy_json=legacy).get_hash("Ravi") == "c" * 64
+    assert SqliteUserStore(str(tmp_path / "users.db")).migrate_json(legacy) is None
+
+
+def test_create_and_reset(tmp_path):
+    """Duplicate signups and resets of unknown users are refused, in both backends."""
+    for store in (SqliteUserStore(str(tmp_path / "users.db")), JsonUserStore(str(tmp_path / "users.json"))):
+        assert store.create("u1", "h1")
+        assert not store.create("u1", "h2")
+        assert store.verify("u1", "h1")
+        assert store.set_hash("u1", "h3") and store.verify("u1", "h3")
+        assert not store.set_hash("u2", "h4")
+        assert not store.exists("u2")
+
+
+def test_cache_sees_writes_from_another_process(tmp_path):
+    """Hits come from the cache; a password changed elsewhere shows up after the TTL."""
+    path = str(tmp_path / "users.db")
+    store = SqliteUserStore(path, cache_ttl=0.0)
+    other = SqliteUserStore(path)
+    store.create("u1", "h1")
+
+    other.set_hash("u1", "h2")
+    assert store.get_hash("u1") == "h2"
+
+    cached = SqliteUserStore(path, cache_ttl=60.0)
+    cached.get_hash("u1")
+    cached.get_hash("u1")
+    assert cached.cache_stats()["hits"] == 1
+
+    # Logins never use the cache: a reset elsewhere locks out the old password at once
+    other.set_hash("u1", "h3")
+    assert cached.get_hash("u1") == "h2"
+    assert not cached.verify("u1", "h2") and cached.verify("u1", "h3")
+    assert cached.get_hash("u1") == "h3"
+
+
+def test_concurrent_signups_are_not_lost(tmp_path):
+    """Signups from many threads (Streamlit sessions) all land in the database."""
+    store = SqliteUserStore(str(tmp_path / "users.db"))
+
+    def signup(worker):
+        for i in range(50):
+            assert store.create(f"user-{worker}-{i}", "h")
+
+    threads = [threading.Thread(target=signup, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.count() == 400
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for test in (test_json_users_are_migrated_once, test_create_and_reset,
+                 test_cache_sees_writes_from_another_process, test_concurrent_signups_are_not_lost):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("SUCCESS: user store migrates, caches and keeps concurrent writes.")
@@ -1,40 +1,305 @@
 # train_model.py
+"""Train the crop model and compute fertilizer ratios.
+
+    python train_model.py                       # full refit on all cores
+    python train_model.py --warm-start --add-trees 20
+                                                # grow the saved forest with new trees
+    python train_model.py --n-estimators 200 --max-depth 12 --scheme onehot
+                                                # parameters picked with tune_model.py
+    python train_model.py --data survey.csv --chunksize 100000 --sample-rows 500000
+                                                # stream a CSV larger than RAM
+
+Features are encoded with features.FeatureEncoder, the same encoder the
+backend rebuilds from these artifacts, so training and serving cannot drift.
+Every artifact is written to a temporary file and renamed into place, so a
+running flask_backend never reads a half-written pickle.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
 
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from data_io import read_dataset, stream_dataset
+from drift_monitor import build_reference
+from features import SCHEMES, FeatureEncoder
+from forest_engine import save_bundle
+from similar_index import SimilarFieldsIndex
+
+DATASET_PATH = 'Crop_recommendation_with_soil.csv'
+MODEL_PATH = 'crop_model.pkl'
+CROP_ENCODER_PATH = 'crop_encoder.pkl'
+SOIL_ENCODER_PATH = 'soil_encoder.pkl'
+FEATURES_PATH = 'model_features.pkl'
+FERTILIZER_PATH = 'fertilizer_ratios.pkl'
+BUNDLE_DIR = 'crop_model_flat'
+SIMILAR_INDEX_PATH = 'similar_index.pkl'
+DRIFT_REFERENCE_PATH = 'drift_reference.pkl'
+
+
+# ---------------------------------------------------
+# STAGE TIMING
+# ---------------------------------------------------
+class StageTimer:
+    """Record wall time and peak memory for each named training stage.
+
+    ``max_rss_mb`` is the process high-water mark so far, which also covers
+    allocations made by compiled sklearn code.  With ``trace_memory``,
+    ``peak_traced_mb`` is the tracemalloc peak (Python and NumPy
+    allocations) inside the stage; tracing slows allocation-heavy stages,
+    so it is off by default and their wall times are then unaffected.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            wall = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stages.append({
+            "stage": name,
+            "wall_s": round(wall, 3),
+            "peak_traced_mb": round(peak / 2 ** 20, 1) if peak is not None else None,
+            "max_rss_mb": round(max_rss_kb / 1024, 1),
+        })
+        return result
+
+    def report(self):
+        print(f"\n{'stage':<22} {'wall s':>8} {'peak MB':>9} {'max RSS MB':>11}")
+        for s in self.stages:
+            peak = f"{s['peak_traced_mb']:.1f}" if s['peak_traced_mb'] is not None else "-"
+            print(f"{s['stage']:<22} {s['wall_s']:>8.3f} {peak:>9} {s['max_rss_mb']:>11.1f}")
+
+
+# ---------------------------------------------------
+# ATOMIC ARTIFACT WRITES
+# ---------------------------------------------------
+def atomic_dump(obj, path):
+    """joblib.dump to a temp file in the same directory, then rename over ``path``."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            joblib.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ---------------------------------------------------
+# PIPELINE STAGES
+# ---------------------------------------------------
+def load_dataset(path):
+    # Served from the Parquet cache (data_io.py convert) when it matches the CSV
+    try:
+        return read_dataset(path)
+    except FileNotFoundError:
+        print(f"FATAL ERROR: '{path}' not found.")
+        sys.exit(1)
+
+
+def encode_features(df, scheme):
+    """Fit the shared feature encoder and the crop label encoder on ``df``."""
+    labels = df['label'].astype(str)
+    encoder = FeatureEncoder.fit(df['soil_type'], scheme)
+    crop_encoder = LabelEncoder().fit(labels)
+    X = encoder.transform_frame(df)
+    y = crop_encoder.transform(labels)
+    return encoder, crop_encoder, X, y
+
+
+def train_crop_model(X, y, n_estimators, n_jobs, random_state, max_depth=None, min_samples_leaf=1,
+                     max_features='sqrt'):
+    model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state,
+                                   max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                   max_features=max_features)
+    model.fit(X, y)
+    return model
+
+
+def grow_crop_model(out_dir, df, add_trees, n_jobs):
+    """Add ``add_trees`` trees fitted on the current data to a saved forest.
+
+    Existing trees are kept as they are, so this is much cheaper than a full
+    refit when survey rows are appended.  The data is encoded with the saved
+    encoders; new soil types or crop labels require a full refit.
+    """
+    model = joblib.load(os.path.join(out_dir, MODEL_PATH))
+    soil_encoder = joblib.load(os.path.join(out_dir, SOIL_ENCODER_PATH))
+    crop_encoder = joblib.load(os.path.join(out_dir, CROP_ENCODER_PATH))
+    encoder = FeatureEncoder(model.feature_names_in_, soil_encoder.classes_)
+
+    labels = df['label'].astype(str)
+    unseen = set(labels.unique()) - set(crop_encoder.classes_)
+    if unseen:
+        raise ValueError(f"New crop labels {sorted(unseen)} require a full refit.")
+    # New trees must see every class, or their probability columns stop lining up with the old ones
+    missing = set(crop_encoder.classes_) - set(labels.unique())
+    if missing:
+        raise ValueError(f"Crop labels {sorted(missing)} are missing from the data; run a full refit.")
+    try:
+        X = encoder.transform_frame(df)
+    except ValueError as e:
+        raise ValueError(f"Data does not fit the saved encoder ({e}); run a full refit.")
+    y = crop_encoder.transform(labels)
+
+    model.set_params(warm_start=True, n_jobs=n_jobs, n_estimators=model.n_estimators + add_trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return encoder, crop_encoder, model
+
+
+def fertilizer_ratios(df):
+    # Calculate the mean N, P, K for each crop label (in float64, whatever the load dtype)
+    nutrients = df[['N', 'P', 'K']].astype('float64')
+    fert_df = nutrients.groupby(df['label'].astype(str)).mean().rename_axis('label').reset_index()
+
+    # Convert to a dictionary for fast lookup in the API
+    # The key is the crop label (e.g., 'rice'), and the value is a dictionary of N, P, K means
+    return fert_df.set_index('label').to_dict('index')
+
+
+def save_artifacts(model, encoder, crop_encoder, fert_dict, similar_index, drift_reference, out_dir):
+    """Write every serving artifact, then re-export the memory-mapped bundle."""
+    paths = {name: os.path.join(out_dir, name) for name in
+             (MODEL_PATH, CROP_ENCODER_PATH, SOIL_ENCODER_PATH, FEATURES_PATH, FERTILIZER_PATH)}
+    atomic_dump(model, paths[MODEL_PATH])
+    atomic_dump(crop_encoder, paths[CROP_ENCODER_PATH])
+    atomic_dump(LabelEncoder().fit(encoder.soil_types), paths[SOIL_ENCODER_PATH])
+    atomic_dump(encoder.feature_names, paths[FEATURES_PATH])
+    atomic_dump(fert_dict, paths[FERTILIZER_PATH])
+    atomic_dump(similar_index, os.path.join(out_dir, SIMILAR_INDEX_PATH))
+    atomic_dump(drift_reference, os.path.join(out_dir, DRIFT_REFERENCE_PATH))
+
+    # Hashes recorded in the manifest must be of the files just written
+    save_bundle(os.path.join(out_dir, BUNDLE_DIR), model, crop_encoder, encoder.feature_names,
+                fert_dict, encoder.soil_types, sources=list(paths.values()))
+
+
+# ---------------------------------------------------
+# MAIN
+# ---------------------------------------------------
+def parse_depth(value):
+    return None if value.lower() in ('none', 'max') else int(value)
+
+
+def parse_max_features(value):
+    # 'sqrt' / 'log2', a fraction of the features, or a count
+    try:
+        return float(value) if '.' in value else int(value)
+    except ValueError:
+        return value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the crop model and fertilizer ratios.")
+    parser.add_argument('--data', default=DATASET_PATH, help="training CSV")
+    parser.add_argument('--out-dir', default='.', help="directory the artifacts are written to")
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--n-jobs', type=int, default=-1, help="cores used for fitting (-1 = all)")
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--max-depth', type=parse_depth, default=None, help="tree depth cap ('none' = unlimited)")
+    parser.add_argument('--min-samples-leaf', type=int, default=1)
+    parser.add_argument('--max-features', type=parse_max_features, default='sqrt',
+                        help="features tried per split: 'sqrt', 'log2', a fraction or a count")
+    parser.add_argument('--scheme', choices=SCHEMES, default='ordinal',
+                        help="soil encoding: one ordinal column or one-hot columns")
+    parser.add_argument('--warm-start', action='store_true',
+                        help="add trees to the saved model instead of refitting from scratch")
+    parser.add_argument('--add-trees', type=int, default=20, help="trees added by --warm-start")
+    parser.add_argument('--chunksize', type=int,
+                        help="stream the CSV in chunks of this many rows instead of loading it whole")
+    parser.add_argument('--sample-rows', type=int, default=200_000,
+                        help="with --chunksize, rows kept in the uniform training sample")
+    parser.add_argument('--report', help="write the per-stage timing report to this JSON file")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report each stage's tracemalloc peak (slows the timed stages)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    timer = StageTimer(args.trace_memory)
+
+    fert_dict = None
+    if args.chunksize:
+        # Peak memory is bounded by one chunk plus the training sample; the
+        # fertilizer ratios are exact aggregates over every streamed row
+        if not os.path.exists(args.data):
+            print(f"FATAL ERROR: '{args.data}' not found.")
+            sys.exit(1)
+        fert_dict, df, n_rows = timer.run('stream_csv', stream_dataset, args.data,
+                                          args.chunksize, args.sample_rows, args.random_state)
+        print(f"Streamed {n_rows} rows; training on a sample of {len(df)}.")
+    else:
+        df = timer.run('load_csv', load_dataset, args.data)
 
-# Load the dataset
-try:
-    df = pd.read_csv('Crop_recommendation_with_soil.csv')
-except FileNotFoundError:
-    print("FATAL ERROR: 'Crop_recommendation_with_soil.csv' not found.")
-    exit()
+    # --- 1. CROP PREDICTION MODEL TRAINING ---
+    model_path = os.path.join(args.out_dir, MODEL_PATH)
+    if args.warm_start and os.path.exists(model_path):
+        print(f"1. Growing saved Crop Prediction Model by {args.add_trees} trees...")
+        encoder, crop_encoder, model = timer.run('fit_warm_start', grow_crop_model, args.out_dir, df,
+                                                 args.add_trees, args.n_jobs)
+    else:
+        if args.warm_start:
+            print(f"No saved model at {model_path}; fitting from scratch.")
+        encoder, crop_encoder, X, y = timer.run('encode_features', encode_features, df, args.scheme)
+        print(f"1. Training Crop Prediction Model ({encoder.scheme} soil encoding)...")
+        model = timer.run('fit', train_crop_model, X, y, args.n_estimators, args.n_jobs, args.random_state,
+                          args.max_depth, args.min_samples_leaf, args.max_features)
+    print(f"   Forest now has {len(model.estimators_)} trees.")
 
-# --- 1. CROP PREDICTION MODEL TRAINING ---
+    # Serving predicts row by row; keep the pickled model single-threaded
+    model.set_params(n_jobs=None)
 
-print("1. Training Crop Prediction Model...")
-df_encoded = pd.get_dummies(df, columns=['soil_type'], drop_first=True)
-X = df_encoded.drop(['label'], axis=1)
-y = df_encoded['label']
+    # --- 2. FERTILIZER RATIO CALCULATION ---
+    print("\n2. Calculating Fertilizer Ratios (Mean NPK per crop)...")
+    if fert_dict is None:
+        fert_dict = timer.run('fertilizer_ratios', fertilizer_ratios, df)
 
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X, y)
+    # --- 3. SIMILAR-FIELDS INDEX ---
+    # Built from the rows trained on (the sample, with --chunksize)
+    print("\n3. Building the similar-fields index...")
+    similar_index = timer.run('similar_index', SimilarFieldsIndex.build, df)
 
-joblib.dump(model, 'crop_recommendation_model.pkl')
-joblib.dump(X.columns.tolist(), 'model_features.pkl')
-print("✅ Crop Model and features saved.")
+    # --- 4. DRIFT REFERENCE ---
+    # Histograms of the training inputs that the backend's drift monitor compares live traffic with
+    print("\n4. Profiling the training inputs for drift monitoring...")
+    drift_reference = timer.run('drift_reference', build_reference, df)
 
-# --- 2. FERTILIZER RATIO CALCULATION ---
+    timer.run('save_artifacts', save_artifacts, model, encoder, crop_encoder, fert_dict, similar_index,
+              drift_reference, args.out_dir)
+    print("✅ Crop Model, encoders, features, Fertilizer Ratios, similar-fields index, drift reference "
+          "and flat bundle saved.")
 
-print("\n2. Calculating Fertilizer Ratios (Mean NPK per crop)...")
-# Calculate the mean N, P, K for each crop label
-fert_df = df.groupby('label')[['N', 'P', 'K']].mean().reset_index()
+    timer.report()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(timer.stages, f, indent=2)
+    return model
 
-# Convert to a dictionary for fast lookup in the API
-# The key is the crop label (e.g., 'rice'), and the value is a dictionary of N, P, K means
-fert_dict = fert_df.set_index('label').to_dict('index')
 
-# Save the dictionary
-joblib.dump(fert_dict, 'fertilizer_ratios.pkl')
-print("✅ Fertilizer Ratios saved.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+# tune_model.py
+"""Cross-validated hyperparameter search for the crop forest.
+
+    python tune_model.py search --workers 4                 # resumes if interrupted
+    python tune_model.py search --n-estimators 100 300 --max-depth none 12 --schemes onehot
+    python tune_model.py leaderboard                        # print the saved results again
+
+Every combination of forest parameters and soil encoding (features.SCHEMES)
+is scored with stratified k-fold cross-validation across a process pool.
+
+The folds and the encoded feature matrices are built once, written to
+``.npy`` files under ``<out>/cache/<data hash>/`` and opened memory-mapped
+by each worker, so a task only carries its parameter dict.  Each finished
+trial is appended to ``<out>/trials.jsonl`` as soon as it completes; a
+rerun skips every trial already recorded for the same data file, folds and
+seed, so an interrupted search picks up where it stopped.
+
+The leaderboard ranks trials by mean CV accuracy and reports what each one
+costs: fit time per fold, single-row latency of the flat engine the backend
+serves, and the size of the pickle and of the flat bundle arrays (both for
+the model of the last fold).  ``pareto`` marks trials that no other trial
+beats on accuracy, latency and size at once.  Latency is measured while
+other workers are busy, so compare it between trials of the same run.
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from itertools import product
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+
+from data_io import read_dataset
+from features import SCHEMES
+from forest_engine import FlatForest, export_forest, file_sha256
+from train_model import encode_features, parse_depth, parse_max_features
+
+DEFAULT_OUT = "tuning"
+TRIALS_FILE = "trials.jsonl"
+LEADERBOARD_FILE = "leaderboard.json"
+N_ESTIMATORS = [50, 100, 200]
+MAX_DEPTHS = [None, 12]
+MIN_SAMPLES_LEAF = [1, 3]
+MAX_FEATURES = ["sqrt", 0.5]
+LATENCY_CALLS = 200
+
+
+# ---------------------------------------------------
+# SHARED FOLD CACHE
+# ---------------------------------------------------
+def save_array(path, array):
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def build_fold_cache(data_path, out_dir, n_folds=5, random_state=42):
+    """Encode the dataset once per scheme and assign every row a CV fold.
+
+    Returns the cache directory, keyed by the data file's hash, the fold
+    count and the seed, so changing any of them starts a new cache and a
+    new set of trials.
+    """
+    key = hashlib.sha256(f"{file_sha256(data_path)}:{n_folds}:{random_state}".encode()).hexdigest()[:16]
+    cache_dir = os.path.join(out_dir, "cache", key)
+    if os.path.exists(os.path.join(cache_dir, "fold.npy")):
+        return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    df = read_dataset(data_path)
+    for scheme in SCHEMES:
+        _, _, X, y = encode_features(df, scheme)
+        # Trees fit on float32, so workers use the mapped pages without a conversion copy
+        save_array(os.path.join(cache_dir, f"X_{scheme}.npy"), X.to_numpy(dtype=np.float32))
+    save_array(os.path.join(cache_dir, "y.npy"), y.astype(np.int32))
+
+    fold = np.empty(len(y), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    for k, (_, test_rows) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        fold[test_rows] = k
+    # Written last: its presence marks a complete cache
+    save_array(os.path.join(cache_dir, "fold.npy"), fold)
+    return cache_dir
+
+
+_SHARED = {}
+
+
+def open_fold_cache(cache_dir):
+    """Pool initializer: map the cached arrays read-only into this worker."""
+    _SHARED.clear()
+    for scheme in SCHEMES:
+        _SHARED[scheme] = np.load(os.path.join(cache_dir, f"X_{scheme}.npy"), mmap_mode="r")
+    _SHARED["y"] = np.load(os.path.join(cache_dir, "y.npy"), mmap_mode="r")
+    _SHARED["fold"] = np.load(os.path.join(cache_dir, "fold.npy"), mmap_mode="r")
+
+
+# ---------------------------------------------------
+# TRIALS
+# ---------------------------------------------------
+def trial_grid(n_estimators=N_ESTIMATORS, max_depths=MAX_DEPTHS, min_samples_leaf=MIN_SAMPLES_LEAF,
+               max_features=MAX_FEATURES, schemes=SCHEMES):
+    return [
+        {"scheme": scheme, "n_estimators": n, "max_depth": depth, "min_samples_leaf": leaf,
+         "max_features": features}
+        for scheme, n, depth, leaf, features in product(schemes, n_estimators, max_depths,
+                                                        min_samples_leaf, max_features)
+    ]
+
+
+def trial_id(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def single_row_latency_ms(engine, X, n_calls=LATENCY_CALLS):
+    rows = np.asarray(X[:n_calls], dtype=np.float64)
+    engine.predict_proba(rows[:1])
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        engine.predict_proba(row[np.newaxis, :])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def run_trial(params, random_state=42):
+    """Cross-validate one parameter set on the mapped fold cache."""
+    X, y, fold = _SHARED[params["scheme"]], _SHARED["y"], _SHARED["fold"]
+    forest_params = {k: v for k, v in params.items() if k != "scheme"}
+    accuracies, fit_seconds = [], []
+    for k in range(int(fold.max()) + 1):
+        train_rows = np.flatnonzero(fold != k)
+        test_rows = np.flatnonzero(fold == k)
+        model = RandomForestClassifier(n_jobs=1, random_state=random_state, **forest_params)
+        start = time.perf_counter()
+        model.fit(X[train_rows], y[train_rows])
+        fit_seconds.append(time.perf_counter() - start)
+        accuracies.append(float(np.mean(model.predict(X[test_rows]) == y[test_rows])))
+
+    arrays = export_forest(model)
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return {
+        "id": trial_id(params),
+        "params": params,
+        "accuracy": round(float(np.mean(accuracies)), 5),
+        "accuracy_std": round(float(np.std(accuracies)), 5),
+        "fit_s": round(float(np.mean(fit_seconds)), 4),
+        "latency_ms": round(single_row_latency_ms(FlatForest(**arrays), X[test_rows]), 4),
+        "pickle_kib": round(buffer.tell() / 1024, 1),
+        "bundle_kib": round(sum(np.asarray(a).nbytes for a in arrays.values()) / 1024, 1),
+        "nodes": int(sum(e.tree_.node_count for e in model.estimators_)),
+    }
+
+
+def load_trials(path, cache_key):
+    """Trials already recorded for this fold cache, by id."""
+    trials = {}
+    if not os.path.exists(path):
+        return trials
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted write
+            if record.get("cache") == cache_key:
+                trials[record["id"]] = record
+    return trials
+
+
+def run_search(data_path, out_dir=DEFAULT_OUT, grid=None, n_folds=5, workers=None, random_state=42):
+    """Run every trial of ``grid`` not yet in ``trials.jsonl``; returns all results for the grid."""
+    grid = grid if grid is not None else trial_grid()
+    cache_dir = build_fold_cache(data_path, out_dir, n_folds, random_state)
+    cache_key = os.path.basename(cache_dir)
+    trials_path = os.path.join(out_dir, TRIALS_FILE)
+    done = load_trials(trials_path, cache_key)
+    pending = [params for params in grid if trial_id(params) not in done]
+    print(f"{len(grid) - len(pending)} of {len(grid)} trials already done; running {len(pending)}.")
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending) or 1))
+    start = time.perf_counter()
+    with open(trials_path, "a+") as log:
+        if log.tell():
+            log.seek(log.tell() - 1)
+            if log.read(1) != "\n":
+                log.write("\n")  # end a line cut short by an interrupted run
+        def record(result):
+            result["cache"] = cache_key
+            log.write(json.dumps(result) + "\n")
+            # One line per finished trial reaches the disk before the next starts
+            log.flush()
+            os.fsync(log.fileno())
+            done[result["id"]] = result
+            print(f"  [{len(done)}/{len(grid)}] {format_params(result['params'])}: "
+                  f"accuracy {result['accuracy']:.4f}, fit {result['fit_s']:.2f} s")
+
+        if workers == 1:
+            open_fold_cache(cache_dir)
+            for params in pending:
+                record(run_trial(params, random_state))
+        elif pending:
+            with multiprocessing.Pool(workers, initializer=open_fold_cache, initargs=(cache_dir,)) as pool:
+                tasks = [(params, random_state) for params in pending]
+                for result in pool.imap_unordered(_run_trial_task, tasks):
+                    record(result)
+    if pending:
+        print(f"Ran {len(pending)} trials with {workers} workers in {time.perf_counter() - start:.1f} s")
+    return [done[trial_id(params)] for params in grid]
+
+
+def _run_trial_task(task):
+    return run_trial(*task)
+
+
+# ---------------------------------------------------
+# LEADERBOARD
+# ---------------------------------------------------
+def format_params(params):
+    return (f"{params['scheme']:<7} n={params['n_estimators']:<4} depth={params['max_depth'] or 'max':<4} "
+            f"leaf={params['min_samples_leaf']:<2} features={params['max_features']}")
+
+
+def leaderboard(results):
+    """Results ranked by accuracy (ties: faster, then smaller), with the Pareto front marked."""
+    rows = sorted(results, key=lambda r: (-r["accuracy"], r["latency_ms"], r["bundle_kib"]))
+    for row in rows:
+        row["pareto"] = not any(
+            other["accuracy"] >= row["accuracy"] and other["latency_ms"] <= row["latency_ms"]
+            and other["bundle_kib"] <= row["bundle_kib"]
+            and (other["accuracy"], other["latency_ms"], other["bundle_kib"])
+            != (row["accuracy"], row["latency_ms"], row["bundle_kib"])
+            for other in rows)
+    return rows
+
+
+def train_command(params):
+    """The train_model.py invocation that refits ``params`` on all the data."""
+    return (f"python train_model.py --scheme {params['scheme']} --n-estimators {params['n_estimators']} "
+            f"--max-depth {params['max_depth'] or 'none'} --min-samples-leaf {params['min_samples_leaf']} "
+            f"--max-features {params['max_features']}")
+
+
+def print_leaderboard(rows, limit=20):
+    print(f"\n{'#':>3} {'accuracy':>9} {'std':>7} {'fit s':>7} {'lat ms':>7} {'pkl KiB':>8} "
+          f"{'flat KiB':>9} {'pareto':>6}  params")
+    for rank, row in enumerate(rows[:limit], 1):
+        print(f"{rank:>3} {row['accuracy']:>9.4f} {row['accuracy_std']:>7.4f} {row['fit_s']:>7.2f} "
+              f"{row['latency_ms']:>7.3f} {row['pickle_kib']:>8.0f} {row['bundle_kib']:>9.0f} "
+              f"{'*' if row['pareto'] else '':>6}  {format_params(row['params'])}")
+    if rows:
+        print(f"\nRefit the best on all rows with:\n  {train_command(rows[0]['params'])}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the crop forest")
+    parser.add_argument("command", choices=["search", "leaderboard"])
+    parser.add_argument("--data", default="Crop_recommendation_with_soil.csv")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="directory for the fold cache, trials and leaderboard")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--schemes", nargs="+", choices=SCHEMES, default=list(SCHEMES))
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=N_ESTIMATORS)
+    parser.add_argument("--max-depth", type=parse_depth, nargs="+", default=MAX_DEPTHS,
+                        help="depth caps ('none' = unlimited)")
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=MIN_SAMPLES_LEAF)
+    parser.add_argument("--max-features", type=parse_max_features, nargs="+", default=MAX_FEATURES,
+                        help="'sqrt', 'log2', a fraction or a count")
+    parser.add_argument("--top", type=int, default=20, help="leaderboard rows printed")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    os.makedirs(args.out, exist_ok=True)
+    grid = trial_grid(args.n_estimators, args.max_depth, args.min_samples_leaf, args.max_features,
+                      args.schemes)
+    if args.command == "search":
+        results = run_search(args.data, args.out, grid, args.folds, args.workers, args.random_state)
+    else:
+        cache_key = os.path.basename(build_fold_cache(args.data, args.out, args.folds, args.random_state))
+        done = load_trials(os.path.join(args.out, TRIALS_FILE), cache_key)
+        results = [done[trial_id(params)] for params in grid if trial_id(params) in done]
+
+    rows = leaderboard(results)
+    with open(os.path.join(args.out, LEADERBOARD_FILE), "w") as f:
+        json.dump(rows, f, indent=2)
+    print_leaderboard(rows, args.top)
@@ -0,0 +1,363 @@
+# user_store.py
+"""Pluggable storage for Streamlit login accounts.
+
+``app.py`` only talks to the small ``UserStore`` interface (look up, create,
+change password), so the backend is chosen by a URL:
+
+- ``sqlite:users.db`` (default): one row per user in a WAL-mode SQLite file.
+  ``username`` is the primary key, so a login is an indexed point lookup
+  whatever the number of accounts, and each signup or reset is a single-row
+  transaction, so concurrent sessions and processes never lose each other's
+  writes.
+- ``json:users.json``: the original whole-file format, kept for small
+  deployments.  Writes are serialised in-process and renamed into place.
+
+The first time a SQLite store is opened next to a ``users.json``, every
+account in it is copied over in one transaction and the migration is
+recorded in the database, so it never runs twice; the JSON file is left
+untouched.
+
+    python user_store.py migrate               # users.json -> users.db
+    python user_store.py bench --users 200000  # login latency, JSON vs SQLite
+"""
+
+import hmac
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_URL = "sqlite:users.db"
+LEGACY_JSON = "users.json"
+
+
+class UserStore:
+    """Username -> password hash storage used by the login pages."""
+
+    def get_hash(self, username):
+        """The stored password hash, or None for an unknown user."""
+        raise NotImplementedError
+
+    def create(self, username, password_hash):
+        """Add a user; False if the username is already taken."""
+        raise NotImplementedError
+
+    def set_hash(self, username, password_hash):
+        """Replace a user's password hash; False if the user does not exist."""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def exists(self, username):
+        return self.get_hash(username) is not None
+
+    def verify(self, username, password_hash):
+        """Constant-time comparison of ``password_hash`` with the stored one."""
+        stored = self.get_hash(username)
+        return stored is not None and hmac.compare_digest(stored, password_hash)
+
+
+# ---------------------------------------------------
+# JSON FILE (original format)
+# ---------------------------------------------------
+class JsonUserStore(UserStore):
+    """``{"users": {name: hash}}`` in one file, re-read on every call."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {"users": {}}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print("User Store Error:", e)
+            return {"users": {}}
+
+    def _save(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def get_hash(self, username):
+        return self._load().get("users", {}).get(username)
+
+    def create(self, username, password_hash):
+        with self._lock:
+            data = self._load()
+            users = data.setdefault("users", {})
+            if username in users:
+                return False
+            users[username] = password_hash
+            self._save(data)
+            return True
+
+    def set_hash(self, username, password_hash):
+        with self._lock:
+            data = self._load()
+            users = data.setdefault("users", {})
+            if username not in users:
+                return False
+            users[username] = password_hash
+            self._save(data)
+            return True
+
+    def count(self):
+        return len(self._load().get("users", {}))
+
+
+# ---------------------------------------------------
+# SQLITE (WAL)
+# ---------------------------------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SqliteUserStore(UserStore):
+    """Users in a WAL-mode SQLite database, with an in-process LRU read cache.
+
+    Each thread (Streamlit runs every session in its own) gets its own
+    connection.  The cache serves ``get_hash`` / ``exists``; cached hashes
+    expire after ``cache_ttl`` seconds and this process's own writes update
+    it immediately.  ``verify`` never trusts the cache: a login always reads
+    the current hash, so a password changed by another process takes effect
+    at once.
+    """
+
+    def __init__(self, path, cache_size=10000, cache_ttl=60.0, busy_timeout=5.0):
+        self.path = path
+        self.cache_size = int(cache_size)
+        self.cache_ttl = float(cache_ttl)
+        self.busy_timeout = float(busy_timeout)
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps committed transactions durable across crashes at NORMAL
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------------------------------------------
+    # READ CACHE
+    # ---------------------------------------------------
+    def _cache_get(self, username):
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(username)
+            if entry is None or entry[1] <= now:
+                self._cache.pop(username, None)
+                self.misses += 1
+                return None
+            self._cache.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def _cache_put(self, username, password_hash):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[username] = (password_hash, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(username)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ---------------------------------------------------
+    # STORE API
+    # ---------------------------------------------------
+    def _read_hash(self, username):
+        row = self._connect().execute(
+            "SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            # Misses are not cached, so a signup from another process is seen at once
+            with self._cache_lock:
+                self._cache.pop(username, None)
+            return None
+        self._cache_put(username, row[0])
+        return row[0]
+
+    def get_hash(self, username):
+        cached = self._cache_get(username)
+        if cached is not None:
+            return cached
+        return self._read_hash(username)
+
+    def verify(self, username, password_hash):
+        # One indexed read per login; a revalidated cache entry would cost the same
+        stored = self._read_hash(username)
+        return stored is not None and hmac.compare_digest(stored, password_hash)
+
+    def create(self, username, password_hash):
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO users (username, password_hash, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?)", (username, password_hash, now, now))
+        if cur.rowcount != 1:
+            return False
+        self._cache_put(username, password_hash)
+        return True
+
+    def set_hash(self, username, password_hash):
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE users SET password_hash = ?, updated_at = ? WHERE username = ?",
+                               (password_hash, time.time(), username))
+        if cur.rowcount != 1:
+            return False
+        self._cache_put(username, password_hash)
+        return True
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def cache_stats(self):
+        with self._cache_lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    # ---------------------------------------------------
+    # MIGRATION
+    # ---------------------------------------------------
+    def migrate_json(self, json_path):
+        """Copy every account from a ``users.json`` file, once.
+
+        Returns the number of users inserted, or None if this file was
+        already migrated (or does not exist).  Usernames already in the
+        database keep their current password.
+        """
+        if not os.path.exists(json_path):
+            return None
+        key = "migrated:" + os.path.abspath(json_path)
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return None
+        users = JsonUserStore(json_path)._load().get("users", {})
+        now = time.time()
+        with conn:
+            # Re-checked inside the write transaction in case another process migrated first
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return None
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, password_hash, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?)", [(u, h, now, now) for u, h in users.items()])
+            inserted = conn.total_changes - before
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(now)))
+        return inserted
+
+
+# ---------------------------------------------------
+# FACTORY
+# ---------------------------------------------------
+def open_user_store(url=DEFAULT_URL, legacy_json=LEGACY_JSON, **kwargs):
+    """Open the store named by ``url`` (``sqlite:<path>`` or ``json:<path>``).
+
+    A SQLite store imports ``legacy_json`` the first time it is opened.
+    """
+    scheme, _, path = url.partition(":")
+    if scheme == "json":
+        return JsonUserStore(path or LEGACY_JSON)
+    if scheme != "sqlite":
+        raise ValueError(f"Unknown user store '{url}'")
+    store = SqliteUserStore(path or "users.db", **kwargs)
+    if legacy_json:
+        migrated = store.migrate_json(legacy_json)
+        if migrated is not None:
+            print(f"Migrated {migrated} users from {legacy_json} to {store.path}")
+    return store
+
+
+def benchmark_logins(n_users, n_lookups=2000, seed=0):
+    """Mean login lookup time (ms) for the JSON and SQLite stores at ``n_users`` accounts."""
+    import random
+
+    rng = random.Random(seed)
+    names = [f"user{i:07d}" for i in range(n_users)]
+    hashes = {name: f"{rng.getrandbits(256):064x}" for name in names}
+    probes = [rng.choice(names) for _ in range(n_lookups)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "users.json")
+        with open(json_path, "w") as f:
+            json.dump({"users": hashes}, f)
+        db_path = os.path.join(tmp, "users.db")
+        start = time.perf_counter()
+        SqliteUserStore(db_path).migrate_json(json_path)
+        results["migrate_s"] = time.perf_counter() - start
+
+        stores = {
+            "json": JsonUserStore(json_path),
+            "sqlite": SqliteUserStore(db_path),
+        }
+        for name, store in stores.items():
+            # The JSON store re-parses the whole file per lookup; a few probes are enough
+            sample = probes[:20] if name == "json" else probes
+            start = time.perf_counter()
+            for username in sample:
+                assert store.verify(username, hashes[username])
+            results[name + "_ms"] = (time.perf_counter() - start) / len(sample) * 1000
+
+        # Cached lookups (exists / get_hash), which logins do not use
+        store = stores["sqlite"]
+        start = time.perf_counter()
+        for username in probes:
+            store.get_hash(username)
+        results["cached_ms"] = (time.perf_counter() - start) / len(probes) * 1000
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Login account storage")
+    parser.add_argument("command", choices=["migrate", "bench"])
+    parser.add_argument("--url", default=DEFAULT_URL, help="store to migrate into")
+    parser.add_argument("--json", default=LEGACY_JSON, help="users.json to migrate from")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 200000],
+                        help="for 'bench', account counts to benchmark")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        store = open_user_store(args.url, legacy_json=args.json)
+        print(f"{store.count()} users in {args.url}")
+    else:
+        print(f"{'users':>8} {'migrate s':>10} {'json ms':>9} {'sqlite ms':>10} {'cached ms':>10}")
+        for n in args.users:
+            r = benchmark_logins(n)
+            print(f"{n:>8} {r['migrate_s']:>10.2f} {r['json_ms']:>9.3f} "
+                  f"{r['sqlite_ms']:>10.4f} {r['cached_ms']:>10.4f}")
@@ -0,0 +1,13 @@
+# wsgi.py
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing flask_backend runs load_models(); with preload_app in
+gunicorn.conf.py that happens once in the master and the forked workers
+share the loaded model pages.
+"""
+
+from flask_backend import app
+
+application = app